@@ -1,43 +1,42 @@
 import json, random, math
 from americano.models import Match, Tournament, generate_id
 from database import PlayerORM
-from typing import List
+from typing import List, Optional
+from americano.schedule import CLASSIC, MIXED, get_design
+
+def generate_americano_rounds(
+    players: List[str], courts: int, num_rounds: int,
+    sexes: Optional[List[str]] = None, mode: str = CLASSIC,
+) -> List[List[Match]]:
+    """Generate Americano rounds where partners and opponents rotate.
+
+    In mixed mode `sexes` holds 'M' / 'F' for each of `players` and every
+    team is one man and one woman.
+    """
+    if mode == MIXED:
+        men = [p for p, s in zip(players, sexes) if s == "M"]
+        women = [p for p, s in zip(players, sexes) if s != "M"]
+        random.shuffle(men)
+        random.shuffle(women)
+        order = men + women
+    else:
+        men, women = players, []
+        order = random.sample(players, len(players))
+
+    design = get_design(len(men), len(women), courts, num_rounds, mode)
 
-def generate_americano_rounds(players: List[str], courts: int, num_rounds: int) -> List[List[Match]]:
-    """Generate Americano rounds where partners and opponents rotate."""
     rounds = []
-    n = num_rounds + 1
-    
-    # Ensure even number of players
-    if n % 4 != 0:
-        # Pad if necessary (bye players)
-        while len(players) % 4 != 0:
-            players.append(None)
-    
-    active_players = [p for p in players if p]
-    
-    for round_num in range(num_rounds):
-        round_matches = []
-        available = active_players.copy()
-        random.shuffle(available)
-        
-        court = 1
-        while len(available) >= 4 and court <= courts:
-            p1, p2, p3, p4 = available[:4]
-            available = available[4:]
-            match_id = generate_id()
-            match = Match(
-                id=match_id,
+    for round_num, round_courts in enumerate(design):
+        rounds.append([
+            Match(
+                id=generate_id(),
                 round=round_num + 1,
-                court=court,
-                team1=[p1, p2],
-                team2=[p3, p4]
+                court=court + 1,
+                team1=[order[a], order[b]],
+                team2=[order[c], order[d]],
             )
-            round_matches.append(match)
-            court += 1
-        
-        rounds.append(round_matches)
-    
+            for court, (a, b, c, d) in enumerate(round_courts)
+        ])
     return rounds
 
 def generate_americano_round(players: List[str], courts: int, num_round: int) -> List[Match]:
@@ -1,15 +1,25 @@
 from fastapi import APIRouter, Form, Depends, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
 from sqlalchemy.ext.asyncio import AsyncSession
-from database import get_session, TournamentORM, PlayerORM, MatchORM
+from database import get_session, TournamentORM
+from cache import TournamentView, tournament_cache, fragment_cache
+from live import tournament_changed, matches_event, match_json, event_stream, after_post
+from writer import score_writer
+from archive import load_snapshot
+from querycount import query_budget
+from rendering import templates, stream_template
+from metrics import TOURNAMENTS_CREATED, SCORES_SUBMITTED, ROUNDS_ADVANCED
+from service import (
+    record_match_score, edit_match_score, check_score, insert_tournament, update_active_round,
+    get_tournament_row, round_matches, swap_players,
+)
 from americano.models import Player, Tournament, Match, generate_id
 from americano.functions import generate_americano_rounds, calculate_standings
+from americano.schedule import CLASSIC, MIXED, MODES, rounds_needed
 
 router = APIRouter(prefix='/americano', tags=['Американо'])
-templates = Jinja2Templates(directory="templates")
-router.mount("/static", StaticFiles(directory="static"), name="static")
+history_template = templates.get_template("americano/_history_round.html")
 # In-memory storage (could be replaced with DB)
 # tournaments_db: dict = {}
 
@@ -20,6 +30,7 @@ def _orm_to_tournament(t_row: TournamentORM) -> Tournament:
             id=p.id, name=p.name, sex=p.sex,
             points=p.points, games_played=p.games_played,
             games_won=p.games_won, games_lost=p.games_lost,
+            profile_id=p.profile_id,
         )
         for p in t_row.players
     }
@@ -49,17 +60,60 @@ async def _get_tournament_orm(tid: str, session: AsyncSession) -> TournamentORM:
     return result
 
 
-def _update_player_stats(
-    player_orm: PlayerORM,
-    score_for: int, score_against: int,
-    delta: int = 1,          # +1 to apply, -1 to revert
-):
-    player_orm.games_played += delta
-    player_orm.points       += delta * score_for
-    if score_for > score_against:
-        player_orm.games_won  += delta
+async def _get_tournament_row(tid: str, session: AsyncSession) -> TournamentORM:
+    """Like _get_tournament_orm, without loading players and matches."""
+    result = await get_tournament_row(session, tid)
+    if not result:
+        raise HTTPException(status_code=404, detail="Tournament not found")
+    return result
+
+
+def _build_view(t_orm: TournamentORM) -> TournamentView:
+    if t_orm.archived:
+        t, standings = load_snapshot(t_orm)
     else:
-        player_orm.games_lost += delta
+        t = _orm_to_tournament(t_orm)
+        standings = calculate_standings(t)
+    current_matches = t.rounds[t.current_round] if t.rounds and t.current_round < len(t.rounds) else []
+
+    # Добавляем безопасную для JSON версию игроков
+    players_json_safe = {
+        pid: {
+            "id": player.id,
+            "name": player.name,
+            # "sex": player.sex,     # если нужен пол — раскомментируйте
+            "points": player.points,
+            "games_played": player.games_played,
+            "games_won": player.games_won,
+            "games_lost": player.games_lost,
+        }
+        for pid, player in t.players.items()
+    }
+    return TournamentView(
+        tournament=t,
+        standings=standings,
+        current_matches=current_matches,
+        players_json=players_json_safe,
+        total_rounds=t_orm.total_rounds,
+        mode=t_orm.mode,
+        archived=t_orm.archived,
+        revision=t_orm.version,
+    )
+
+
+# Another next-round, finish or swap got in first; scores are no conflict
+CONFLICT = "Турнир изменился, действие не выполнено"
+
+
+async def _get_view(tid: str, session: AsyncSession) -> TournamentView:
+    """Cached view model; the database is only hit after a write."""
+    view = tournament_cache.get(tid)
+    if view is None:
+        version = tournament_cache.version(tid)
+        t_orm = await _get_tournament_orm(tid, session)
+        view = _build_view(t_orm)
+        tournament_cache.put(tid, view, version)
+    return view
 
 
 # Routes
@@ -71,48 +125,56 @@ async def index(request: Request):
     })
 
 @router.post("/tournament/create")
+@query_budget(6)
 async def create_tournament(
     name: str = Form(...),
     courts: int = Form(...),
     player_names: str = Form(...),
+    women_names: str = Form(""),
+    schedule: str = Form(CLASSIC),
     session: AsyncSession = Depends(get_session),
 ):
     tid = generate_id()
     names = [n.strip() for n in player_names.split("\n") if n.strip()]
-    
-    if len(names) < 4:
+    women = [n.strip() for n in women_names.split("\n") if n.strip()]
+
+    if schedule not in MODES:
+        raise HTTPException(status_code=400, detail="Неизвестный формат")
+    if len(names) + len(women) < 4:
         raise HTTPException(status_code=400, detail="Введите минимум 4 имени")
-    
-    
+    if schedule == MIXED and (len(names) < 2 or len(women) < 2):
+        raise HTTPException(status_code=400, detail="Для микста нужно минимум 2 мужчины и 2 девушки")
+
     player_ids = []
-    player_orms = []
-    for name in names:
+    sexes = []
+    players = []
+    for pname, sex in [(n, 'M') for n in names] + [(n, 'F') for n in women]:
         pid = generate_id()
         player_ids.append(pid)
-        player_orms.append(PlayerORM(id=pid, tournament_id=tid, name=name))
-        
-    
-    rounds = generate_americano_rounds(player_ids, courts, len(names) - 1)
-    
-    t_orm = TournamentORM(
-        id=tid, mode="americano", name=name, courts=courts,
-        status="active", current_round=0, total_rounds=len(rounds),
+        sexes.append(sex)
+        players.append({"id": pid, "name": pname, "sex": sex})
+
+    num_rounds = rounds_needed(len(names), len(women), schedule)
+    # A size precompute_designs did not warm is searched on the spot, keep it off the event loop
+    rounds = await run_in_threadpool(generate_americano_rounds, player_ids, courts, num_rounds, sexes, schedule)
+
+    await insert_tournament(
+        session,
+        dict(
+            id=tid, mode="americano", name=name, courts=courts,
+            status="active", current_round=0, total_rounds=len(rounds),
+        ),
+        players,
+        [m for round_matches in rounds for m in round_matches],
     )
-    session.add(t_orm)
-    session.add_all(player_orms)
-    for round_matches in rounds:
-        for m in round_matches:
-            session.add(MatchORM(
-                id=m.id, tournament_id=tid,
-                round=m.round, court=m.court,
-                team1=m.team1, team2=m.team2,
-            ))
 
     await session.commit()
+    TOURNAMENTS_CREATED.labels("americano").inc()
     
     return RedirectResponse(f"/americano/tournament/{tid}", status_code=303)
 
 @router.head("/tournament/{tid}")
+@query_budget(3)
 async def tournament_view(tid: str, session: AsyncSession = Depends(get_session)):
     row = await session.get(TournamentORM, tid)
     if not row:
@@ -120,150 +182,125 @@ async def tournament_view(tid: str, session: AsyncSession = Depends(get_session)
     return Response(status_code=200)
 
 @router.get("/tournament/{tid}", response_class=HTMLResponse)
+@query_budget(3)
 async def tournament_view(request: Request, tid: str, session: AsyncSession = Depends(get_session)):
-    t_orm = await _get_tournament_orm(tid, session)
-    
-    if not t_orm:
-        raise HTTPException(status_code=404, detail="Tournament not found")
-    t = _orm_to_tournament(t_orm)
-    standings = calculate_standings(t)
-    current_matches = t.rounds[t.current_round] if t.rounds and t.current_round < len(t.rounds) else []
+    view = await _get_view(tid, session)
 
-    # Добавляем безопасную для JSON версию игроков
-    players_json_safe = {
-        pid: {
-            "id": player.id,
-            "name": player.name,
-            # "sex": player.sex,     # если нужен пол — раскомментируйте
-            "points": player.points,
-            "games_played": player.games_played,
-            "games_won": player.games_won,
-            "games_lost": player.games_lost,
-        }
-        for pid, player in t.players.items()
-    }
-    
-    return templates.TemplateResponse("americano/tournament.html", {
+    return stream_template("americano/tournament.html", {
         "request": request,
-        "tournament": t,
-        "standings": standings,
-        "current_matches": current_matches,
-        "players": t.players,
-        "players_json": players_json_safe,
-        "total_rounds": len(t.rounds),
+        "tournament": view.tournament,
+        "standings": view.standings,
+        "current_matches": view.current_matches,
+        "players": view.tournament.players,
+        "players_json": view.players_json,
+        "current_matches_json": [match_json(m) for m in view.current_matches],
+        "total_rounds": view.total_rounds,
+        "history": fragment_cache.history(view, lambda round_num, matches: history_template.render(
+            tournament=view.tournament, round_num=round_num, matches=matches,
+            archived=view.archived,  # snapshot only, there are no rows left to edit
+        )),
     })
 
+@router.get("/tournament/{tid}/events")
+async def tournament_events(tid: str):
+    return event_stream(tid)
+
 @router.post("/tournament/{tid}/score")
+@query_budget(7, sqlite=9)
 async def submit_score(
     request: Request,
     tid: str,
     match_id: str = Form(...),
     score1: int = Form(...),
     score2: int = Form(...),
-    session: AsyncSession = Depends(get_session),
 ):
-    t_orm = await _get_tournament_orm(tid, session)
-    if not t_orm:
-        raise HTTPException(status_code=404)
-    t = _orm_to_tournament(t_orm)
-    
-    match = next(
-        (m for m in t.rounds[t.current_round] if m.id == match_id and not m.completed),
-        None,
-    )
-    if not match:
-        return RedirectResponse(f"/americano/tournament/{tid}", status_code=303)
-    # Update match
-    match_orm = await session.get(MatchORM, match_id)
-    match_orm.score1 = score1
-    match_orm.score2 = score2
-    match_orm.completed = True
-
-    # Update player stats
-    players_map = {p.id: p for p in t_orm.players}
-    for pid in match.team1:
-        _update_player_stats(players_map[pid], score1, score2, delta=1)
-    for pid in match.team2:
-        _update_player_stats(players_map[pid], score2, score1, delta=1)
-
-    await session.commit()
+    try:
+        check_score(score1, score2)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    players = await score_writer.submit(tid, record_match_score, match_id, score1, score2)
+    if players is None:
+        return after_post(request, f"/americano/tournament/{tid}")
+
+    tournament_changed(tid, {
+        "type": "score", "match_id": match_id,
+        "score1": score1, "score2": score2, "players": players,
+    })
+    SCORES_SUBMITTED.labels("americano", "submit").inc()
     
-    return RedirectResponse(f"/americano/tournament/{tid}", status_code=303)
+    return after_post(request, f"/americano/tournament/{tid}")
 
 @router.post("/tournament/{tid}/next-round")
-async def next_round(tid: str, session: AsyncSession = Depends(get_session),):
-    t_orm = await _get_tournament_orm(tid, session)
-    if not t_orm:
-        raise HTTPException(status_code=404)
-    t = _orm_to_tournament(t_orm)
+@query_budget(5)
+async def next_round(request: Request, tid: str, session: AsyncSession = Depends(get_session),):
+    t_orm = await _get_tournament_row(tid, session)
     # Check all matches in current round completed
-    current = t.rounds[t.current_round]
-    if all(m.completed for m in current):
-        t_orm.current_round += 1
+    current = await round_matches(session, tid, t_orm.current_round + 1)
+    if t_orm.status == "active" and current and all(m.completed for m in current):
+        new_round = t_orm.current_round + 1
+        new_matches = await round_matches(session, tid, new_round + 1)
+        if not await update_active_round(session, tid, t_orm.current_round, current_round=new_round):
+            # Usually a double click: the round was advanced already
+            return after_post(request, f"/americano/tournament/{tid}")
         await session.commit()
+        tournament_changed(tid, matches_event("round", new_matches, round=new_round))
+        ROUNDS_ADVANCED.labels("americano").inc()
 
-    return RedirectResponse(f"/americano/tournament/{tid}", status_code=303)
+    return after_post(request, f"/americano/tournament/{tid}")
 
 @router.post("/tournament/{tid}/finish")
-async def finish_tournament(tid: str, session: AsyncSession = Depends(get_session),):
-    t_orm = await _get_tournament_orm(tid, session)
-    if not t_orm:
-        raise HTTPException(status_code=404)
-    t = _orm_to_tournament(t_orm)
-    
-    current = t.rounds[t.current_round]
-    if all(m.completed for m in current):
-        t_orm.status = "finished"
+@query_budget(4)
+async def finish_tournament(request: Request, tid: str, session: AsyncSession = Depends(get_session),):
+    t_orm = await _get_tournament_row(tid, session)
+
+    current = await round_matches(session, tid, t_orm.current_round + 1)
+    if t_orm.status == "active" and current and all(m.completed for m in current):
+        if not await update_active_round(session, tid, t_orm.current_round, status="finished"):
+            return after_post(request, f"/americano/tournament/{tid}", error=CONFLICT)
         await session.commit()
+        tournament_changed(tid, {"type": "finish"})
     
-    return RedirectResponse(f"/americano/tournament/{tid}", status_code=303)
+    return after_post(request, f"/americano/tournament/{tid}")
 
 @router.post("/tournament/{tid}/delete")
+@query_budget(6)
 async def delete_tournament(tid: str, session: AsyncSession = Depends(get_session),):
     t_orm = await session.get(TournamentORM, tid)
     if t_orm:
         await session.delete(t_orm)
         await session.commit()
+        tournament_changed(tid, {"type": "delete", "redirect": "/americano"})
     return RedirectResponse("/americano", status_code=303)
 
 @router.post("/tournament/{tid}/edit-score")
+@query_budget(8, sqlite=10)
 async def edit_score(
     request: Request,
     tid: str,
     match_id: str = Form(...),
     score1: int = Form(...),
     score2: int = Form(...),
-    session: AsyncSession = Depends(get_session),
 ):
-    t_orm = await _get_tournament_orm(tid, session)
-    t = _orm_to_tournament(t_orm)
-    match = next(
-        (m for rnd in t.rounds for m in rnd if m.id == match_id and m.completed),
-        None,
-    )
-    if not match:
-        return RedirectResponse(f"/americano/tournament/{tid}", status_code=303)
-
-    match_orm = await session.get(MatchORM, match_id)
-    old1, old2 = match_orm.score1, match_orm.score2
-
-    # Revert old stats, apply new stats
-    players_map = {p.id: p for p in t_orm.players}
-    for pid in match.team1:
-        _update_player_stats(players_map[pid], old1, old2, delta=-1)
-        _update_player_stats(players_map[pid], score1, score2, delta=1)
-    for pid in match.team2:
-        _update_player_stats(players_map[pid], old2, old1, delta=-1)
-        _update_player_stats(players_map[pid], score2, score1, delta=1)
-
-    match_orm.score1 = score1
-    match_orm.score2 = score2
-    await session.commit()
+    try:
+        check_score(score1, score2)
+        players = await score_writer.submit(tid, edit_match_score, match_id, score1, score2)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    if players is None:
+        return after_post(request, f"/americano/tournament/{tid}")
 
-    return RedirectResponse(f"/americano/tournament/{tid}", status_code=303)
+    tournament_changed(tid, {
+        "type": "score", "match_id": match_id,
+        "score1": score1, "score2": score2, "players": players,
+    }, history=True)
+    SCORES_SUBMITTED.labels("americano", "edit").inc()
+
+    return after_post(request, f"/americano/tournament/{tid}")
 
 @router.post("/tournament/{tid}/swap-player")
+@query_budget(10)
 async def swap_player(
+    request: Request,
     tid: str,
     match_id: str = Form(...),
     position: str = Form(...),      # team1-0, team2-1 и т.д.
@@ -271,22 +308,11 @@ async def swap_player(
     session: AsyncSession = Depends(get_session),
 ):
 
-    t_orm = await _get_tournament_orm(tid, session)
+    t_orm = await _get_tournament_row(tid, session)
 
     if t_orm.status != "active":
         raise HTTPException(status_code=400, detail="Турнир не активен")
 
-    current_round_num = t_orm.current_round + 1
-
-    # Целевой матч
-    target_match_orm = next(
-        (m for m in t_orm.matches if m.id == match_id and m.round == current_round_num),
-        None
-    )
-
-    if not target_match_orm or target_match_orm.completed:
-        raise HTTPException(status_code=400, detail="Матч не найден или уже завершён")
-
     # Парсим позицию
     try:
         team_key, idx_str = position.split("-")
@@ -296,34 +322,18 @@ async def swap_player(
     except Exception:
         raise HTTPException(status_code=400, detail="Неверная позиция")
 
-    old_pid = getattr(target_match_orm, team_key)[idx]
-    if old_pid == new_pid:
-        return RedirectResponse(f"/americano/tournament/{tid}", status_code=303)
-
-    # Поиск позиции выбранного игрока
-    def find_position(pid: str):
-        for m in t_orm.matches:
-            if m.round == current_round_num:
-                for tk in ("team1", "team2"):
-                    tlist = getattr(m, tk)
-                    if pid in tlist:
-                        return m, tk, tlist.index(pid)
-        return None, None, None
-
-    new_match, new_tk, new_i = find_position(new_pid)
-
-    # для целевого матча
-    old_team = getattr(target_match_orm, team_key)          # берём текущий список
-    new_team = old_team.copy()                              # копируем
-    new_team[idx] = new_pid                                 # меняем
-    setattr(target_match_orm, team_key, new_team)           # присваиваем новый объект списка
-
-    # если есть второй матч (swap)
-    if new_match is not None and new_match == target_match_orm:
-        old_team2 = getattr(new_match, new_tk)
-        new_team2 = old_team2.copy()
-        new_team2[new_i] = old_pid
-        setattr(new_match, new_tk, new_team2)
+    # Игрок, уже играющий в этом раунде, меняется местами с заменяемым
+    try:
+        changed = await swap_players(
+            session, tid, t_orm.current_round + 1,
+            match_id, int(team_key[-1]), idx, new_pid,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
 
-    await session.commit()
-    return RedirectResponse(f"/americano/tournament/{tid}", status_code=303)
\ No newline at end of file
+    if changed:
+        if not await update_active_round(session, tid, t_orm.current_round):
+            return after_post(request, f"/americano/tournament/{tid}", error=CONFLICT)
+        await session.commit()
+        tournament_changed(tid, matches_event("swap", changed))
+    return after_post(request, f"/americano/tournament/{tid}")
@@ -0,0 +1,283 @@
+"""Balanced Americano schedules.
+
+Partners rotate along a round-robin 1-factorization (circle method), so over
+a full cycle every player partners every other player exactly once. In mixed
+mode every man partners every woman once instead. Each round the partner
+pairs are put on courts against an opponent-count matrix so opponents spread
+evenly. When the courts can't take everybody, the pairs that sit out are
+chosen so games played differ by at most one where that can be found.
+
+Sizes with a known whist design use it directly. `precompute_designs` beam
+searches the other common club sizes, anything else gets one greedy pass.
+Designs are index based, `(a, b, c, d)` meaning team (a, b) vs team (c, d),
+and cached per (men, women, courts, rounds, mode).
+"""
+import random
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+CLASSIC = "classic"
+MIXED = "mixed"
+MODES = (CLASSIC, MIXED)
+
+Court = Tuple[int, int, int, int]
+Design = Tuple[Tuple[Court, ...], ...]
+DesignKey = Tuple[int, int, int, int, str]
+
+PRECOMPUTE_MAX_PLAYERS = 24
+BEAM_WIDTH = 12
+SAMPLES = 8            # randomised matchings per state in big rounds
+EXHAUSTIVE_PAIRS = 6   # up to 15 matchings per round, try them all
+ROTATION_TRIES = 32    # restarts when games played still differ by two or more
+
+# Z-cyclic whist starters: round r shifts every player x of the starter to
+# (x + r) mod m, m = n - 1 with player m fixed for n = 4k, m = n for n = 4k + 1.
+# The developed design is perfect: everyone partners everyone exactly once and
+# faces everyone exactly twice.
+WHIST_STARTERS: Dict[int, Tuple[Court, ...]] = {
+    5: ((1, 4, 2, 3),),
+    8: ((0, 5, 1, 7), (2, 6, 3, 4)),
+    12: ((0, 9, 1, 5), (2, 10, 3, 8), (4, 11, 6, 7)),
+    16: ((0, 6, 1, 12), (2, 5, 3, 10), (4, 14, 7, 8), (9, 15, 11, 13)),
+    17: ((0, 8, 1, 14), (2, 5, 3, 10), (4, 15, 6, 11), (7, 9, 12, 13)),
+}
+
+_precomputed: Dict[DesignKey, Design] = {}
+
+
+def rounds_needed(n_men: int, n_women: int = 0, mode: str = CLASSIC) -> int:
+    """Rounds for a full rotation: everyone partners everyone once."""
+    if mode == MIXED:
+        return max(n_men, n_women)
+    n = n_men + n_women
+    return n - 1 if n % 2 == 0 else n
+
+
+def _classic_pairs(n: int, round_idx: int) -> List[Tuple[int, int]]:
+    """Partner pairs of one round of the circle method; odd n gets a bye."""
+    m = n + n % 2
+    r = round_idx % (m - 1)
+    pairs = [(r, m - 1)]
+    for k in range(1, m // 2):
+        pairs.append(((r + k) % (m - 1), (r - k) % (m - 1)))
+    return [(a, b) for a, b in pairs if a < n and b < n]
+
+
+def _mixed_pairs(n_men: int, n_women: int, round_idx: int) -> List[Tuple[int, int]]:
+    """Man/woman pairs; the larger group rotates past the smaller one."""
+    men = list(range(n_men))
+    women = list(range(n_men, n_men + n_women))
+    if n_men <= n_women:
+        return [(men[j], women[(j + round_idx) % n_women]) for j in range(n_men)]
+    return [(men[(j + round_idx) % n_men], women[j]) for j in range(n_women)]
+
+
+def _round_pairs(n_men: int, n_women: int, mode: str, round_idx: int) -> List[Tuple[int, int]]:
+    if mode == MIXED:
+        return _mixed_pairs(n_men, n_women, round_idx)
+    return _classic_pairs(n_men + n_women, round_idx)
+
+
+def _rotation(key: DesignKey) -> List[List[Tuple[int, int]]]:
+    """Partner pairs that play in each round, the rest sit out.
+
+    Who sits out is chosen over the whole rotation, not round by round:
+    a greedy pass (pairs whose players played most sit) is improved by
+    swapping a playing pair with a sitting pair of the same round while
+    that evens out games played. Restarts with other tie-breaks until
+    games played differ by at most one. Seeded, like the designs.
+    """
+    n_men, n_women, courts, num_rounds, mode = key
+    n = n_men + n_women
+    rng = random.Random(repr(key))
+    best, best_spread = None, None
+    for _ in range(ROTATION_TRIES):
+        plays = [0] * n
+        rounds = []
+        for r in range(num_rounds):
+            pairs = _round_pairs(n_men, n_women, mode, r)
+            rng.shuffle(pairs)
+            capacity = min(2 * courts, len(pairs) - len(pairs) % 2)
+            pairs.sort(key=lambda p: -(plays[p[0]] + plays[p[1]]))
+            playing, sitting = pairs[len(pairs) - capacity:], pairs[:len(pairs) - capacity]
+            for a, b in playing:
+                plays[a] += 1
+                plays[b] += 1
+            rounds.append((playing, sitting))
+
+        improved = True
+        while improved:
+            improved = False
+            for playing, sitting in rounds:
+                for i, (a, b) in enumerate(playing):
+                    for j, (c, d) in enumerate(sitting):
+                        if plays[a] + plays[b] > plays[c] + plays[d] + 2:
+                            plays[a] -= 1
+                            plays[b] -= 1
+                            plays[c] += 1
+                            plays[d] += 1
+                            playing[i], sitting[j] = (c, d), (a, b)
+                            a, b = c, d
+                            improved = True
+
+        spread = max(plays) - min(plays) if plays else 0
+        if best is None or spread < best_spread:
+            best, best_spread = [playing for playing, _ in rounds], spread
+        if spread <= 1:
+            break
+    return best
+
+
+def _greedy_courts(pairs: List[Tuple[int, int]], opp: List[List[int]]) -> List[Court]:
+    """Match each pair with the available pair it has faced the least."""
+    pairs = list(pairs)
+    round_courts = []
+    while pairs:
+        a, b = pairs.pop(0)
+        oa, ob = opp[a], opp[b]
+        best_i, best_cost = 0, None
+        for i, (c, d) in enumerate(pairs):
+            cost = oa[c] + oa[d] + ob[c] + ob[d]
+            if best_cost is None or cost < best_cost:
+                best_i, best_cost = i, cost
+                if cost == 0:
+                    break
+        c, d = pairs.pop(best_i)
+        round_courts.append((a, b, c, d))
+    return round_courts
+
+
+def _all_courts(pairs: List[Tuple[int, int]]):
+    """Every way to put the pairs against each other."""
+    if not pairs:
+        yield []
+        return
+    first, rest = pairs[0], pairs[1:]
+    for i, other in enumerate(rest):
+        for tail in _all_courts(rest[:i] + rest[i + 1:]):
+            yield [first + other] + tail
+
+
+def _cost(opp: List[List[int]], round_courts: List[Court]) -> int:
+    """Growth of the sum of squared opponent counts (counted both ways)."""
+    total = 0
+    for a, b, c, d in round_courts:
+        for x, y in ((a, c), (a, d), (b, c), (b, d)):
+            total += 2 * opp[x][y] + 1
+    return 2 * total
+
+
+def _play(opp: List[List[int]], round_courts: List[Court]) -> None:
+    for a, b, c, d in round_courts:
+        for x, y in ((a, c), (a, d), (b, c), (b, d)):
+            opp[x][y] += 1
+            opp[y][x] += 1
+
+
+def _whist_design(key: DesignKey) -> Optional[Design]:
+    n_men, n_women, courts, num_rounds, mode = key
+    n = n_men + n_women
+    starter = WHIST_STARTERS.get(n)
+    if mode != CLASSIC or starter is None or courts < len(starter):
+        return None
+    m = n - 1 if n % 4 == 0 else n
+    design = []
+    for r in range(num_rounds):
+        design.append(tuple(
+            tuple(x if x == m else (x + r) % m for x in table)
+            for table in starter
+        ))
+    return tuple(design)
+
+
+@lru_cache(maxsize=256)
+def _heuristic_design(key: DesignKey) -> Design:
+    """Whist design or a single greedy pass, cheap enough for the request path."""
+    whist = _whist_design(key)
+    if whist is not None:
+        return whist
+    n = key[0] + key[1]
+    opp = [[0] * n for _ in range(n)]
+    design = []
+    for pairs in _rotation(key):
+        round_courts = _greedy_courts(pairs, opp)
+        _play(opp, round_courts)
+        design.append(tuple(round_courts))
+    return tuple(design)
+
+
+def _search_design(
+    key: DesignKey, beam_width: int = BEAM_WIDTH, samples: int = SAMPLES,
+) -> Design:
+    """Beam search over the court matchings of each round.
+
+    Rounds with few pairs try every matching, bigger rounds try randomised
+    greedy matchings. Seeded, so every worker builds the same designs.
+    """
+    n = key[0] + key[1]
+    rng = random.Random(repr(key))
+    beam = [(0, [[0] * n for _ in range(n)], ())]
+
+    for round_pairs in _rotation(key):
+        candidates = []
+        for score, opp, design in beam:
+            pairs = list(round_pairs)
+            if len(pairs) <= EXHAUSTIVE_PAIRS:
+                options = _all_courts(pairs)
+            else:
+                options = [_greedy_courts(pairs, opp)]
+                for _ in range(samples - 1):
+                    rng.shuffle(pairs)
+                    options.append(_greedy_courts(pairs, opp))
+            for round_courts in options:
+                candidates.append((score + _cost(opp, round_courts), opp, design, round_courts))
+
+        candidates.sort(key=lambda c: c[0])
+        beam = []
+        for score, opp, design, round_courts in candidates[:beam_width]:
+            opp = [row[:] for row in opp]
+            _play(opp, round_courts)
+            beam.append((score, opp, design + (tuple(round_courts),)))
+
+    return beam[0][2]
+
+
+def _key(n_men: int, n_women: int, courts: int, num_rounds: int, mode: str) -> DesignKey:
+    if mode not in MODES:
+        raise ValueError(f"Unknown Americano mode: {mode}")
+    if mode == CLASSIC:
+        n_men, n_women = n_men + n_women, 0
+    # Courts beyond what the players can fill don't change the design
+    courts = max(1, min(courts, (n_men + n_women) // 4))
+    return (n_men, n_women, courts, num_rounds, mode)
+
+
+def get_design(
+    n_men: int, n_women: int, courts: int, num_rounds: int, mode: str = CLASSIC,
+) -> Design:
+    """Precomputed design when available, fast greedy design otherwise.
+
+    Men are indices 0..n_men-1, women follow. In classic mode the split
+    doesn't matter.
+    """
+    key = _key(n_men, n_women, courts, num_rounds, mode)
+    design = _precomputed.get(key)
+    if design is None:
+        design = _heuristic_design(key)
+    return design
+
+
+def precompute_designs(max_players: int = PRECOMPUTE_MAX_PLAYERS) -> int:
+    """Search good designs for common club sizes; returns how many were built."""
+    built = 0
+    for n in range(4, max_players + 1):
+        for courts in range(1, n // 4 + 1):
+            keys = [_key(n, 0, courts, rounds_needed(n), CLASSIC)]
+            if n % 2 == 0:
+                half = n // 2
+                keys.append(_key(half, half, courts, rounds_needed(half, half, MIXED), MIXED))
+            for key in keys:
+                if key not in _precomputed:
+                    _precomputed[key] = _whist_design(key) or _search_design(key)
+                    built += 1
+    return built
@@ -0,0 +1,176 @@
+import json
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import get_session, TournamentORM, PlayerProfileORM
+from cache import TournamentView, tournament_cache
+from live import match_json
+from service import player_matches, top_profiles, profile_tournaments
+from querycount import query_budget
+from americano.router import _build_view as build_americano_view
+from directory.router import directory_page, tournament_url, PAGE_SIZE, MAX_PAGE_SIZE
+from mexicano.router import _build_view as build_mexicano_view
+
+router = APIRouter(prefix='/api', tags=['API'])
+
+VIEW_BUILDERS = {
+    "americano": build_americano_view,
+    "mexicano": build_mexicano_view,
+}
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison: compressed responses carry W/ tags
+    return etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+
+
+def _etag(tid: str, revision: int) -> str:
+    """Strong ETag of a persisted tournament version, so every worker issues the same one."""
+    return f'"{tid}-{revision}"'
+
+
+async def _revision(session: AsyncSession, tid: str) -> Optional[int]:
+    """TournamentORM.version, None when there is no such tournament."""
+    return await session.scalar(select(TournamentORM.version).where(TournamentORM.id == tid))
+
+
+async def _get_view(tid: str, session: AsyncSession, revision: Optional[int] = None) -> TournamentView:
+    """Cached view; one older than a known `revision` missed a write and is rebuilt."""
+    view = tournament_cache.get(tid)
+    if view is None or (revision is not None and view.revision < revision):
+        version = tournament_cache.version(tid)
+        t_orm = await session.get(TournamentORM, tid)
+        if not t_orm or t_orm.mode not in VIEW_BUILDERS:
+            raise HTTPException(status_code=404, detail="Tournament not found")
+        view = VIEW_BUILDERS[t_orm.mode](t_orm)
+        tournament_cache.put(tid, view, version)
+    return view
+
+
+def _state_json(view: TournamentView) -> bytes:
+    t = view.tournament
+    return json.dumps({
+        "id": t.id,
+        "name": t.name,
+        "mode": view.mode,
+        "status": t.status,
+        "courts": t.courts,
+        "current_round": t.current_round,
+        "total_rounds": view.total_rounds,
+        "archived": view.archived,
+        "players": list(view.players_json.values()),
+        "rounds": [[match_json(m) for m in matches] for matches in t.rounds],
+        "standings": view.standings,
+    }, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def _summary_json(t) -> dict:
+    return {
+        "id": t.id,
+        "mode": t.mode,
+        "name": t.name,
+        "status": t.status,
+        "courts": t.courts,
+        "current_round": t.current_round,
+        "total_rounds": t.total_rounds,
+        "archived": t.archived,
+        "created_at": t.created_at.isoformat() if t.created_at else None,
+        "url": tournament_url(t.mode, t.id),
+    }
+
+
+@router.get("/tournaments")
+@query_budget(1)
+async def tournament_list(
+    mode: str = "",
+    status: str = "",
+    q: str = "",
+    after: str = "",
+    limit: int = PAGE_SIZE,
+    session: AsyncSession = Depends(get_session),
+):
+    """Directory page as JSON; pass `next` back as `after` for the following page."""
+    rows, next_after = await directory_page(session, mode, status, q, after, limit)
+    return {
+        "items": [_summary_json(t) for t in rows],
+        "next": next_after,
+    }
+
+
+@router.get("/tournaments/{tid}")
+@query_budget(4)
+async def tournament_state(request: Request, tid: str, session: AsyncSession = Depends(get_session)):
+    """Tournament state as JSON; polling clients get 304 until the next write.
+
+    A conditional request costs one primary key lookup of the version.
+    """
+    if_none_match = request.headers.get("if-none-match", "")
+    revision = None
+    if if_none_match:
+        revision = await _revision(session, tid)
+        if revision is None:
+            raise HTTPException(status_code=404, detail="Tournament not found")
+        etag = _etag(tid, revision)
+        if _etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+    view = await _get_view(tid, session, revision)
+    if view.api_body is None:
+        view.api_body = _state_json(view)
+    headers = {"ETag": _etag(tid, view.revision), "Cache-Control": "no-cache"}
+    return Response(view.api_body, media_type="application/json", headers=headers)
+
+
+@router.get("/tournaments/{tid}/players/{pid}/matches")
+@query_budget(5)
+async def player_match_list(request: Request, tid: str, pid: str, session: AsyncSession = Depends(get_session)):
+    """Matches of one player, looked up through match_participants."""
+    revision = await _revision(session, tid)
+    if revision is None:
+        raise HTTPException(status_code=404, detail="Tournament not found")
+    headers = {"ETag": _etag(tid, revision), "Cache-Control": "no-cache"}
+    if _etag_matches(request.headers.get("if-none-match", ""), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    matches = await player_matches(session, tid, pid)
+    if not matches:
+        # Archived tournaments have no match rows left, their matches are in the snapshot
+        view = await _get_view(tid, session, revision)
+        matches = [
+            m for matches in view.tournament.rounds for m in matches
+            if pid in m.team1 or pid in m.team2
+        ]
+    body = json.dumps([match_json(m) for m in matches], ensure_ascii=False, separators=(",", ":"))
+    return Response(body, media_type="application/json", headers=headers)
+
+
+def _profile_json(p: PlayerProfileORM) -> dict:
+    return {"id": p.id, "name": p.name, "rating": round(p.rating, 1), "matches_played": p.matches_played}
+
+
+@router.get("/players")
+@query_budget(1)
+async def player_ranking(q: str = "", limit: int = 50, session: AsyncSession = Depends(get_session)):
+    """Players across all tournaments, best rated first."""
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"limit должен быть от 1 до {MAX_PAGE_SIZE}")
+    return [_profile_json(p) for p in await top_profiles(session, q.strip(), limit)]
+
+
+@router.get("/players/{profile_id}")
+@query_budget(2)
+async def player_profile(profile_id: str, session: AsyncSession = Depends(get_session)):
+    profile = await session.get(PlayerProfileORM, profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Игрок не найден")
+    return {
+        **_profile_json(profile),
+        "tournaments": [_summary_json(t) for t in await profile_tournaments(session, profile_id)],
+    }
@@ -0,0 +1,171 @@
+"""Archival of finished tournaments.
+
+A finished tournament is compacted into one immutable row of
+tournament_snapshots: players, matches and final standings as
+zlib-compressed JSON. Its players, matches and match_participants rows
+are deleted and `archived` is set; the routers' `_build_view` then reads
+the snapshot instead of the per-row data.
+
+    python archive.py                    # finished and older than 24 h
+    python archive.py --older-than 0     # every finished tournament
+    python archive.py <tid> [<tid> ...]  # just these
+
+Set ARCHIVE_AFTER_HOURS to also run it from the app every
+ARCHIVE_INTERVAL_MINUTES (see `archive_loop`).
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import zlib
+from dataclasses import asdict
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Tuple
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from americano.models import Match, Player, Tournament
+from cache import TournamentView
+from database import (
+    AsyncSessionLocal, MatchORM, MatchParticipantORM, PlayerORM,
+    TournamentORM, TournamentSnapshotORM, engine,
+)
+from live import tournament_changed
+from service import bump_version
+
+SNAPSHOT_FORMAT = 1
+
+ARCHIVE_AFTER_HOURS = float(os.getenv("ARCHIVE_AFTER_HOURS", "0"))  # 0: only by hand
+ARCHIVE_INTERVAL_MINUTES = float(os.getenv("ARCHIVE_INTERVAL_MINUTES", "60"))
+ARCHIVE_BATCH = int(os.getenv("ARCHIVE_BATCH", "100"))
+
+ViewBuilder = Callable[[TournamentORM], TournamentView]
+
+log = logging.getLogger(__name__)
+
+
+def encode_snapshot(view: TournamentView) -> bytes:
+    t = view.tournament
+    return zlib.compress(json.dumps({
+        "players": [asdict(p) for p in t.players.values()],
+        "rounds": [[asdict(m) for m in matches] for matches in t.rounds],
+        "standings": view.standings,
+    }, ensure_ascii=False, separators=(",", ":")).encode(), 9)
+
+
+def decode_snapshot(data: bytes) -> dict:
+    return json.loads(zlib.decompress(data))
+
+
+def load_snapshot(t_orm: TournamentORM) -> Tuple[Tournament, List[dict]]:
+    """Tournament and final standings of an archived tournament."""
+    snapshot = t_orm.snapshot
+    if snapshot is None or snapshot.format != SNAPSHOT_FORMAT:
+        raise ValueError(f"Tournament {t_orm.id} has no readable snapshot")
+    data = decode_snapshot(snapshot.data)
+    players = {p["id"]: Player(**p) for p in data["players"]}
+    rounds = [[Match(**m) for m in matches] for matches in data["rounds"]]
+    t = Tournament(
+        id=t_orm.id, name=t_orm.name, courts=t_orm.courts,
+        players=players, rounds=rounds,
+        current_round=t_orm.current_round,
+        status=t_orm.status,
+    )
+    return t, data["standings"]
+
+
+async def archive_tournament(session: AsyncSession, tid: str, builders: Dict[str, ViewBuilder]) -> bool:
+    """Snapshot one finished tournament and drop its rows; False if it doesn't qualify.
+
+    `builders` maps mode to the router's `_build_view`, so the snapshot
+    holds exactly what the page shows.
+    """
+    t_orm = await session.get(TournamentORM, tid)
+    if t_orm is None or t_orm.archived or t_orm.status != "finished" or t_orm.mode not in builders:
+        return False
+
+    view = builders[t_orm.mode](t_orm)
+    session.add(TournamentSnapshotORM(
+        tournament_id=tid, format=SNAPSHOT_FORMAT, data=encode_snapshot(view),
+    ))
+    t_orm.archived = True
+    await session.flush()
+    for model in (MatchParticipantORM, MatchORM, PlayerORM):
+        await session.execute(
+            delete(model)
+            .where(model.tournament_id == tid)
+            .execution_options(synchronize_session=False)
+        )
+    # A score edit that slipped in meanwhile would be lost, leave the tournament for next time
+    if not await bump_version(session, tid, t_orm.version):
+        await session.rollback()
+        return False
+    await session.commit()
+    tournament_changed(tid, {"type": "archive"}, history=True)
+    return True
+
+
+async def archive_finished(
+    builders: Dict[str, ViewBuilder], older_than: timedelta, limit: int = ARCHIVE_BATCH,
+) -> List[str]:
+    """Archive up to `limit` finished tournaments created before now - older_than."""
+    cutoff = datetime.now(timezone.utc) - older_than
+    async with AsyncSessionLocal() as session:
+        tids = list((await session.execute(
+            select(TournamentORM.id)
+            .where(
+                TournamentORM.status == "finished",
+                TournamentORM.archived.is_(False),
+                TournamentORM.created_at < cutoff,
+            )
+            .order_by(TournamentORM.created_at)
+            .limit(limit)
+        )).scalars())
+
+    done = []
+    for tid in tids:
+        # One transaction per tournament, a failure only skips that one
+        try:
+            async with AsyncSessionLocal() as session:
+                if await archive_tournament(session, tid, builders):
+                    done.append(tid)
+        except Exception:
+            log.exception("Archiving tournament %s failed", tid)
+    return done
+
+
+async def archive_loop(builders: Dict[str, ViewBuilder]) -> None:
+    """Background task of the app, started by the lifespan when ARCHIVE_AFTER_HOURS is set."""
+    while True:
+        await asyncio.sleep(ARCHIVE_INTERVAL_MINUTES * 60)
+        try:
+            done = await archive_finished(builders, timedelta(hours=ARCHIVE_AFTER_HOURS))
+            if done:
+                log.info("Archived %d tournaments", len(done))
+        except Exception:
+            log.exception("Archival run failed")
+
+
+async def _main(args: argparse.Namespace) -> None:
+    from api.router import VIEW_BUILDERS
+
+    if args.tids:
+        done = []
+        for tid in args.tids:
+            async with AsyncSessionLocal() as session:
+                if await archive_tournament(session, tid, VIEW_BUILDERS):
+                    done.append(tid)
+    else:
+        done = await archive_finished(VIEW_BUILDERS, timedelta(hours=args.older_than), args.limit)
+    print(f"Archived {len(done)}: {', '.join(done)}" if done else "Nothing to archive")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("tids", nargs="*", help="archive these tournaments (must be finished)")
+    parser.add_argument("--older-than", type=float, default=24, help="hours since creation, default 24")
+    parser.add_argument("--limit", type=int, default=ARCHIVE_BATCH)
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,82 @@
+"""Fingerprinted static assets.
+
+`python build_assets.py` writes the bundles below, minified and named by
+content hash, to static/dist/ with .gz (and .br) siblings and a
+manifest. Templates link them through `asset_urls`; without a build the
+source files are linked one by one, as before.
+
+Hashed files never change, so PrecompressedStaticFiles serves them as
+immutable for a year, picking the precompressed variant the client accepts.
+"""
+import json
+import os
+from pathlib import Path
+from typing import Dict, List
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles
+
+from compression import negotiate
+
+STATIC_DIR = Path(__file__).resolve().parent / "static"
+DIST_DIR = STATIC_DIR / "dist"
+MANIFEST = DIST_DIR / "manifest.json"
+
+# One stylesheet per page: the base, the shared rules, then the page's own
+BUNDLES: Dict[str, tuple] = {
+    "index.css": ("css/base_main.css", "css/common.css", "css/index_main.css"),
+    "americano.css": ("css/base_americano.css", "css/common.css", "css/americano.css"),
+    "mexicano.css": ("css/base_mexicano.css", "css/common.css", "css/mexicano.css"),
+    "live.js": ("js/live.js",),
+}
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+ENCODINGS = {"br": ".br", "gzip": ".gz"}  # in order of preference
+
+
+def load_manifest() -> Dict[str, str]:
+    """Bundle name -> hashed file name in static/dist, empty when not built."""
+    if os.getenv("ASSETS_DEV") == "1" or not MANIFEST.exists():
+        return {}
+    return json.loads(MANIFEST.read_text())
+
+
+_manifest = load_manifest()
+
+
+def asset_urls(name: str) -> List[str]:
+    if name in _manifest:
+        return [f"/static/dist/{_manifest[name]}"]
+    return [f"/static/{path}" for path in BUNDLES.get(name, (name,))]
+
+
+def install(templates) -> None:
+    """Make `asset_urls` available to the templates of a Jinja2Templates."""
+    templates.env.globals["asset_urls"] = asset_urls
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles that answers dist/ requests with the .br or .gz file next to the asset."""
+
+    async def get_response(self, path: str, scope) -> Response:
+        response = await super().get_response(path, scope)
+        if not path.startswith("dist/") or response.status_code != 200:
+            return response
+
+        accept_encoding = Headers(scope=scope).get("accept-encoding", "")
+        offered = list(ENCODINGS)
+        # The best accepted variant that was built, .br only exists with brotli installed
+        while (encoding := negotiate(accept_encoding, offered)) is not None:
+            offered.remove(encoding)
+            full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path + ENCODINGS[encoding])
+            if stat_result is not None:
+                response = FileResponse(
+                    full_path, stat_result=stat_result, media_type=response.media_type,
+                    headers={"content-encoding": encoding},
+                )
+                break
+        response.headers["cache-control"] = IMMUTABLE
+        response.headers["vary"] = "Accept-Encoding"
+        return response
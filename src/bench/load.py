@@ -0,0 +1,261 @@
+"""End-to-end load test of the tournament lifecycle.
+
+Every simulated tournament walks the whole flow: create, view, submit
+scores on all courts at once, edit a score, swap a player, next round and
+finish. Many tournaments run concurrently.
+
+    python bench/load.py                          # in-process, httpx ASGI transport
+    python bench/load.py --url http://127.0.0.1:8000
+    python bench/load.py -t 50 --players 16 --courts 4 --rounds 5
+
+Prints per-route p50/p95/p99 latency and throughput and saves them to
+bench/results/. DB query counts are only available in-process.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from contextlib import nullcontext
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+import numpy as np
+
+SRC_DIR = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.queries: Optional[Dict[str, int]] = None
+        self._track = None
+
+    def count_queries(self) -> None:
+        """In-process only: count each request's statements with querycount."""
+        from querycount import track
+
+        self.queries = defaultdict(int)
+        self._track = track
+
+    async def request(self, client: httpx.AsyncClient, route: str, method: str, url: str, **kwargs) -> httpx.Response:
+        start = time.perf_counter()
+        try:
+            with self._track() if self._track else nullcontext() as stats:
+                response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.errors[route] += 1
+            raise
+        finally:
+            self.latencies[route].append(time.perf_counter() - start)
+        if stats is not None:
+            self.queries[route] += stats.queries
+        if response.status_code >= 400:
+            self.errors[route] += 1
+        return response
+
+    def report(self, elapsed: float) -> dict:
+        routes = {}
+        for route, samples in sorted(self.latencies.items()):
+            ms = np.array(samples) * 1000
+            p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+            routes[route] = {
+                "count": len(samples),
+                "errors": self.errors.get(route, 0),
+                "mean_ms": round(float(ms.mean()), 3),
+                "p50_ms": round(float(p50), 3),
+                "p95_ms": round(float(p95), 3),
+                "p99_ms": round(float(p99), 3),
+                "rps": round(len(samples) / elapsed, 1),
+                "queries_per_request": (
+                    round(self.queries.get(route, 0) / len(samples), 2)
+                    if self.queries is not None else None
+                ),
+            }
+        total = sum(r["count"] for r in routes.values())
+        return {
+            "routes": routes,
+            "total": {
+                "requests": total,
+                "errors": sum(self.errors.values()),
+                "seconds": round(elapsed, 3),
+                "rps": round(total / elapsed, 1),
+                "queries": sum(self.queries.values()) if self.queries is not None else None,
+            },
+        }
+
+
+async def _state(rec: Recorder, client: httpx.AsyncClient, tid: str) -> dict:
+    r = await rec.request(client, "GET /api/tournaments/{tid}", "GET", f"/api/tournaments/{tid}")
+    return r.json()
+
+
+async def run_tournament(rec: Recorder, client: httpx.AsyncClient, mode: str, args, n: int) -> None:
+    rng = random.Random(n)
+    names = "\n".join(f"Игрок {n}-{i}" for i in range(args.players))
+    if mode == "americano":
+        base = "/americano/tournament"
+        r = await rec.request(client, "POST /americano/tournament/create", "POST", f"{base}/create", data={
+            "name": f"Нагрузка {n}", "courts": args.courts, "player_names": names,
+        })
+        page = "/americano/tournament/{tid}"
+        swap = "/americano/tournament/{tid}/swap-player"
+    else:
+        base = "/mexicano"
+        r = await rec.request(client, "POST /mexicano/create", "POST", f"{base}/create", data={
+            "name": f"Нагрузка {n}", "courts": args.courts, "num_rounds": args.rounds,
+            "player_names": names, "pairing": rng.choice(("rank", "balanced")),
+        })
+        page = "/mexicano/{tid}"
+        swap = "/mexicano/tournament/{tid}/swap-player"
+    tid = r.headers["location"].rstrip("/").rsplit("/", 1)[1]
+    url = f"{base}/{tid}"
+
+    for round_idx in range(args.rounds):
+        await rec.request(client, f"GET {page}", "GET", page.format(tid=tid))
+        state = await _state(rec, client, tid)
+        if state["current_round"] >= len(state["rounds"]):
+            break
+        matches = state["rounds"][state["current_round"]]
+
+        if round_idx == 0 and matches:
+            # Swap two players of the first court before anything is played
+            m = matches[0]
+            await rec.request(
+                client, f"POST {swap}", "POST", swap.format(tid=tid),
+                data={"match_id": m["id"], "position": "team1-0", "new_pid": m["team2"][1]},
+            )
+
+        # Every court finishes at once
+        await asyncio.gather(*(
+            rec.request(client, f"POST {base}/{{tid}}/score", "POST", f"{url}/score", data={
+                "match_id": m["id"], "score1": rng.randint(0, 6), "score2": rng.randint(0, 6),
+            })
+            for m in matches
+        ))
+        if matches:
+            await rec.request(client, f"POST {base}/{{tid}}/edit-score", "POST", f"{url}/edit-score", data={
+                "match_id": matches[0]["id"], "score1": 6, "score2": rng.randint(0, 5),
+            })
+
+        if round_idx < args.rounds - 1 and state["current_round"] + 1 < state["total_rounds"]:
+            await rec.request(client, f"POST {base}/{{tid}}/next-round", "POST", f"{url}/next-round")
+        else:
+            break
+
+    await rec.request(client, f"POST {base}/{{tid}}/finish", "POST", f"{url}/finish")
+    await rec.request(client, f"GET {page}", "GET", page.format(tid=tid))
+    if not args.keep:
+        await rec.request(client, f"POST {base}/{{tid}}/delete", "POST", f"{url}/delete")
+
+
+async def run(args) -> dict:
+    rec = Recorder()
+    limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency * 2)
+
+    async def drive(client: httpx.AsyncClient) -> float:
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def one(n: int) -> None:
+            async with semaphore:
+                mode = args.mode if args.mode != "both" else ("americano", "mexicano")[n % 2]
+                await run_tournament(rec, client, mode, args, n)
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(one(n) for n in range(args.tournaments)), return_exceptions=True)
+        elapsed = time.perf_counter() - start
+        failed = [r for r in results if isinstance(r, BaseException)]
+        if failed:
+            print(f"{len(failed)} tournaments failed, first error: {failed[0]!r}", file=sys.stderr)
+        return elapsed
+
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=60) as client:
+            elapsed = await drive(client)
+    else:
+        os.chdir(SRC_DIR)
+        sys.path.insert(0, str(SRC_DIR))
+        from main import app, lifespan
+
+        rec.count_queries()
+        async with lifespan(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+                elapsed = await drive(client)
+
+    report = rec.report(elapsed)
+    report["meta"] = {
+        "label": args.label,
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "target": args.url or "in-process",
+        "mode": args.mode,
+        "tournaments": args.tournaments,
+        "concurrency": args.concurrency,
+        "players": args.players,
+        "courts": args.courts,
+        "rounds": args.rounds,
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+    }
+    return report
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=SRC_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(report: dict) -> None:
+    header = f"{'route':48} {'n':>6} {'err':>4} {'p50':>8} {'p95':>8} {'p99':>8} {'rps':>8} {'q/req':>6}"
+    print(header)
+    print("-" * len(header))
+    for route, r in report["routes"].items():
+        q = "" if r["queries_per_request"] is None else f"{r['queries_per_request']:.1f}"
+        print(
+            f"{route:48} {r['count']:>6} {r['errors']:>4} {r['p50_ms']:>8.2f} "
+            f"{r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['rps']:>8.1f} {q:>6}"
+        )
+    t = report["total"]
+    print(f"\n{t['requests']} requests, {t['errors']} errors in {t['seconds']:.2f}s, {t['rps']:.1f} req/s"
+          + (f", {t['queries']} queries" if t["queries"] is not None else ""))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="running server, default: in-process ASGI")
+    parser.add_argument("-t", "--tournaments", type=int, default=20)
+    parser.add_argument("-c", "--concurrency", type=int, default=10, help="tournaments in flight")
+    parser.add_argument("--mode", choices=("americano", "mexicano", "both"), default="both")
+    parser.add_argument("--players", type=int, default=12)
+    parser.add_argument("--courts", type=int, default=3)
+    parser.add_argument("--rounds", type=int, default=4, help="rounds played per tournament")
+    parser.add_argument("--keep", action="store_true", help="don't delete the tournaments afterwards")
+    parser.add_argument("--label", default="", help="free text stored with the results")
+    parser.add_argument("-o", "--out", type=Path, help="results file, default bench/results/load-<time>.json")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print_report(report)
+
+    out = args.out or RESULTS_DIR / f"load-{datetime.now():%Y%m%d-%H%M%S}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, ensure_ascii=False, indent=2))
+    print(f"Saved to {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+"""Microbenchmarks of the hot pure functions.
+
+Covers the round generators, both calculate_standings and the routers'
+_orm_to_tournament over 4..256 players, 1..32 courts and up to 30 rounds,
+plus the rating replay over 10k..100k matches, with time per call and the
+memory each call allocates (tracemalloc).
+
+    python bench/micro.py                          # full grid
+    python bench/micro.py --quick -k mexicano      # small grid, filtered
+    python bench/micro.py --save-baseline bench/results/micro-baseline.json
+    python bench/micro.py --compare bench/results/micro-baseline.json --threshold 0.25
+
+With --compare the exit status is 1 when a case got slower (median time)
+or allocates more (peak memory) than the baseline by more than the threshold.
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Tuple
+
+import numpy as np
+
+SRC_DIR = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+os.chdir(SRC_DIR)
+sys.path.insert(0, str(SRC_DIR))
+
+from americano import functions as americano_fn                      # noqa: E402
+from americano import router as americano_router                     # noqa: E402
+from americano.models import Player, Tournament, generate_id         # noqa: E402
+from americano.schedule import _heuristic_design, rounds_needed      # noqa: E402
+from database import MatchORM, PlayerORM, TournamentORM              # noqa: E402
+from mexicano import functions as mexicano_fn                        # noqa: E402
+from mexicano import router as mexicano_router                       # noqa: E402
+from mexicano.pairing import BALANCED, RANK, PairingHistory          # noqa: E402
+import rating                                                        # noqa: E402
+
+PLAYERS = (4, 8, 16, 32, 64, 128, 256)
+COURTS = (1, 4, 8, 16, 32)
+MAX_ROUNDS = 30
+QUICK_PLAYERS = (4, 16, 64)
+QUICK_COURTS = (1, 4, 16)
+RATED_MATCHES = (10_000, 100_000)
+QUICK_RATED_MATCHES = (10_000,)
+
+# (name, params, factory); the factory does the setup and returns the call to time
+Case = Tuple[str, dict, Callable[[], Callable[[], object]]]
+
+
+def _ids(n: int) -> List[str]:
+    return [generate_id() for _ in range(n)]
+
+
+def _tournament(n: int, courts: int, num_rounds: int) -> Tournament:
+    """A tournament mid-way: played rounds with scores, players with stats."""
+    rng = random.Random(n * 1000 + courts)
+    ids = _ids(n)
+    rounds = americano_fn.generate_americano_rounds(ids, courts, num_rounds)
+    players = {pid: Player(id=pid, name=f"Игрок {i}", sex="M") for i, pid in enumerate(ids)}
+    for matches in rounds:
+        for m in matches:
+            m.score1, m.score2, m.completed = rng.randint(0, 6), rng.randint(0, 6), True
+            for team, own, other in ((m.team1, m.score1, m.score2), (m.team2, m.score2, m.score1)):
+                for pid in team:
+                    p = players[pid]
+                    p.points += own
+                    p.games_played += 1
+                    p.games_won += own > other
+                    p.games_lost += own <= other
+    return Tournament(
+        id=generate_id(), name="Бенчмарк", courts=courts, players=players,
+        rounds=rounds, current_round=len(rounds), status="active",
+    )
+
+
+def _orm(t: Tournament) -> TournamentORM:
+    """Transient ORM graph shaped like what the selectin loads return."""
+    t_orm = TournamentORM(
+        id=t.id, mode="americano", name=t.name, courts=t.courts, status=t.status,
+        current_round=t.current_round, total_rounds=len(t.rounds), pairing=RANK, version=0,
+    )
+    t_orm.players = [
+        PlayerORM(
+            id=p.id, tournament_id=t.id, name=p.name, sex=p.sex, points=p.points,
+            games_played=p.games_played, games_won=p.games_won, games_lost=p.games_lost,
+        )
+        for p in t.players.values()
+    ]
+    t_orm.matches = [
+        MatchORM(
+            id=m.id, tournament_id=t.id, round=m.round, court=m.court,
+            team1=list(m.team1), team2=list(m.team2),
+            score1=m.score1, score2=m.score2, completed=m.completed,
+        )
+        for matches in t.rounds for m in matches
+    ]
+    return t_orm
+
+
+def _grid(players, courts) -> Iterator[Tuple[int, int]]:
+    for n in players:
+        for c in courts:
+            if c <= max(1, n // 4):
+                yield n, c
+
+
+def cases(quick: bool) -> List[Case]:
+    players = QUICK_PLAYERS if quick else PLAYERS
+    courts = QUICK_COURTS if quick else COURTS
+    result: List[Case] = []
+
+    for n, c in _grid(players, courts):
+        num_rounds = min(rounds_needed(n), MAX_ROUNDS)
+        params = {"players": n, "courts": c, "rounds": num_rounds}
+
+        def americano_warm(n=n, c=c, num_rounds=num_rounds):
+            ids = _ids(n)
+            americano_fn.generate_americano_rounds(ids, c, num_rounds)
+            return lambda: americano_fn.generate_americano_rounds(ids, c, num_rounds)
+
+        def americano_cold(n=n, c=c, num_rounds=num_rounds):
+            ids = _ids(n)
+
+            def call():
+                _heuristic_design.cache_clear()
+                return americano_fn.generate_americano_rounds(ids, c, num_rounds)
+            return call
+
+        def americano_single(n=n, c=c):
+            ids = _ids(n)
+            # The function pads its argument with byes, give it a fresh list
+            return lambda: americano_fn.generate_americano_round(list(ids), c, 0)
+
+        result += [
+            ("generate_americano_rounds", params, americano_warm),
+            ("generate_americano_rounds[cold design]", params, americano_cold),
+            ("generate_americano_round", {"players": n, "courts": c}, americano_single),
+        ]
+
+        for pairing in (RANK, BALANCED):
+            def mexicano(n=n, c=c, num_rounds=num_rounds, pairing=pairing):
+                t = _tournament(n, c, num_rounds)
+                history = None
+                if pairing == BALANCED:
+                    history = PairingHistory(list(t.players))
+                    history.sync(t.rounds, len(t.rounds))
+                return lambda: mexicano_fn.generate_mexicano_round(t, len(t.rounds), pairing, history)
+            result.append((f"generate_mexicano_round[{pairing}]", params, mexicano))
+
+        for label, module in (("americano", americano_fn), ("mexicano", mexicano_fn)):
+            def standings(n=n, c=c, num_rounds=num_rounds, module=module):
+                t = _tournament(n, c, num_rounds)
+                return lambda: module.calculate_standings(t)
+            result.append((f"{label}.calculate_standings", params, standings))
+
+        for label, router in (("americano", americano_router), ("mexicano", mexicano_router)):
+            def orm_to_tournament(n=n, c=c, num_rounds=num_rounds, router=router):
+                t_orm = _orm(_tournament(n, c, num_rounds))
+                return lambda: router._orm_to_tournament(t_orm)
+            result.append((f"{label}._orm_to_tournament", params, orm_to_tournament))
+
+    for m in QUICK_RATED_MATCHES if quick else RATED_MATCHES:
+        def rating_replay(m=m):
+            # Clubs of 100 players, every match four distinct players of one club
+            rng = np.random.default_rng(m)
+            clubs, size = max(1, m // 2000), 100
+            players = rng.random((m, size)).argsort(axis=1)[:, :4] + rng.integers(0, clubs, (m, 1)) * size
+            scores = rng.integers(0, 7, (m, 2)).astype(np.float64)
+            return lambda: rating.replay(players, scores, clubs * size)
+        result.append(("rating.replay", {"matches": m}, rating_replay))
+
+    return result
+
+
+def measure(fn: Callable[[], object], min_time: float, repeat: int) -> dict:
+    # Calibrate so one sample takes about min_time
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or number >= 1 << 20:
+            break
+        number *= 2 if elapsed == 0 else max(2, min(10, int(min_time / elapsed) + 1))
+
+    samples = []
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(number):
+                fn()
+            samples.append((time.perf_counter() - start) / number)
+    finally:
+        gc.enable()
+
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        fn()
+        after, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "median_us": round(statistics.median(samples) * 1e6, 3),
+        "min_us": round(min(samples) * 1e6, 3),
+        "stdev_us": round(statistics.pstdev(samples) * 1e6, 3),
+        "loops": number,
+        "peak_kib": round((peak - before) / 1024, 2),
+        "retained_kib": round((after - before) / 1024, 2),
+    }
+
+
+def _key(name: str, params: dict) -> str:
+    return name + "(" + ", ".join(f"{k}={v}" for k, v in params.items()) + ")"
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], threshold: float) -> List[str]:
+    regressions = []
+    for key, r in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        for metric in ("median_us", "peak_kib"):
+            # Tiny allocations jitter by a few hundred bytes, ignore them
+            if metric == "peak_kib" and base[metric] < 1:
+                continue
+            if base[metric] > 0 and r[metric] > base[metric] * (1 + threshold):
+                regressions.append(
+                    f"{key}: {metric} {base[metric]} -> {r[metric]} "
+                    f"(+{(r[metric] / base[metric] - 1) * 100:.0f}%)"
+                )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quick", action="store_true", help="small grid")
+    parser.add_argument("-k", dest="filter", default="", help="only cases whose name contains this")
+    parser.add_argument("--min-time", type=float, default=0.05, help="seconds per sample")
+    parser.add_argument("--repeat", type=int, default=5, help="samples per case")
+    parser.add_argument("-o", "--out", type=Path, help="results file, default bench/results/micro-<time>.json")
+    parser.add_argument("--save-baseline", type=Path, help="also write the results here as the baseline")
+    parser.add_argument("--compare", type=Path, help="baseline to check against")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown, 0.25 = 25%%")
+    args = parser.parse_args()
+
+    results: Dict[str, dict] = {}
+    for name, params, factory in cases(args.quick):
+        if args.filter not in name:
+            continue
+        key = _key(name, params)
+        results[key] = {"name": name, "params": params, **measure(factory(), args.min_time, args.repeat)}
+        r = results[key]
+        print(f"{key:78} {r['median_us']:>12.1f} us {r['peak_kib']:>10.1f} KiB")
+
+    report = {
+        "meta": {
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "quick": args.quick,
+            "min_time": args.min_time,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    out = args.out or RESULTS_DIR / f"micro-{datetime.now():%Y%m%d-%H%M%S}.json"
+    for path in filter(None, (out, args.save_baseline)):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(report, ensure_ascii=False, indent=2))
+        print(f"Saved to {path}")
+
+    if args.compare:
+        baseline = json.loads(args.compare.read_text())["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regressions over {args.threshold:.0%}:")
+            for line in regressions:
+                print("  " + line)
+            return 1
+        print(f"\nNo regressions over {args.threshold:.0%} against {args.compare}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+"""Build the static bundles of assets.BUNDLES into static/dist/.
+
+    python build_assets.py
+
+Each bundle is concatenated, minified, stripped of duplicate rules, named
+by content hash and written with .gz and, when the brotli package is
+installed, .br siblings. manifest.json maps bundle names to the files.
+Run it after changing anything in static/css or static/js; the app picks
+the manifest up on start.
+"""
+import gzip
+import hashlib
+import json
+import re
+import shutil
+from typing import List
+
+from assets import BUNDLES, DIST_DIR, MANIFEST, STATIC_DIR
+
+try:
+    import brotli
+except ImportError:  # optional, gzip only then
+    brotli = None
+
+_CSS_STRING = r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\''
+_CSS_TOKENS = re.compile(rf'({_CSS_STRING})|/\*.*?\*/', re.S)
+
+
+def _squeeze(text: str) -> str:
+    text = re.sub(r'\s+', " ", text)
+    text = re.sub(r' ?([{};,>]) ?', r"\1", text)
+    # Only after the colon: a space before it is a descendant selector (a :hover)
+    return re.sub(r': ', ":", text)
+
+
+def minify_css(css: str) -> str:
+    # split() alternates text and the string group, which is None where a comment matched
+    parts = _CSS_TOKENS.split(css)
+    out, text = [], parts[0]
+    for string, after in zip(parts[1::2], parts[2::2]):
+        if string is None:
+            text += " " + after
+        else:
+            out += [_squeeze(text), string]
+            text = after
+    out.append(_squeeze(text))
+    return "".join(out).replace(";}", "}").strip()
+
+
+def css_blocks(css: str) -> List[str]:
+    """Top-level rules and at-rule blocks of minified CSS."""
+    blocks, depth, start, quote = [], 0, 0, None
+    for i, ch in enumerate(css):
+        if quote:
+            if ch == quote and css[i - 1] != "\\":
+                quote = None
+        elif ch in "\"'":
+            quote = ch
+        elif ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                blocks.append(css[start:i + 1])
+                start = i + 1
+        elif ch == ";" and depth == 0:
+            # @import / @charset
+            blocks.append(css[start:i + 1])
+            start = i + 1
+    if css[start:].strip():
+        blocks.append(css[start:])
+    return blocks
+
+
+def dedupe_css(css: str) -> str:
+    """Keep only the last copy of identical rules.
+
+    The last copy decides the cascade anyway, whatever sits between them,
+    so dropping the earlier ones changes nothing.
+    """
+    blocks = css_blocks(css)
+    last = {block: i for i, block in enumerate(blocks)}
+    return "".join(block for i, block in enumerate(blocks) if last[block] == i)
+
+
+def minify_js(js: str) -> str:
+    """Drop indentation, blank lines and whole-line // comments; template literals stay as they are."""
+    lines, in_template = [], False
+    for line in js.splitlines():
+        if in_template:
+            lines.append(line)
+        else:
+            stripped = line.strip()
+            if stripped and not stripped.startswith("//"):
+                lines.append(stripped)
+        if line.replace("\\`", "").count("`") % 2:
+            in_template = not in_template
+    return "\n".join(lines) + "\n"
+
+
+def build_bundle(name: str) -> bytes:
+    source = "\n".join((STATIC_DIR / path).read_text(encoding="utf-8") for path in BUNDLES[name])
+    if name.endswith(".css"):
+        return dedupe_css(minify_css(source)).encode()
+    return minify_js(source).encode()
+
+
+def main() -> None:
+    shutil.rmtree(DIST_DIR, ignore_errors=True)
+    DIST_DIR.mkdir(parents=True)
+    manifest = {}
+    source_size = built_size = gz_size = 0
+    for name in BUNDLES:
+        data = build_bundle(name)
+        stem, ext = name.rsplit(".", 1)
+        filename = f"{stem}.{hashlib.sha256(data).hexdigest()[:12]}.{ext}"
+        (DIST_DIR / filename).write_bytes(data)
+        gz = gzip.compress(data, 9, mtime=0)
+        (DIST_DIR / f"{filename}.gz").write_bytes(gz)
+        if brotli is not None:
+            (DIST_DIR / f"{filename}.br").write_bytes(brotli.compress(data, quality=11))
+        manifest[name] = filename
+
+        size = sum((STATIC_DIR / path).stat().st_size for path in BUNDLES[name])
+        source_size, built_size, gz_size = source_size + size, built_size + len(data), gz_size + len(gz)
+        print(f"{name:16} {size:>8} -> {len(data):>7} min -> {len(gz):>6} gz  {filename}")
+    MANIFEST.write_text(json.dumps(manifest, indent=2))
+    print(f"{'total':16} {source_size:>8} -> {built_size:>7} min -> {gz_size:>6} gz"
+          + ("" if brotli else "  (no brotli package, .br skipped)"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""Change notifications between workers over Postgres LISTEN/NOTIFY.
+
+Every worker keeps its own tournament cache and its own SSE subscribers,
+so a write must reach the other workers too. After a write commits,
+`publish` queues (tournament id, history flag, live event); one task per
+worker sends the queue with pg_notify and listens on the same dedicated
+asyncpg connection. The other workers receive the notification, drop
+their cached views and push the event to their open pages. A worker
+skips its own notifications, it has applied them already.
+
+Payloads over NOTIFY's 8000 byte limit go without the event, pages then
+reload. While the connection is down the queue keeps filling; on every
+(re)connect the worker forgets its whole cache, since it may have missed
+changes. Off on SQLite, and with CHANGE_BUS=0. Behind pgbouncer in
+transaction mode LISTEN does not work: point BUS_POSTGRES_DB_URL at
+Postgres itself.
+"""
+import asyncio
+import json
+import logging
+import os
+from typing import Callable, List, Optional
+
+import asyncpg
+
+from database import DB_BACKEND, POSTGRES_PASSWORD, POSTGRES_USER, POSTGRES_DB
+from metrics import BUS_MESSAGES
+
+CHANNEL = "padel_changes"
+BUS_ENABLED = DB_BACKEND == "postgres" and os.getenv("CHANGE_BUS", "1") == "1"
+BUS_DB = os.getenv("BUS_POSTGRES_DB_URL", POSTGRES_DB)
+QUEUE_SIZE = 10000
+BATCH = 100              # notifications per round trip
+PAYLOAD_LIMIT = 7900     # bytes, Postgres refuses 8000 and more
+KEEPALIVE = 30.0         # seconds of silence before the connection is checked
+MAX_RETRY_DELAY = 30.0
+
+_FLUSH_ALL = '{"all":1}'
+_STOP = None
+
+log = logging.getLogger("bus")
+
+OnChange = Callable[[str, Optional[dict], bool], None]
+
+
+def encode(tid: str, event: dict, history: bool) -> str:
+    payload = json.dumps({"t": tid, "h": history, "e": event}, ensure_ascii=False, separators=(",", ":"))
+    if len(payload.encode()) > PAYLOAD_LIMIT:
+        payload = json.dumps({"t": tid, "h": history}, separators=(",", ":"))
+    return payload
+
+
+class ChangeBus:
+    """`on_change(tid, event, history)` applies a change from another
+    worker, event None meaning "reload"; `on_reset()` forgets everything."""
+
+    def __init__(self, on_change: OnChange, on_reset: Callable[[], None]):
+        self.on_change = on_change
+        self.on_reset = on_reset
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._pending: List[str] = []
+        self._overflowed = False
+        self._pid: Optional[int] = None   # backend of our connection, its notifications are ours
+
+    async def start(self) -> None:
+        if not BUS_ENABLED or self._task is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 5.0) -> None:
+        if self._task is None:
+            return
+        try:
+            self._queue.put_nowait(_STOP)
+            # Give the last writes a chance to reach the other workers
+            await asyncio.wait_for(asyncio.shield(self._task), timeout)
+        except (asyncio.QueueFull, asyncio.TimeoutError):
+            self._task.cancel()
+        self._task = self._queue = None
+
+    def publish(self, tid: str, event: dict, history: bool) -> None:
+        if self._queue is None:
+            return
+        try:
+            self._queue.put_nowait(encode(tid, event, history))
+        except asyncio.QueueFull:
+            # Dropped: the others forget everything once the queue drains
+            self._overflowed = True
+
+    def _received(self, connection, pid: int, channel: str, payload: str) -> None:
+        if pid == self._pid:
+            return
+        BUS_MESSAGES.labels("received").inc()
+        try:
+            message = json.loads(payload)
+            if message.get("all"):
+                self.on_reset()
+            else:
+                self.on_change(message["t"], message.get("e"), message.get("h", False))
+        except Exception:
+            log.exception("Bad change notification %r", payload[:200])
+
+    async def _run(self) -> None:
+        delay = 1.0
+        while True:
+            try:
+                conn = await asyncpg.connect(
+                    user=POSTGRES_USER, password=POSTGRES_PASSWORD, dsn=f"postgresql://{BUS_DB}",
+                    statement_cache_size=0,
+                )
+            except (OSError, asyncio.TimeoutError, asyncpg.PostgresError) as exc:
+                log.warning("Change bus cannot connect (%s), retrying in %.0fs", exc, delay)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, MAX_RETRY_DELAY)
+                continue
+            delay = 1.0
+            lost = asyncio.Event()
+            try:
+                conn.add_termination_listener(lambda _: lost.set())
+                self._pid = conn.get_server_pid()
+                await conn.add_listener(CHANNEL, self._received)
+                # Whatever changed before we were listening went unnoticed
+                self.on_reset()
+                if await self._send(conn, lost):
+                    return
+            except (OSError, asyncio.TimeoutError, asyncpg.PostgresError, asyncpg.InterfaceError) as exc:
+                log.warning("Change bus connection lost (%s), reconnecting", exc)
+            finally:
+                conn.terminate()
+
+    async def _send(self, conn, lost: asyncio.Event) -> bool:
+        """Send queued notifications until the connection fails; True once stopped."""
+        while True:
+            if not self._pending:
+                getter = asyncio.ensure_future(self._queue.get())
+                waiter = asyncio.ensure_future(lost.wait())
+                done, _ = await asyncio.wait({getter, waiter}, timeout=KEEPALIVE, return_when=asyncio.FIRST_COMPLETED)
+                waiter.cancel()
+                if getter not in done:
+                    getter.cancel()
+                    if lost.is_set():
+                        raise asyncpg.InterfaceError("connection closed")
+                    await conn.execute("SELECT 1", timeout=KEEPALIVE)
+                    continue
+                self._pending.append(getter.result())
+                while len(self._pending) < BATCH and not self._queue.empty():
+                    self._pending.append(self._queue.get_nowait())
+
+            if self._overflowed:
+                self._pending.append(_FLUSH_ALL)
+                self._overflowed = False
+            stopping = _STOP in self._pending
+            payloads = [p for p in self._pending if p is not _STOP]
+            if payloads:
+                # One statement, the notifications are delivered in this order
+                await conn.execute(
+                    "SELECT pg_notify($1, p) FROM unnest($2::text[]) AS p", CHANNEL, payloads,
+                    timeout=KEEPALIVE,
+                )
+                BUS_MESSAGES.labels("sent").inc(len(payloads))
+            self._pending.clear()
+            if stopping:
+                return True
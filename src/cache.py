@@ -0,0 +1,142 @@
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from itertools import count
+from typing import Callable, Iterator, List, Optional
+
+from markupsafe import Markup
+
+from americano.models import Match, Tournament
+
+CACHE_MAX_SIZE = int(os.getenv("TOURNAMENT_CACHE_SIZE", "256"))
+CACHE_TTL = float(os.getenv("TOURNAMENT_CACHE_TTL", "300"))
+FRAGMENT_CACHE_SIZE = int(os.getenv("FRAGMENT_CACHE_SIZE", "4096"))
+
+
+@dataclass
+class TournamentView:
+    """Everything the tournament page needs, prepared once per version."""
+    tournament: Tournament
+    standings: List[dict]
+    current_matches: List[Match]
+    players_json: dict
+    total_rounds: int
+    mode: str
+    archived: bool = False
+    version: int = 0
+    revision: int = 0   # TournamentORM.version it was built from, the same in every worker
+    history_version: Optional[int] = None   # set once the view is cached
+    api_body: Optional[bytes] = None   # serialized JSON state, built on first API read
+
+
+class TournamentCache:
+    """In-process LRU/TTL cache of TournamentView keyed by tournament id.
+
+    Every write bumps the tournament version via `invalidate`. A view is
+    stored together with the version it was read at, so a read that raced
+    with a write can never put a stale view back into the cache. Writes
+    that change already completed rounds also bump the history version.
+    """
+
+    def __init__(self, maxsize: int = CACHE_MAX_SIZE, ttl: float = CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, TournamentView]] = OrderedDict()
+        self._versions: OrderedDict[str, tuple[int, int]] = OrderedDict()  # (version, history)
+        self._counter = count(1)
+        # Highest version dropped from `_versions`, see `version`
+        self._floor = 0
+
+    def version(self, tid: str) -> int:
+        # A forgotten tournament falls back to the highest forgotten version,
+        # which is never lower than the version it had.
+        return self._versions.get(tid, (self._floor,))[0]
+
+    def history_version(self, tid: str) -> int:
+        return self._versions.get(tid, (self._floor, self._floor))[1]
+
+    def get(self, tid: str) -> Optional[TournamentView]:
+        entry = self._entries.get(tid)
+        if entry is None:
+            return None
+        expires_at, view = entry
+        if expires_at < time.monotonic() or view.version != self.version(tid):
+            del self._entries[tid]
+            return None
+        self._entries.move_to_end(tid)
+        return view
+
+    def put(self, tid: str, view: TournamentView, version: int) -> None:
+        if version != self.version(tid):
+            return
+        view.version = version
+        view.history_version = self.history_version(tid)
+        self._entries[tid] = (time.monotonic() + self.ttl, view)
+        self._entries.move_to_end(tid)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, tid: str, history: bool = False) -> int:
+        self._entries.pop(tid, None)
+        version = next(self._counter)
+        self._versions[tid] = (version, version if history else self.history_version(tid))
+        self._versions.move_to_end(tid)
+        # Keep a bounded window of versions, older ones collapse into the floor
+        while len(self._versions) > self.maxsize * 4:
+            _, dropped = self._versions.popitem(last=False)
+            self._floor = max(self._floor, *dropped)
+        return version
+
+    def clear(self) -> None:
+        """Invalidate every tournament, e.g. after changes may have been missed."""
+        self._entries.clear()
+        # Above every version handed out, so no fragment key survives
+        self._floor = next(self._counter)
+        self._versions.clear()
+
+
+class FragmentCache:
+    """Rendered HTML of completed rounds, keyed by (tid, round, history version).
+
+    Completed rounds only change through edit-score, which bumps the
+    history version, so score submits and new rounds reuse every fragment.
+    """
+
+    def __init__(self, maxsize: int = FRAGMENT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries: OrderedDict[tuple[str, int, int], Markup] = OrderedDict()
+
+    def history(self, view: TournamentView, render: Callable[[int, List[Match]], str]) -> Iterator[Markup]:
+        """History blocks of the view, one per round with completed matches.
+
+        `render(round_num, matches)` renders one block; it is skipped for
+        closed rounds already cached at the view's history version. Lazy,
+        so a streamed page renders each block just before sending it.
+        """
+        t = view.tournament
+        for i, round_matches in enumerate(t.rounds):
+            matches = [m for m in round_matches if m.completed]
+            if not matches:
+                continue
+            # The current round still fills up and a view that lost a race
+            # with a write has no history version, render those every time
+            if i >= t.current_round or view.history_version is None:
+                yield Markup(render(i + 1, matches))
+                continue
+            key = (t.id, i + 1, view.history_version)
+            html = self._entries.get(key)
+            if html is None:
+                html = self._entries[key] = Markup(render(i + 1, matches))
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+            else:
+                self._entries.move_to_end(key)
+            yield html
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+tournament_cache = TournamentCache()
+fragment_cache = FragmentCache()
@@ -0,0 +1,130 @@
+"""On-the-fly gzip / brotli for HTML, JSON and the other text responses.
+
+Unlike Starlette's GZipMiddleware every body chunk is flushed through the
+compressor as it comes, so streamed pages and exports still reach the
+client piece by piece. Brotli is used when the client takes it and the
+brotli package is installed. Event streams, HEAD requests, bodies under
+COMPRESS_MIN_SIZE and already encoded responses (precompressed static
+files) pass through untouched.
+"""
+import os
+import zlib
+from typing import Optional, Sequence
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # optional, gzip only then
+    brotli = None
+
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "512"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))  # 11 is for build_assets, far too slow per request
+
+# What we compress on the fly, br first
+OFFERED = ("br", "gzip") if brotli is not None else ("gzip",)
+
+COMPRESSIBLE = (
+    "text/html", "text/css", "text/csv", "text/plain", "text/javascript",
+    "application/json", "application/javascript", "application/x-ndjson",
+)
+
+
+def negotiate(accept_encoding: str, offered: Sequence[str] = OFFERED) -> Optional[str]:
+    """The first of `offered` that the client accepts (q > 0), or None."""
+    accepted = set()
+    for item in accept_encoding.lower().split(","):
+        coding, _, params = item.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding.strip())
+    for coding in offered:
+        if coding in accepted or (coding == "gzip" and "*" in accepted):
+            return coding
+    return None
+
+
+class _Encoder:
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._br = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._gz = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def encode(self, data: bytes, last: bool) -> bytes:
+        if self.encoding == "br":
+            out = self._br.process(data) if data else b""
+            return out + (self._br.finish() if last else self._br.flush())
+        return self._gz.compress(data) + self._gz.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+
+def _weaken_etag(headers: MutableHeaders) -> None:
+    """The bytes differ per encoding, so the validator may only be weak."""
+    etag = headers.get("etag")
+    if etag and not etag.startswith("W/"):
+        headers["etag"] = "W/" + etag
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        encoder: Optional[_Encoder] = None
+
+        async def send_wrapper(message):
+            nonlocal start, encoder
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(raw=message.setdefault("headers", []))
+                if message["status"] == 304:
+                    # It must carry the ETag the 200 would have
+                    _weaken_etag(headers)
+                if "content-encoding" in headers or not headers.get("content-type", "").startswith(COMPRESSIBLE):
+                    await send(message)
+                else:
+                    # Held back until the first body chunk shows whether it's worth it
+                    start = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if start is not None:
+                headers = MutableHeaders(raw=start.setdefault("headers", []))
+                if more_body or len(body) >= self.minimum_size:
+                    encoder = _Encoder(encoding)
+                    del headers["content-length"]
+                    headers["content-encoding"] = encoding
+                    headers.add_vary_header("Accept-Encoding")
+                    _weaken_etag(headers)
+                await send(start)
+                start = None
+
+            if encoder is not None:
+                message = {
+                    "type": "http.response.body",
+                    "body": encoder.encode(body, last=not more_body),
+                    "more_body": more_body,
+                }
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -1,11 +1,12 @@
 import os
+from datetime import datetime, timezone
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from dotenv import load_dotenv
 from asyncpg import Connection
 from uuid import uuid4
 from sqlalchemy import (
-    Boolean, Column, ForeignKey, Integer, String,
-    func, DateTime,
+    JSON, Boolean, Column, Float, ForeignKey, Index, Integer, LargeBinary, String,
+    event, false, func, DateTime,
 )
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import DeclarativeBase, relationship
@@ -18,30 +19,102 @@ POSTGRES_DB = os.getenv("POSTGRES_DB_URL")
 
 class Base(DeclarativeBase): pass
 
+# postgres: asyncpg, the server from POSTGRES_*
+# sqlite: aiosqlite file in WAL mode, for a single venue or hermetic runs
+DB_BACKEND = os.getenv("DB_BACKEND", "postgres")
+SQLITE_PATH = os.getenv("SQLITE_PATH", "padelchamp.db")
+
+if DB_BACKEND not in ("postgres", "sqlite"):
+    raise ValueError(f"DB_BACKEND must be 'postgres' or 'sqlite', got {DB_BACKEND!r}")
+
 postgres_file_name = f"{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_DB}"
-# DATABASE_URL = os.getenv(
-#     "DATABASE_URL",
-#     "postgresql+asyncpg:///{sqlite_file_name}"
-#     )
 
-DATABASE_URL = f"postgresql+asyncpg://{postgres_file_name}"
+if DB_BACKEND == "sqlite":
+    DATABASE_URL = f"sqlite+aiosqlite:///{SQLITE_PATH}"
+else:
+    DATABASE_URL = f"postgresql+asyncpg://{postgres_file_name}"
+
+# JSONB on Postgres, JSON text everywhere else
+JSONList = JSON().with_variant(JSONB(), "postgresql")
+
+# Postgres only:
+# direct: straight to Postgres, prepared statements are cached per connection
+# pooler: behind pgbouncer in transaction mode, nothing may outlive a query
+DB_MODE = os.getenv("DB_MODE", "direct")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))   # seconds
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "256"))
+
+if DB_MODE not in ("direct", "pooler"):
+    raise ValueError(f"DB_MODE must be 'direct' or 'pooler', got {DB_MODE!r}")
+
 
 class FixedConnection(Connection):
     def _get_unique_id(self, prefix: str) -> str:
         return f'__asyncpg_{prefix}_{uuid4()}__'
 
 
-engine = create_async_engine(
-    DATABASE_URL,
-    echo=False,
-    future=True,
-    connect_args={
+if DB_BACKEND == "sqlite":
+    connect_args = {"timeout": 30}   # seconds to wait for the write lock
+elif DB_MODE == "pooler":
+    connect_args = {
         "statement_cache_size": 0,
         "prepared_statement_cache_size": 0,
         "connection_class": FixedConnection,
     }
+else:
+    connect_args = {
+        "statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+        "prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+    }
+
+engine = create_async_engine(
+    DATABASE_URL,
+    echo=False,
+    future=True,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_pre_ping=DB_BACKEND == "postgres" and DB_MODE == "pooler",
+    connect_args=connect_args,
 )
 
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",       # readers never block the writer
+    "PRAGMA synchronous=NORMAL",     # durable at checkpoints, safe with WAL
+    "PRAGMA foreign_keys=ON",        # ON DELETE CASCADE needs it
+    "PRAGMA busy_timeout=30000",
+    "PRAGMA cache_size=-65536",      # 64 MiB page cache per connection
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+)
+
+
+if DB_BACKEND == "sqlite":
+    @event.listens_for(engine.sync_engine, "connect")
+    def _sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in SQLITE_PRAGMAS:
+            cursor.execute(pragma)
+        cursor.close()
+
+
+def pool_stats() -> dict:
+    """Snapshot of the connection pool for monitoring."""
+    pool = engine.sync_engine.pool
+    return {
+        "backend": DB_BACKEND,
+        "mode": DB_MODE,
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": max(0, pool.overflow()),   # negative until the pool has filled up
+        "max_overflow": DB_MAX_OVERFLOW,
+    }
+
 # Фабрика сессий
 AsyncSessionLocal = async_sessionmaker(
     bind=engine,
@@ -64,8 +137,18 @@ async def get_session():
 
 #ORM
 
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
 class TournamentORM(Base):
     __tablename__ = "tournaments"
+    __table_args__ = (
+        # Keyset pagination of the directory, newest first, optionally by mode or status
+        Index("ix_tournaments_created_at_id", "created_at", "id"),
+        Index("ix_tournaments_mode_created_at_id", "mode", "created_at", "id"),
+        Index("ix_tournaments_status_created_at_id", "status", "created_at", "id"),
+    )
 
     id            = Column(String, primary_key=True)
     mode          = Column(String, nullable=False, default="americano")  # americano | mexicano
@@ -74,7 +157,11 @@ class TournamentORM(Base):
     status        = Column(String, nullable=False, default="setup")
     current_round = Column(Integer, nullable=False, default=0)
     total_rounds  = Column(Integer, nullable=False, default=0)
-    created_at    = Column(DateTime(timezone=True), server_default=func.now())
+    pairing       = Column(String, nullable=False, default="rank", server_default="rank")  # rank | balanced (mexicano)
+    version       = Column(Integer, nullable=False, default=0, server_default="0")  # bumped by every write
+    archived      = Column(Boolean, nullable=False, default=False, server_default=false())  # rows moved to the snapshot
+    # Set by the app too: microseconds keep keyset cursors exact on SQLite
+    created_at    = Column(DateTime(timezone=True), default=_utcnow, server_default=func.now())
 
     players = relationship(
         "PlayerORM",
@@ -89,13 +176,22 @@ class TournamentORM(Base):
         order_by="MatchORM.round, MatchORM.court",
         lazy="selectin",
     )
+    # Joined: an archived tournament still loads in one query, live ones get a NULL
+    snapshot = relationship(
+        "TournamentSnapshotORM",
+        back_populates="tournament",
+        cascade="all, delete-orphan",
+        uselist=False,
+        lazy="joined",
+    )
 
 
 class PlayerORM(Base):
     __tablename__ = "players"
 
     id            = Column(String, primary_key=True)
-    tournament_id = Column(String, ForeignKey("tournaments.id", ondelete="CASCADE"), nullable=False)
+    tournament_id = Column(String, ForeignKey("tournaments.id", ondelete="CASCADE"), nullable=False, index=True)
+    profile_id    = Column(String, ForeignKey("player_profiles.id", ondelete="SET NULL"), nullable=True, index=True)
     name          = Column(String, nullable=False)
     sex           = Column(String, nullable=False, default='M')  # M | F
     points        = Column(Integer, nullable=False, default=0)
@@ -108,18 +204,62 @@ class PlayerORM(Base):
 
 class MatchORM(Base):
     __tablename__ = "matches"
+    __table_args__ = (
+        Index("ix_matches_tournament_round_court", "tournament_id", "round", "court"),
+    )
 
     id            = Column(String, primary_key=True)
     tournament_id = Column(String, ForeignKey("tournaments.id", ondelete="CASCADE"), nullable=False)
     round         = Column(Integer, nullable=False)
     court         = Column(Integer, nullable=False)
-    team1         = Column(JSONB, nullable=False)   # list[str] -- player ids
-    team2         = Column(JSONB, nullable=False)
+    team1         = Column(JSONList, nullable=False)   # list[str] -- player ids
+    team2         = Column(JSONList, nullable=False)
     score1        = Column(Integer, nullable=True)
     score2        = Column(Integer, nullable=True)
     completed     = Column(Boolean, nullable=False, default=False)
+    rating_delta  = Column(Float, nullable=True)   # rating change of each team1 player, team2 got minus it
 
     tournament = relationship("TournamentORM", back_populates="matches")
 
 
+class MatchParticipantORM(Base):
+    """One player slot of a match, mirrors MatchORM.team1 / team2 for indexed lookups."""
+    __tablename__ = "match_participants"
+    __table_args__ = (
+        Index("ix_match_participants_player_id", "player_id"),
+        Index("ix_match_participants_tournament_round_player", "tournament_id", "round", "player_id"),
+    )
+
+    match_id      = Column(String, ForeignKey("matches.id", ondelete="CASCADE"), primary_key=True)
+    team          = Column(Integer, primary_key=True)   # 1 | 2
+    slot          = Column(Integer, primary_key=True)   # 0 | 1
+    player_id     = Column(String, ForeignKey("players.id", ondelete="CASCADE"), nullable=False)
+    tournament_id = Column(String, nullable=False)
+    round         = Column(Integer, nullable=False)
+
+
+class TournamentSnapshotORM(Base):
+    """Final state of an archived tournament, see archive.py."""
+    __tablename__ = "tournament_snapshots"
+
+    tournament_id = Column(String, ForeignKey("tournaments.id", ondelete="CASCADE"), primary_key=True)
+    format        = Column(Integer, nullable=False)      # archive.SNAPSHOT_FORMAT
+    data          = Column(LargeBinary, nullable=False)  # zlib-compressed JSON
+    archived_at   = Column(DateTime(timezone=True), default=_utcnow, server_default=func.now())
+
+    tournament = relationship("TournamentORM", back_populates="snapshot")
+
+
+class PlayerProfileORM(Base):
+    """A player across tournaments, matched by normalized name, with their rating."""
+    __tablename__ = "player_profiles"
+    __table_args__ = (
+        Index("ix_player_profiles_rating", "rating"),
+    )
 
+    id             = Column(String, primary_key=True)
+    name           = Column(String, nullable=False)
+    name_key       = Column(String, nullable=False, unique=True)   # rating.name_key(name)
+    rating         = Column(Float, nullable=False)
+    matches_played = Column(Integer, nullable=False, default=0, server_default="0")
+    created_at     = Column(DateTime(timezone=True), default=_utcnow, server_default=func.now())
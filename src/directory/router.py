@@ -0,0 +1,68 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import HTMLResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import get_session
+from rendering import templates
+from querycount import query_budget
+from service import list_tournaments, encode_cursor, decode_cursor
+
+router = APIRouter(tags=['Турниры'])
+
+MODES = ("americano", "mexicano")
+STATUSES = ("setup", "active", "finished")
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def tournament_url(mode: str, tid: str) -> str:
+    return f"/mexicano/{tid}" if mode == "mexicano" else f"/americano/tournament/{tid}"
+
+
+async def directory_page(
+    session: AsyncSession, mode: str, status: str, q: str, after: str, limit: int,
+) -> tuple[list, Optional[str]]:
+    """Validated filters -> (rows, token of the next page)."""
+    if mode and mode not in MODES:
+        raise HTTPException(status_code=400, detail="Неизвестный формат турнира")
+    if status and status not in STATUSES:
+        raise HTTPException(status_code=400, detail="Неизвестный статус турнира")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"limit должен быть от 1 до {MAX_PAGE_SIZE}")
+    try:
+        cursor = decode_cursor(after) if after else None
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    rows, next_cursor = await list_tournaments(
+        session, mode=mode or None, status=status or None,
+        search=q.strip(), after=cursor, limit=limit,
+    )
+    return rows, encode_cursor(next_cursor) if next_cursor else None
+
+
+@router.get("/tournaments", response_class=HTMLResponse)
+@query_budget(1)
+async def tournament_directory(
+    request: Request,
+    mode: str = "",
+    status: str = "",
+    q: str = "",
+    after: str = "",
+    session: AsyncSession = Depends(get_session),
+):
+    rows, next_after = await directory_page(session, mode, status, q, after, PAGE_SIZE)
+    filters = {k: v for k, v in (("mode", mode), ("status", status), ("q", q)) if v}
+    return templates.TemplateResponse("directory.html", {
+        "request": request,
+        "tournaments": rows,
+        "tournament_url": tournament_url,
+        "filters": filters,
+        "mode": mode,
+        "status": status,
+        "q": q,
+        "first_page": not after,
+        "next_query": {**filters, "after": next_after} if next_after else None,
+    })
@@ -0,0 +1,130 @@
+import asyncio
+import json
+from collections import defaultdict
+from typing import AsyncIterator, Dict, Iterable, Optional, Set
+from urllib.parse import urlencode
+
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse, RedirectResponse, StreamingResponse
+
+from bus import ChangeBus
+from cache import tournament_cache
+
+HEARTBEAT = 15.0       # seconds between keep-alive comments
+QUEUE_SIZE = 64        # events buffered per open page before it must reload
+
+
+def match_json(m) -> dict:
+    """Compact match payload, works for both Match and MatchORM."""
+    return {
+        "id": m.id, "round": m.round, "court": m.court,
+        "team1": list(m.team1), "team2": list(m.team2),
+        "score1": m.score1, "score2": m.score2,
+        "completed": m.completed,
+    }
+
+
+class LiveBroker:
+    """Per-tournament fan-out of change events to open tournament pages.
+
+    Writes publish a compact diff once; every subscribed page receives it
+    over Server-Sent Events. A page that falls QUEUE_SIZE events behind
+    is told to reload instead of growing its queue.
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+
+    def subscribers(self, tid: str) -> int:
+        return len(self._subscribers.get(tid, ()))
+
+    def publish(self, tid: str, event: dict) -> None:
+        queues = self._subscribers.get(tid)
+        if not queues:
+            return
+        data = json.dumps(event, ensure_ascii=False, separators=(",", ":"))
+        for queue in queues:
+            try:
+                queue.put_nowait(data)
+            except asyncio.QueueFull:
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait('{"type":"reload"}')
+
+    def publish_all(self, event: dict) -> None:
+        for tid in list(self._subscribers):
+            self.publish(tid, event)
+
+    async def stream(self, tid: str) -> AsyncIterator[str]:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self._subscribers[tid].add(queue)
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    data = await asyncio.wait_for(queue.get(), HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                yield f"data: {data}\n\n"
+        finally:
+            queues = self._subscribers.get(tid)
+            if queues is not None:
+                queues.discard(queue)
+                if not queues:
+                    del self._subscribers[tid]
+
+
+broker = LiveBroker()
+
+
+def event_stream(tid: str) -> StreamingResponse:
+    return StreamingResponse(
+        broker.stream(tid),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def tournament_changed(tid: str, event: dict, history: bool = False) -> None:
+    """Call after a write commits: drop cached views, push the diff to pages.
+
+    `history` marks writes that change already completed rounds.
+    """
+    tournament_cache.invalidate(tid, history)
+    broker.publish(tid, event)
+    change_bus.publish(tid, event, history)
+
+
+def _changed_elsewhere(tid: str, event: Optional[dict], history: bool) -> None:
+    tournament_cache.invalidate(tid, history)
+    broker.publish(tid, event if event is not None else {"type": "reload"})
+
+
+def _reset() -> None:
+    tournament_cache.clear()
+    broker.publish_all({"type": "reload"})
+
+
+# Same, for writes handled by the other workers, see bus.py
+change_bus = ChangeBus(_changed_elsewhere, _reset)
+
+
+def matches_event(type_: str, matches: Iterable, **extra) -> dict:
+    return {"type": type_, "matches": [match_json(m) for m in matches], **extra}
+
+
+def after_post(request: Request, url: str, error: Optional[str] = None) -> Response:
+    """Answer of a tournament form post.
+
+    live.js posts with fetch and sees the change arrive as an event, it
+    gets an empty 204, or a 409 with the `error`; a plain form post is
+    redirected back to the page, which shows the `error` as a notice.
+    """
+    if "application/json" in request.headers.get("accept", ""):
+        if error:
+            return JSONResponse({"detail": error}, status_code=409)
+        return Response(status_code=204)
+    if error:
+        url = f"{url}?{urlencode({'notice': error})}"
+    return RedirectResponse(url, status_code=303)
@@ -1,38 +1,91 @@
+import asyncio
 import os
 
-from fastapi import FastAPI, Request, Form, HTTPException, Response
-from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession, create_async_engine
+from fastapi import FastAPI, Request
 
-from fastapi.staticfiles import StaticFiles
 from pathlib import Path
-from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, JSONResponse
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
 from americano.router import router as americano_router
 from mexicano.router import router as mexicano_router
+from api.router import router as api_router, VIEW_BUILDERS
+from directory.router import router as directory_router
+from transfer.router import router as transfer_router
 from contextlib import asynccontextmanager
 from database import *
+from migrations import migrate
+from archive import ARCHIVE_AFTER_HOURS, archive_loop
+from assets import PrecompressedStaticFiles
+from compression import CompressionMiddleware
+from live import change_bus
+from metrics import MetricsMiddleware, metrics_endpoint
+from querycount import QueryCountMiddleware, query_budget
+from rendering import templates
+
+READY_TIMEOUT = float(os.getenv("READY_TIMEOUT", "2"))
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    # Read here, not at import: serve.py sets them per worker after the fork
+    if os.getenv("SKIP_SCHEMA_SETUP") != "1":
+        async with engine.begin() as conn:
+            await migrate(conn)
+    background = os.getenv("RUN_BACKGROUND_TASKS", "1") == "1"
+    archiver = asyncio.create_task(archive_loop(VIEW_BUILDERS)) if background and ARCHIVE_AFTER_HOURS > 0 else None
+    await change_bus.start()
     yield
+    if archiver is not None:
+        archiver.cancel()
+    await change_bus.stop()
     await engine.dispose()
 
 BASE_DIR = Path(__file__).resolve().parent
 
 app = FastAPI(lifespan=lifespan, title="Padel Americano")
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(QueryCountMiddleware)
+app.add_middleware(MetricsMiddleware)
+app.add_route("/metrics", metrics_endpoint, include_in_schema=False)
 app.mount(
     "/static",
-    StaticFiles(directory=BASE_DIR / "static"),
+    PrecompressedStaticFiles(directory=BASE_DIR / "static"),
     name="static"
 )
 
-templates = Jinja2Templates(directory="templates")
-
 # app = FastAPI()
 app.include_router(americano_router)
 app.include_router(mexicano_router)
+app.include_router(api_router)
+app.include_router(directory_router)
+app.include_router(transfer_router)
+
+@app.get("/pool-stats", include_in_schema=False)
+async def pool_statistics():
+    return pool_stats()
+
+@app.get("/healthz", include_in_schema=False)
+async def healthz():
+    """Liveness: the process serves requests, the database is not asked."""
+    return {"status": "ok"}
+
+@app.get("/readyz", include_in_schema=False)
+@query_budget(1)
+async def readyz():
+    """Readiness: a pooled connection answers within READY_TIMEOUT.
+
+    An exhausted pool fails it too, the checkout waits past the timeout.
+    """
+    try:
+        async with asyncio.timeout(READY_TIMEOUT):
+            async with engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+    except (TimeoutError, SQLAlchemyError, OSError) as exc:
+        return JSONResponse(
+            {"status": "unavailable", "error": type(exc).__name__, "pool": pool_stats()},
+            status_code=503,
+        )
+    return {"status": "ready", "pool": pool_stats()}
 
 @app.get("/", response_class=HTMLResponse)
 async def home(request: Request):
@@ -0,0 +1,147 @@
+"""Prometheus metrics, served at /metrics.
+
+Request latency per route template, DB statements and DB time per
+request, pool usage, template render time and a few business counters.
+Everything is plain counter/histogram updates on the request path; pool
+gauges are read only when Prometheus scrapes.
+
+Under serve.py with several workers PROMETHEUS_MULTIPROC_DIR is set and
+/metrics adds up the counters and histograms of all workers; the pool
+gauges are those of the worker that answered.
+"""
+import os
+import time
+
+from jinja2 import Template
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client import multiprocess
+from prometheus_client.core import GaugeMetricFamily
+from starlette.responses import Response
+
+from database import pool_stats
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+REQUEST_LATENCY = Histogram(
+    "padel_http_request_duration_seconds", "HTTP request latency",
+    ("method", "route", "status"),
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+DB_QUERIES = Histogram(
+    "padel_db_queries_per_request", "SQL statements issued by one request",
+    ("route",),
+    buckets=(0, 1, 2, 3, 4, 5, 7, 10, 15, 20, 30, 50, 100),
+)
+DB_TIME = Histogram(
+    "padel_db_time_per_request_seconds", "Time spent in SQL statements by one request",
+    ("route",),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
+TEMPLATE_RENDER = Histogram(
+    "padel_template_render_seconds", "Jinja template render time",
+    ("template",),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25),
+)
+TOURNAMENTS_CREATED = Counter("padel_tournaments_created", "Tournaments created", ("mode",))
+SCORES_SUBMITTED = Counter("padel_scores_submitted", "Match scores written", ("mode", "kind"))
+ROUNDS_ADVANCED = Counter("padel_rounds_advanced", "Rounds started via next-round", ("mode",))
+BUS_MESSAGES = Counter("padel_bus_messages", "Change notifications between workers", ("direction",))
+
+
+class _TimedTemplate(Template):
+    def render(self, *args, **kwargs) -> str:
+        start = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            TEMPLATE_RENDER.labels(self.name or "<string>").observe(time.perf_counter() - start)
+
+    def generate(self, *args, **kwargs):
+        # Streamed pages: only the time spent rendering, not waiting for the client
+        pieces = super().generate(*args, **kwargs)
+        elapsed = 0.0
+        while True:
+            start = time.perf_counter()
+            try:
+                piece = next(pieces)
+            except StopIteration:
+                break
+            finally:
+                elapsed += time.perf_counter() - start
+            yield piece
+        TEMPLATE_RENDER.labels(self.name or "<string>").observe(elapsed)
+
+
+def instrument_templates(templates) -> None:
+    """Time renders of a Jinja2Templates; call before any template is loaded."""
+    if METRICS_ENABLED:
+        templates.env.template_class = _TimedTemplate
+
+
+class _PoolCollector:
+    def collect(self):
+        stats = pool_stats()
+        for name in ("checked_out", "checked_in", "overflow", "size"):
+            if isinstance(stats.get(name), int):
+                yield GaugeMetricFamily(
+                    f"padel_db_pool_{name}", f"Connection pool {name.replace('_', ' ')}",
+                    value=stats[name],
+                )
+
+
+REGISTRY.register(_PoolCollector())
+
+if MULTIPROC_DIR:
+    _registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(_registry)
+    _registry.register(_PoolCollector())
+else:
+    _registry = REGISTRY
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware, so streamed responses pass straight through."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+        streaming = False
+
+        async def send_wrapper(message):
+            nonlocal status, streaming
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                streaming = any(
+                    k == b"content-type" and v.startswith(b"text/event-stream")
+                    for k, v in message.get("headers", ())
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            if route is not None:
+                label = route.path
+            else:
+                label = "/static" if scope["path"].startswith("/static/") else "unmatched"
+            # Live event streams stay open for minutes, they'd swamp the latency buckets
+            if not streaming:
+                REQUEST_LATENCY.labels(scope["method"], label, str(status)).observe(time.perf_counter() - start)
+            # Counted by QueryCountMiddleware, which runs inside this one
+            stats = scope.get("query_stats")
+            if stats is not None:
+                DB_QUERIES.labels(label).observe(stats.queries)
+                DB_TIME.labels(label).observe(stats.seconds)
+
+
+async def metrics_endpoint(request) -> Response:
+    return Response(generate_latest(_registry), media_type=CONTENT_TYPE_LATEST)
@@ -1,46 +1,56 @@
 import json, random, math
 from americano.models import Match, Tournament, generate_id
-from typing import List
+from typing import Dict, List, Optional
+from mexicano.pairing import RANK, BALANCED, PairingHistory, balanced_courts
 
-def generate_mexicano_round(tournament: 'Tournament', num_round: int) -> List[Match]:
+def generate_mexicano_round(
+    tournament: 'Tournament', num_round: int,
+    pairing: str = RANK, history: Optional[PairingHistory] = None,
+    ratings: Optional[Dict[str, float]] = None,
+) -> List[Match]:
     """
     Generate a Mexicano round: players sorted by current points,
     rank 1 & 3 partner together vs rank 2 & 4, etc.
-    For first round falls back to random.
+    Equal points are ordered by cross-tournament rating when `ratings`
+    is given, so the first round is seeded by it; otherwise random.
+    With the balanced pairing and a history, each court takes the split
+    (and neighbouring ranks trade courts) that repeats partners least.
     """
     players = tournament.players
     courts = tournament.courts
 
-    # Sort players games ascending, by points descending (random for equal points)
+    # Sort players games ascending, by points descending, then rating (random for equal points)
     sorted_players = sorted(
         players.keys(),
-        key=lambda pid: (players[pid].games_played, -players[pid].points, random.random())
+        key=lambda pid: (
+            players[pid].games_played, -players[pid].points,
+            -ratings.get(pid, 0.0) if ratings else 0.0, random.random(),
+        )
     )
 
-    # Pad to multiple of 4
-    active = list(sorted_players)
-    while len(active) % 4 != 0:
-        active.append(None)
-    active = [p for p in active if p]
+    # Only full courts play, the rest sit this round out
+    active = sorted_players[:min(len(sorted_players) // 4, courts) * 4]
 
-    round_matches = []
-    court = 1
-    i = 0
-    while i + 3 < len(active) and court <= courts:
+    if pairing == BALANCED and history is not None:
+        courts_players = balanced_courts(active, history)
+    else:
         # Top two partner together (rank i+1 and i+3)
         # vs next two (rank i+2 and i+4)
-        p1, p2, p3, p4 = active[i], active[i+1], active[i+2], active[i+3]
-        match_id = generate_id()
+        courts_players = [
+            (active[i], active[i+2], active[i+1], active[i+3])
+            for i in range(0, len(active), 4)
+        ]
+
+    round_matches = []
+    for court, (p1, p2, p3, p4) in enumerate(courts_players, start=1):
         match = Match(
-            id=match_id,
+            id=generate_id(),
             round=num_round + 1,
             court=court,
-            team1=[p1, p3],
-            team2=[p2, p4]
+            team1=[p1, p2],
+            team2=[p3, p4]
         )
         round_matches.append(match)
-        court += 1
-        i += 4
 
     return round_matches
 
@@ -14,6 +14,7 @@ class Player:
     games_played: int = 0
     games_won: int = 0
     games_lost: int = 0
+    profile_id: Optional[str] = None  # PlayerProfileORM, the same person across tournaments
 
 @dataclass
 class Match:
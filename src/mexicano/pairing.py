@@ -0,0 +1,140 @@
+"""History-aware Mexicano pairing.
+
+Partner and opponent counts of a tournament live in small NumPy matrices
+that are updated incrementally as rounds complete. The balanced mode keeps
+the rank-ordered court groups of classic Mexicano but picks, per court, the
+team split with the fewest repeats and lets neighbouring ranks trade courts
+when that removes repeats, all within a fixed time budget.
+"""
+import time
+from collections import OrderedDict
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from americano.models import Match, Tournament
+
+RANK = "rank"           # classic: rank 1 & 3 vs 2 & 4 on every court
+BALANCED = "balanced"   # same court groups, fewest repeated partners/opponents
+PAIRINGS = (RANK, BALANCED)
+
+PAIRING_BUDGET = 0.005  # seconds
+PARTNER_WEIGHT = 4      # a repeated partner hurts more than a repeated opponent
+HISTORY_CACHE_SIZE = 256
+
+# Team splits of a rank-ordered court group (positions 0..3); the first one
+# is the classic 1 & 3 vs 2 & 4 and wins every tie.
+SPLITS = np.array([
+    [0, 2, 1, 3],
+    [0, 3, 1, 2],
+    [0, 1, 2, 3],
+])
+SPLIT_BIAS = np.array([0.0, 0.01, 0.02])
+
+
+class PairingHistory:
+    """Partner/opponent counts of one tournament's completed rounds."""
+
+    def __init__(self, player_ids: Sequence[str]):
+        self.player_ids = list(player_ids)
+        self.index: Dict[str, int] = {pid: i for i, pid in enumerate(self.player_ids)}
+        n = len(self.player_ids)
+        self.partners = np.zeros((n, n), dtype=np.uint16)
+        self.opponents = np.zeros((n, n), dtype=np.uint16)
+        self.rounds_seen = 0
+
+    def add_round(self, matches: Sequence[Match]) -> None:
+        if not matches:
+            return
+        teams = np.array(
+            [[self.index[pid] for pid in m.team1 + m.team2] for m in matches]
+        )
+        a, b, c, d = teams.T
+        for x, y in ((a, b), (c, d)):
+            np.add.at(self.partners, (x, y), 1)
+            np.add.at(self.partners, (y, x), 1)
+        for x, y in ((a, c), (a, d), (b, c), (b, d)):
+            np.add.at(self.opponents, (x, y), 1)
+            np.add.at(self.opponents, (y, x), 1)
+
+    def sync(self, rounds: Sequence[Sequence[Match]], completed: int) -> None:
+        """Fold in rounds [rounds_seen, completed) of the tournament."""
+        for matches in rounds[self.rounds_seen:completed]:
+            self.add_round(matches)
+        self.rounds_seen = max(self.rounds_seen, completed)
+
+    def split_costs(self, groups: np.ndarray) -> np.ndarray:
+        """Repeat cost of every split of every group, shape (splits, groups)."""
+        g = groups[:, SPLITS]                     # (groups, splits, 4)
+        a, b, c, d = g[..., 0], g[..., 1], g[..., 2], g[..., 3]
+        partner = self.partners[a, b].astype(np.int32) + self.partners[c, d]
+        opponent = (
+            self.opponents[a, c].astype(np.int32) + self.opponents[a, d]
+            + self.opponents[b, c] + self.opponents[b, d]
+        )
+        return (PARTNER_WEIGHT * partner + opponent + SPLIT_BIAS).T
+
+
+_histories: "OrderedDict[str, PairingHistory]" = OrderedDict()
+
+
+def history_for(tournament: Tournament, completed: int) -> PairingHistory:
+    """Per-tournament history, built once and then updated incrementally."""
+    history = _histories.get(tournament.id)
+    if history is None or set(history.index) != set(tournament.players) or history.rounds_seen > completed:
+        history = PairingHistory(list(tournament.players))
+        _histories[tournament.id] = history
+    _histories.move_to_end(tournament.id)
+    while len(_histories) > HISTORY_CACHE_SIZE:
+        _histories.popitem(last=False)
+    history.sync(tournament.rounds, completed)
+    return history
+
+
+def forget(tid: str) -> None:
+    _histories.pop(tid, None)
+
+
+def _best(history: PairingHistory, groups: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    costs = history.split_costs(groups)
+    choice = costs.argmin(axis=0)
+    return choice, costs[choice, np.arange(len(groups))]
+
+
+def balanced_courts(
+    ranked: Sequence[str], history: PairingHistory, budget: float = PAIRING_BUDGET,
+) -> List[Tuple[str, str, str, str]]:
+    """Courts for rank-ordered players (a multiple of 4) with fewest repeats.
+
+    Returns (team1 + team2) id tuples, one per court in rank order.
+    """
+    deadline = time.perf_counter() + budget
+    order = np.array([history.index[pid] for pid in ranked])
+    groups = order.reshape(-1, 4).copy()
+    choice, cost = _best(history, groups)
+
+    # Let the last player of a court and the first of the next one trade
+    # places while that lowers the total; even and odd boundaries alternate
+    # so the swaps tried together never touch the same court.
+    improved = True
+    while improved and len(groups) > 1 and time.perf_counter() < deadline:
+        improved = False
+        for start in (0, 1):
+            k = np.arange(start, len(groups) - 1, 2)
+            if not len(k):
+                continue
+            swapped = groups.copy()
+            swapped[k, 3], swapped[k + 1, 0] = groups[k + 1, 0], groups[k, 3]
+            new_choice, new_cost = _best(history, swapped)
+            gain = (cost[k] + cost[k + 1]) - (new_cost[k] + new_cost[k + 1])
+            accept = k[gain > 0.5]
+            if len(accept):
+                rows = np.concatenate([accept, accept + 1])
+                groups[rows] = swapped[rows]
+                choice[rows] = new_choice[rows]
+                cost[rows] = new_cost[rows]
+                improved = True
+
+    ids = history.player_ids
+    teams = np.take_along_axis(groups, SPLITS[choice], axis=1)
+    return [tuple(ids[i] for i in row) for row in teams]
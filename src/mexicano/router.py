@@ -1,15 +1,25 @@
 from fastapi import APIRouter, Form, HTTPException, Request, Response, Depends
 from fastapi.responses import HTMLResponse, RedirectResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from fastapi.templating import Jinja2Templates
-from fastapi.staticfiles import StaticFiles
 from mexicano.models import Player, Tournament,Match, generate_id
 from mexicano.functions import generate_mexicano_round, calculate_standings
-from database import get_session, TournamentORM, PlayerORM, MatchORM
+from mexicano.pairing import RANK, BALANCED, PAIRINGS, history_for, forget as forget_history
+from database import get_session, TournamentORM
+from cache import TournamentView, tournament_cache, fragment_cache
+from live import tournament_changed, matches_event, match_json, event_stream, after_post
+from writer import score_writer
+from archive import load_snapshot
+from querycount import query_budget
+from rendering import templates, stream_template
+from metrics import TOURNAMENTS_CREATED, SCORES_SUBMITTED, ROUNDS_ADVANCED
+from service import (
+    record_match_score, edit_match_score, check_score, insert_tournament, insert_matches, update_active_round,
+    get_tournament_row, round_matches, swap_players, link_profiles, tournament_ratings,
+)
+from rating import name_key
 
 router = APIRouter(prefix='/mexicano', tags=['Мексикано'])
-templates = Jinja2Templates(directory="templates")
-router.mount("/static", StaticFiles(directory="static"), name="static")
+history_template = templates.get_template("mexicano/_history_round.html")
 # In-memory storage (could be replaced with DB)
 
 
@@ -21,6 +31,7 @@ def _orm_to_tournament(t_row: TournamentORM) -> Tournament:
             id=p.id, name=p.name, sex=p.sex,
             points=p.points, games_played=p.games_played,
             games_won=p.games_won, games_lost=p.games_lost,
+            profile_id=p.profile_id,
         )
         for p in t_row.players
     }
@@ -50,26 +61,60 @@ async def _get_tournament_orm(tid: str, session: AsyncSession) -> TournamentORM:
     return result
 
 
-def _update_player_stats(
-    player_orm: PlayerORM,
-    score_for: int, score_against: int,
-    delta: int = 1,
-):
-    player_orm.games_played += delta
-    player_orm.points       += delta * score_for
-    if score_for > score_against:
-        player_orm.games_won  += delta
+async def _get_tournament_row(tid: str, session: AsyncSession) -> TournamentORM:
+    """Like _get_tournament_orm, without loading players and matches."""
+    result = await get_tournament_row(session, tid)
+    if not result or result.mode != "mexicano":
+        raise HTTPException(status_code=404, detail="Tournament not found")
+    return result
+
+
+def _build_view(t_orm: TournamentORM) -> TournamentView:
+    if t_orm.archived:
+        t, standings = load_snapshot(t_orm)
     else:
-        player_orm.games_lost += delta
+        t = _orm_to_tournament(t_orm)
+        standings = calculate_standings(t)
+    current_matches = t.rounds[t.current_round] if t.rounds and t.current_round < len(t.rounds) else []
 
+    # Добавляем безопасную для JSON версию игроков
+    players_json_safe = {
+        pid: {
+            "id": player.id,
+            "name": player.name,
+            # "sex": player.sex,     # если нужен пол — раскомментируйте
+            "points": player.points,
+            "games_played": player.games_played,
+            "games_won": player.games_won,
+            "games_lost": player.games_lost,
+        }
+        for pid, player in t.players.items()
+    }
+    return TournamentView(
+        tournament=t,
+        standings=standings,
+        current_matches=current_matches,
+        players_json=players_json_safe,
+        total_rounds=t_orm.total_rounds,
+        mode=t_orm.mode,
+        archived=t_orm.archived,
+        revision=t_orm.version,
+    )
+
+
+# Another next-round, finish or swap got in first; scores are no conflict
+CONFLICT = "Турнир изменился, действие не выполнено"
 
-def _add_round_to_session(session: AsyncSession, tid: str, matches: list[Match]):
-    for m in matches:
-        session.add(MatchORM(
-            id=m.id, tournament_id=tid,
-            round=m.round, court=m.court,
-            team1=m.team1, team2=m.team2,
-        ))
+
+async def _get_view(tid: str, session: AsyncSession) -> TournamentView:
+    """Cached view model; the database is only hit after a write."""
+    view = tournament_cache.get(tid)
+    if view is None:
+        version = tournament_cache.version(tid)
+        t_orm = await _get_tournament_orm(tid, session)
+        view = _build_view(t_orm)
+        tournament_cache.put(tid, view, version)
+    return view
 
 
 # Routes
@@ -82,46 +127,57 @@ async def mexicano_index(request: Request, ):
 
 
 @router.post("/create")
+@query_budget(6)
 async def create_mexicano(
     name: str = Form(...),
     courts: int = Form(...),
     num_rounds: int = Form(...),
     player_names: str = Form(...),
+    pairing: str = Form(RANK),
     session: AsyncSession = Depends(get_session),
 ):
     names = [n.strip() for n in player_names.split("\n") if n.strip()]
     if len(names) < 4:
         raise HTTPException(status_code=400, detail="Введите минимум 4 имени")
+    if pairing not in PAIRINGS:
+        raise HTTPException(status_code=400, detail="Неизвестный способ составления пар")
 
     tid = generate_id()
-    player_orms = []
+    profiles = await link_profiles(session, names)
     players: dict[str, Player] = {}
+    ratings: dict[str, float] = {}
     for pname in names:
         pid = generate_id()
-        player_orms.append(PlayerORM(id=pid, tournament_id=tid, name=pname))
-        players[pid] = Player(id=pid, name=pname, sex='M')
+        profile_id, ratings[pid] = profiles[name_key(pname)]
+        players[pid] = Player(id=pid, name=pname, sex='M', profile_id=profile_id)
 
     # Build temporary Tournament to generate the first round
     temp = Tournament(
         id=tid, name=name, courts=courts, players=players,
         rounds=[], current_round=0, status="active",
     )
-    first_round = generate_mexicano_round(temp, 0)
-
-    t_orm = TournamentORM(
-        id=tid, mode="mexicano", name=name, courts=courts,
-        status="active", current_round=0, total_rounds=num_rounds,
+    # Seeded by rating, points are all zero yet
+    first_round = generate_mexicano_round(temp, 0, ratings=ratings)
+
+    await insert_tournament(
+        session,
+        dict(
+            id=tid, mode="mexicano", name=name, courts=courts,
+            status="active", current_round=0, total_rounds=num_rounds,
+            pairing=pairing,
+        ),
+        [{"id": p.id, "name": p.name, "profile_id": p.profile_id} for p in players.values()],
+        first_round,
     )
-    session.add(t_orm)
-    session.add_all(player_orms)
-    _add_round_to_session(session, tid, first_round)
 
     await session.commit()
+    TOURNAMENTS_CREATED.labels("mexicano").inc()
 
     return RedirectResponse(f"/mexicano/{tid}", status_code=303)
 
 
 @router.head("/{tid}")
+@query_budget(3)
 async def mexicano_head(tid: str, session: AsyncSession = Depends(get_session),):
     row = await session.get(TournamentORM, tid)
     if not row or row.mode != "mexicano":
@@ -129,149 +185,144 @@ async def mexicano_head(tid: str, session: AsyncSession = Depends(get_session),)
     return Response(status_code=200)
 
 @router.get("/{tid}", response_class=HTMLResponse)
+@query_budget(3)
 async def mexicano_view(request: Request, tid: str, session: AsyncSession = Depends(get_session),):
-    t_orm = await _get_tournament_orm(tid, session)
-    t = _orm_to_tournament(t_orm)
-    standings = calculate_standings(t)
-    current_matches = t.rounds[t.current_round] if t.rounds and t.current_round < len(t.rounds) else []
-
-    # Добавляем безопасную для JSON версию игроков
-    players_json_safe = {
-        pid: {
-            "id": player.id,
-            "name": player.name,
-            # "sex": player.sex,     # если нужен пол — раскомментируйте
-            "points": player.points,
-            "games_played": player.games_played,
-            "games_won": player.games_won,
-            "games_lost": player.games_lost,
-        }
-        for pid, player in t.players.items()
-    }
-    return templates.TemplateResponse("mexicano/tournament.html", {
+    view = await _get_view(tid, session)
+    if view.mode != "mexicano":
+        raise HTTPException(status_code=404, detail="Tournament not found")
+    return stream_template("mexicano/tournament.html", {
         "request": request,
-        "tournament": t,
-        "standings": standings,
-        "current_matches": current_matches,
-        "players": t.players,
-        "players_json": players_json_safe,
-        "total_rounds": t_orm.total_rounds,
+        "tournament": view.tournament,
+        "standings": view.standings,
+        "current_matches": view.current_matches,
+        "players": view.tournament.players,
+        "players_json": view.players_json,
+        "current_matches_json": [match_json(m) for m in view.current_matches],
+        "total_rounds": view.total_rounds,
+        "history": fragment_cache.history(view, lambda round_num, matches: history_template.render(
+            tournament=view.tournament, round_num=round_num, matches=matches,
+            archived=view.archived,  # snapshot only, there are no rows left to edit
+        )),
         
         "mode": "mexicano",
     })
 
 
+@router.get("/{tid}/events")
+async def mexicano_events(tid: str):
+    return event_stream(tid)
+
+
 @router.post("/{tid}/score")
+@query_budget(7, sqlite=9)
 async def mexicano_score(
+    request: Request,
     tid: str,
     match_id: str = Form(...),
     score1: int = Form(...),
     score2: int = Form(...),
-    session: AsyncSession = Depends(get_session),
 ):
-    t_orm = await _get_tournament_orm(tid, session)
-    t = _orm_to_tournament(t_orm)
-
-    match = next(
-        (m for m in t.rounds[t.current_round] if m.id == match_id and not m.completed),
-        None,
-    )
-    if not match:
-        return RedirectResponse(f"/mexicano/{tid}", status_code=303)
-
-    match_orm = await session.get(MatchORM, match_id)
-    match_orm.score1 = score1
-    match_orm.score2 = score2
-    match_orm.completed = True
-
-    players_map = {p.id: p for p in t_orm.players}
-    for pid in match.team1:
-        _update_player_stats(players_map[pid], score1, score2, delta=1)
-    for pid in match.team2:
-        _update_player_stats(players_map[pid], score2, score1, delta=1)
-
-    await session.commit()
+    try:
+        check_score(score1, score2)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    players = await score_writer.submit(tid, record_match_score, match_id, score1, score2)
+    if players is None:
+        return after_post(request, f"/mexicano/{tid}")
+
+    tournament_changed(tid, {
+        "type": "score", "match_id": match_id,
+        "score1": score1, "score2": score2, "players": players,
+    })
+    SCORES_SUBMITTED.labels("mexicano", "submit").inc()
 
-    return RedirectResponse(f"/mexicano/{tid}", status_code=303)
+    return after_post(request, f"/mexicano/{tid}")
 
 
 @router.post("/{tid}/next-round")
-async def mexicano_next_round(tid: str, session: AsyncSession = Depends(get_session),):
+@query_budget(8)
+async def mexicano_next_round(request: Request, tid: str, session: AsyncSession = Depends(get_session),):
     t_orm = await _get_tournament_orm(tid, session)
+    if t_orm.archived:
+        raise HTTPException(status_code=400, detail="Турнир в архиве")
     t = _orm_to_tournament(t_orm)
     current = t.rounds[t.current_round]
 
     if not all(m.completed for m in current):
-        return RedirectResponse(f"/mexicano/{tid}", status_code=303)
+        return after_post(request, f"/mexicano/{tid}")
 
     new_round_num = t_orm.current_round + 1
-    t_orm.current_round = new_round_num
+    new_matches = []
 
     if new_round_num < t_orm.total_rounds:
         t.current_round = new_round_num   # update so standings are correct
-        new_matches = generate_mexicano_round(t, new_round_num)
-        _add_round_to_session(session, tid, new_matches)
-
+        history = history_for(t, new_round_num) if t_orm.pairing == BALANCED else None
+        ratings = await tournament_ratings(session, tid)
+        new_matches = generate_mexicano_round(t, new_round_num, t_orm.pairing, history, ratings)
+
+    if not await update_active_round(session, tid, t_orm.current_round, current_round=new_round_num):
+        # Usually a double click: the round was advanced already
+        return after_post(request, f"/mexicano/{tid}")
+    await insert_matches(session, tid, new_matches)
     await session.commit()
-    return RedirectResponse(f"/mexicano/{tid}", status_code=303)
+    tournament_changed(tid, matches_event("round", new_matches, round=new_round_num))
+    ROUNDS_ADVANCED.labels("mexicano").inc()
+    return after_post(request, f"/mexicano/{tid}")
 
 
 @router.post("/{tid}/finish")
-async def mexicano_finish(tid: str, session: AsyncSession = Depends(get_session),):
-    t_orm = await _get_tournament_orm(tid, session)
-    t = _orm_to_tournament(t_orm)
-    current = t.rounds[t.current_round]
-    if all(m.completed for m in current):
-        t_orm.status = "finished"
+@query_budget(4)
+async def mexicano_finish(request: Request, tid: str, session: AsyncSession = Depends(get_session),):
+    t_orm = await _get_tournament_row(tid, session)
+    current = await round_matches(session, tid, t_orm.current_round + 1)
+    if t_orm.status == "active" and current and all(m.completed for m in current):
+        if not await update_active_round(session, tid, t_orm.current_round, status="finished"):
+            return after_post(request, f"/mexicano/{tid}", error=CONFLICT)
         await session.commit()
-    return RedirectResponse(f"/mexicano/{tid}", status_code=303)
+        tournament_changed(tid, {"type": "finish"})
+    return after_post(request, f"/mexicano/{tid}")
 
 
 @router.post("/{tid}/delete")
+@query_budget(6)
 async def mexicano_delete(tid: str, session: AsyncSession = Depends(get_session),):
     t_orm = await session.get(TournamentORM, tid)
     if t_orm:
         await session.delete(t_orm)
         await session.commit()
+        tournament_changed(tid, {"type": "delete", "redirect": "/mexicano"})
+        forget_history(tid)
     return RedirectResponse("/mexicano", status_code=303)
 
 
 @router.post("/{tid}/edit-score")
+@query_budget(8, sqlite=10)
 async def mexicano_edit_score(
+    request: Request,
     tid: str,
     match_id: str = Form(...),
     score1: int = Form(...),
     score2: int = Form(...),
-    session: AsyncSession = Depends(get_session),
 ):
-    t_orm = await _get_tournament_orm(tid, session)
-    t = _orm_to_tournament(t_orm)
-
-    match = next(
-        (m for rnd in t.rounds for m in rnd if m.id == match_id and m.completed),
-        None,
-    )
-    if not match:
-        return RedirectResponse(f"/mexicano/{tid}", status_code=303)
-
-    match_orm = await session.get(MatchORM, match_id)
-    old1, old2 = match_orm.score1, match_orm.score2
-
-    players_map = {p.id: p for p in t_orm.players}
-    for pid in match.team1:
-        _update_player_stats(players_map[pid], old1, old2, delta=-1)
-        _update_player_stats(players_map[pid], score1, score2, delta=1)
-    for pid in match.team2:
-        _update_player_stats(players_map[pid], old2, old1, delta=-1)
-        _update_player_stats(players_map[pid], score2, score1, delta=1)
-
-    match_orm.score1 = score1
-    match_orm.score2 = score2
-    await session.commit()
-    return RedirectResponse(f"/mexicano/{tid}", status_code=303)
+    try:
+        check_score(score1, score2)
+        players = await score_writer.submit(tid, edit_match_score, match_id, score1, score2)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    if players is None:
+        return after_post(request, f"/mexicano/{tid}")
+
+    tournament_changed(tid, {
+        "type": "score", "match_id": match_id,
+        "score1": score1, "score2": score2, "players": players,
+    }, history=True)
+    SCORES_SUBMITTED.labels("mexicano", "edit").inc()
+    return after_post(request, f"/mexicano/{tid}")
 
 @router.post("/tournament/{tid}/swap-player")
+@query_budget(10)
 async def swap_player(
+    request: Request,
     tid: str,
     match_id: str = Form(...),
     position: str = Form(...),      # team1-0, team2-1 и т.д.
@@ -279,22 +330,11 @@ async def swap_player(
     session: AsyncSession = Depends(get_session),
 ):
 
-    t_orm = await _get_tournament_orm(tid, session)
+    t_orm = await _get_tournament_row(tid, session)
 
     if t_orm.status != "active":
         raise HTTPException(status_code=400, detail="Турнир не активен")
 
-    current_round_num = t_orm.current_round + 1
-
-    # Целевой матч
-    target_match_orm = next(
-        (m for m in t_orm.matches if m.id == match_id and m.round == current_round_num),
-        None
-    )
-
-    if not target_match_orm or target_match_orm.completed:
-        raise HTTPException(status_code=400, detail="Матч не найден или уже завершён")
-
     # Парсим позицию
     try:
         team_key, idx_str = position.split("-")
@@ -304,34 +344,18 @@ async def swap_player(
     except Exception:
         raise HTTPException(status_code=400, detail="Неверная позиция")
 
-    old_pid = getattr(target_match_orm, team_key)[idx]
-    if old_pid == new_pid:
-        return RedirectResponse(f"/mexicano/tournament/{tid}", status_code=303)
-
-    # Поиск позиции выбранного игрока
-    def find_position(pid: str):
-        for m in t_orm.matches:
-            if m.round == current_round_num:
-                for tk in ("team1", "team2"):
-                    tlist = getattr(m, tk)
-                    if pid in tlist:
-                        return m, tk, tlist.index(pid)
-        return None, None, None
-
-    new_match, new_tk, new_i = find_position(new_pid)
-
-    # для целевого матча
-    old_team = getattr(target_match_orm, team_key)          # берём текущий список
-    new_team = old_team.copy()                              # копируем
-    new_team[idx] = new_pid                                 # меняем
-    setattr(target_match_orm, team_key, new_team)           # присваиваем новый объект списка
-
-    # если есть второй матч (swap)
-    if new_match is not None and new_match == target_match_orm:
-        old_team2 = getattr(new_match, new_tk)
-        new_team2 = old_team2.copy()
-        new_team2[new_i] = old_pid
-        setattr(new_match, new_tk, new_team2)
+    # Игрок, уже играющий в этом раунде, меняется местами с заменяемым
+    try:
+        changed = await swap_players(
+            session, tid, t_orm.current_round + 1,
+            match_id, int(team_key[-1]), idx, new_pid,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
 
-    await session.commit()
-    return RedirectResponse(f"/mexicano/tournament/{tid}", status_code=303)
\ No newline at end of file
+    if changed:
+        if not await update_active_round(session, tid, t_orm.current_round):
+            return after_post(request, f"/mexicano/{tid}", error=CONFLICT)
+        await session.commit()
+        tournament_changed(tid, matches_event("swap", changed))
+    return after_post(request, f"/mexicano/{tid}")
@@ -0,0 +1,163 @@
+"""Versioned schema migrations.
+
+Applied in order at startup (see `lifespan` in main.py) or by hand:
+
+    python migrations.py           # apply pending migrations
+    python migrations.py status    # list applied / pending
+
+A step is either SQL text or a callable taking a sync connection. Steps
+must be safe on databases that predate this runner, hence IF NOT EXISTS.
+`PostgresOnly` steps catch up Postgres databases from before SQLite
+support; a SQLite database starts at the current models in migration 1.
+"""
+import asyncio
+import sys
+from typing import Callable, List, Tuple, Union
+
+from sqlalchemy import inspect, text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from americano.models import generate_id
+from database import Base, MatchParticipantORM, PlayerProfileORM, TournamentSnapshotORM, engine
+from rating import RATING_INITIAL, name_key
+
+
+class PostgresOnly(str):
+    """SQL step skipped on other databases."""
+
+
+def _add_column(conn, table: str, column: str, ddl: str) -> None:
+    """ADD COLUMN unless it is there already; SQLite has no IF NOT EXISTS for it."""
+    if column not in {c["name"] for c in inspect(conn).get_columns(table)}:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+
+Step = Union[str, Callable]
+
+MIGRATIONS: List[Tuple[int, str, List[Step]]] = [
+    (1, "initial schema", [
+        lambda conn: Base.metadata.create_all(conn),
+    ]),
+    (2, "tournament pairing and version columns", [
+        # Added to the model before this runner existed, any database from then may lack them
+        lambda conn: _add_column(conn, "tournaments", "pairing", "VARCHAR NOT NULL DEFAULT 'rank'"),
+        lambda conn: _add_column(conn, "tournaments", "version", "INTEGER NOT NULL DEFAULT 0"),
+    ]),
+    (3, "indexes for tournament lookups", [
+        "CREATE INDEX IF NOT EXISTS ix_players_tournament_id ON players (tournament_id)",
+        "CREATE INDEX IF NOT EXISTS ix_matches_tournament_round_court ON matches (tournament_id, round, court)",
+        "CREATE INDEX IF NOT EXISTS ix_tournaments_created_at ON tournaments (created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_tournaments_mode_created_at ON tournaments (mode, created_at)",
+    ]),
+    (4, "match participants", [
+        lambda conn: MatchParticipantORM.__table__.create(conn, checkfirst=True),
+        PostgresOnly("""
+        INSERT INTO match_participants (match_id, team, slot, player_id, tournament_id, round)
+        SELECT m.id, t.team, p.ord - 1, p.player_id, m.tournament_id, m.round
+        FROM matches m
+        CROSS JOIN LATERAL (VALUES (1, m.team1), (2, m.team2)) AS t(team, players)
+        CROSS JOIN LATERAL jsonb_array_elements_text(t.players) WITH ORDINALITY AS p(player_id, ord)
+        ON CONFLICT DO NOTHING
+        """),
+    ]),
+    (5, "keyset indexes for the tournament directory", [
+        "CREATE INDEX IF NOT EXISTS ix_tournaments_created_at_id ON tournaments (created_at, id)",
+        "CREATE INDEX IF NOT EXISTS ix_tournaments_mode_created_at_id ON tournaments (mode, created_at, id)",
+        "CREATE INDEX IF NOT EXISTS ix_tournaments_status_created_at_id ON tournaments (status, created_at, id)",
+        # Prefixes of the new ones
+        "DROP INDEX IF EXISTS ix_tournaments_created_at",
+        "DROP INDEX IF EXISTS ix_tournaments_mode_created_at",
+    ]),
+    (6, "tournament snapshots for archival", [
+        lambda conn: _add_column(conn, "tournaments", "archived", "BOOLEAN NOT NULL DEFAULT false"),
+        lambda conn: TournamentSnapshotORM.__table__.create(conn, checkfirst=True),
+    ]),
+    (7, "player profiles and ratings", [
+        lambda conn: PlayerProfileORM.__table__.create(conn, checkfirst=True),
+        lambda conn: _add_column(
+            conn, "players", "profile_id", "VARCHAR REFERENCES player_profiles (id) ON DELETE SET NULL",
+        ),
+        "CREATE INDEX IF NOT EXISTS ix_players_profile_id ON players (profile_id)",
+        lambda conn: _add_column(conn, "matches", "rating_delta", "FLOAT"),
+        # Ratings stay at the initial value until `python rating.py recompute`
+        lambda conn: _link_profiles(conn),
+    ]),
+]
+
+def _link_profiles(conn) -> None:
+    """Give every existing player the profile of their name."""
+    names = [row[0] for row in conn.execute(text("SELECT DISTINCT name FROM players WHERE profile_id IS NULL"))]
+    if not names:
+        return
+    profiles = {key: pid for key, pid in conn.execute(text("SELECT name_key, id FROM player_profiles"))}
+    new = {}
+    for name in names:
+        key = name_key(name)
+        if key not in profiles:
+            profiles[key] = new.setdefault(key, {
+                "id": generate_id(), "name": " ".join(name.split()), "name_key": key,
+                "rating": RATING_INITIAL, "matches_played": 0,
+            })["id"]
+    if new:
+        conn.execute(PlayerProfileORM.__table__.insert(), list(new.values()))
+    conn.execute(
+        text("UPDATE players SET profile_id = :profile_id WHERE name = :name AND profile_id IS NULL"),
+        [{"profile_id": profiles[name_key(name)], "name": name} for name in names],
+    )
+
+
+# Any constant works, it only has to be the same for every worker
+LOCK_KEY = 0x7061646C
+
+
+async def _applied(conn: AsyncConnection) -> set:
+    await conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        " version INTEGER PRIMARY KEY,"
+        " name VARCHAR NOT NULL,"
+        " applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+    ))
+    result = await conn.execute(text("SELECT version FROM schema_migrations"))
+    return {row[0] for row in result}
+
+
+async def migrate(conn: AsyncConnection) -> List[int]:
+    """Apply pending migrations in the caller's transaction; returns their versions."""
+    postgres = conn.dialect.name == "postgresql"
+    if postgres:
+        # Workers starting together wait here instead of racing the DDL
+        await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": LOCK_KEY})
+    applied = await _applied(conn)
+    done = []
+    for version, name, steps in MIGRATIONS:
+        if version in applied:
+            continue
+        for step in steps:
+            if isinstance(step, PostgresOnly) and not postgres:
+                continue
+            if callable(step):
+                await conn.run_sync(step)
+            else:
+                await conn.execute(text(step))
+        await conn.execute(
+            text("INSERT INTO schema_migrations (version, name) VALUES (:version, :name)"),
+            {"version": version, "name": name},
+        )
+        done.append(version)
+    return done
+
+
+async def _main(args: List[str]) -> None:
+    async with engine.begin() as conn:
+        if args[:1] == ["status"]:
+            applied = await _applied(conn)
+            for version, name, _ in MIGRATIONS:
+                print(f"{version:>4}  {'applied' if version in applied else 'pending':8} {name}")
+        else:
+            done = await migrate(conn)
+            print(f"Applied: {', '.join(map(str, done))}" if done else "Schema is up to date")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(_main(sys.argv[1:]))
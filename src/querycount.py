@@ -0,0 +1,152 @@
+"""Per-request SQL statement counting and query budgets.
+
+Engine cursor events count and time every statement into the QueryStats
+of the current context. QueryCountMiddleware opens one per request; with
+QUERY_DEBUG=1 it also adds the numbers to the response headers and logs
+routes that go over the budget declared with `@query_budget(n)`.
+
+In tests:
+
+    with assert_query_budget(3):
+        await client.get(f"/americano/tournament/{tid}")
+
+tests/test_query_budgets.py runs every budgeted route this way.
+"""
+import contextvars
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Iterable, Iterator, List, Optional
+
+from sqlalchemy import event
+
+from database import DB_BACKEND, engine
+
+QUERY_DEBUG = os.getenv("QUERY_DEBUG", "0") == "1"
+
+log = logging.getLogger(__name__)
+
+
+class QueryStats:
+    """Statements counted in one scope; every count also goes to the parents."""
+
+    __slots__ = ("queries", "seconds", "statements", "parents")
+
+    def __init__(self, parents: Iterable["QueryStats"] = (), record: bool = False):
+        self.queries = 0
+        self.seconds = 0.0
+        self.statements: Optional[List[str]] = [] if record else None
+        self.parents = tuple(parents)
+
+    def add(self, statement: str, seconds: float) -> None:
+        self.queries += 1
+        self.seconds += seconds
+        if self.statements is not None:
+            self.statements.append(statement)
+        for parent in self.parents:
+            parent.add(statement, seconds)
+
+
+_current: contextvars.ContextVar[Optional[QueryStats]] = contextvars.ContextVar("query_stats", default=None)
+
+
+def current() -> Optional[QueryStats]:
+    return _current.get()
+
+
+@contextmanager
+def attach(stats: Optional[QueryStats]) -> Iterator[Optional[QueryStats]]:
+    """Count the statements of the block into existing stats (None: nowhere)."""
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def track(record: bool = False) -> Iterator[QueryStats]:
+    """Count the statements of the block; enclosing trackers see them too."""
+    parent = _current.get()
+    with attach(QueryStats((parent,) if parent else (), record)) as stats:
+        yield stats
+
+
+@contextmanager
+def assert_query_budget(max_queries: int) -> Iterator[QueryStats]:
+    """Fail with the statements listed when the block issues more than `max_queries`."""
+    with track(record=True) as stats:
+        yield stats
+    if stats.queries > max_queries:
+        listing = "\n".join(f"  {i}. {s}" for i, s in enumerate(stats.statements, 1))
+        raise AssertionError(f"{stats.queries} queries, budget is {max_queries}:\n{listing}")
+
+
+def query_budget(max_queries: int, sqlite: Optional[int] = None):
+    """Declare how many statements a route may issue, checked when QUERY_DEBUG is on.
+
+    `sqlite` is the budget on that backend when it takes more statements
+    (no data-modifying CTEs, and the writer's explicit BEGIN IMMEDIATE).
+    """
+    budget = sqlite if sqlite is not None and DB_BACKEND == "sqlite" else max_queries
+
+    def decorator(endpoint):
+        endpoint.query_budget = budget
+        return endpoint
+    return decorator
+
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_start = time.perf_counter()
+
+
+@event.listens_for(engine.sync_engine, "after_cursor_execute")
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    if stats is not None:
+        stats.add(statement, time.perf_counter() - context._query_start)
+
+
+class QueryCountMiddleware:
+    """Tracks the statements of every request into scope["query_stats"]."""
+
+    def __init__(self, app, debug: bool = QUERY_DEBUG):
+        self.app = app
+        self.debug = debug
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with track(record=self.debug) as stats:
+            scope["query_stats"] = stats
+
+            async def send_wrapper(message):
+                # Headers leave before a streamed body, so they show the count so far
+                if self.debug and message["type"] == "http.response.start":
+                    message.setdefault("headers", [])
+                    message["headers"] = list(message["headers"]) + [
+                        (b"x-db-queries", str(stats.queries).encode()),
+                        (b"server-timing", f"db;dur={stats.seconds * 1000:.2f};desc=\"{stats.queries} queries\"".encode()),
+                    ]
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                if self.debug:
+                    self._check_budget(scope, stats)
+
+    @staticmethod
+    def _check_budget(scope, stats: QueryStats) -> None:
+        route = scope.get("route")
+        budget = getattr(getattr(route, "endpoint", None), "query_budget", None)
+        if budget is not None and stats.queries > budget:
+            log.warning(
+                "%s %s issued %d queries, budget is %d:\n%s",
+                scope["method"], route.path, stats.queries, budget,
+                "\n".join(stats.statements or ()),
+            )
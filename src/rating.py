@@ -0,0 +1,186 @@
+"""Cross-tournament player ratings.
+
+Elo for doubles: a team plays at the mean rating of its two players, its
+result is the share of games it won (6:3 -> 0.67), and both players of a
+team move by the same K * (result - expected); the other team by minus
+that. Each match keeps its delta in matches.rating_delta, so an edited
+score can be taken back.
+
+Scores update the ratings as they land (service.record_match_score and
+edit_match_score). An edit can't replay the matches played since, and
+the formula may change; `recompute` replays every completed match, live
+and archived, in order:
+
+    python rating.py recompute
+"""
+import asyncio
+import os
+import sys
+import time
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import select, update
+
+from database import (
+    AsyncSessionLocal, MatchORM, PlayerORM, PlayerProfileORM,
+    TournamentORM, TournamentSnapshotORM, engine,
+)
+
+RATING_INITIAL = float(os.getenv("RATING_INITIAL", "1500"))
+RATING_K = float(os.getenv("RATING_K", "24"))
+RATING_SCALE = 400.0
+
+
+def name_key(name: str) -> str:
+    """What makes two player names the same person."""
+    return " ".join(name.split()).casefold()
+
+
+def team_delta(ratings: Sequence[float], score1: int, score2: int) -> float:
+    """Rating change of each team1 player; ratings in team1 + team2 order."""
+    expected = 1 / (1 + 10 ** ((ratings[2] + ratings[3] - ratings[0] - ratings[1]) / 2 / RATING_SCALE))
+    total = score1 + score2
+    result = score1 / total if total else 0.5
+    return RATING_K * (result - expected)
+
+
+def _waves(players: np.ndarray) -> np.ndarray:
+    """Wave of each match: one more than the latest wave of any of its players.
+
+    Matches of one wave share no player, so a wave is rated in one
+    vectorized step and the outcome equals replaying the matches one by one.
+    """
+    last = np.full(players.max(initial=-1) + 1, -1, dtype=np.int64)
+    waves = np.empty(len(players), dtype=np.int64)
+    for i, (a, b, c, d) in enumerate(players.tolist()):
+        w = max(last[a], last[b], last[c], last[d]) + 1
+        last[a] = last[b] = last[c] = last[d] = w
+        waves[i] = w
+    return waves
+
+
+def replay(players: np.ndarray, scores: np.ndarray, n: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Rate matches in order from scratch.
+
+    `players` is (m, 4) indexes into the n ratings, team1 then team2,
+    `scores` is (m, 2). Returns the ratings, matches played per player and
+    the team1 delta of every match.
+    """
+    ratings = np.full(n, RATING_INITIAL)
+    deltas = np.zeros(len(players))
+    if not len(players):
+        return ratings, np.zeros(n, dtype=np.int64), deltas
+
+    total = scores.sum(axis=1)
+    results = np.divide(scores[:, 0], total, out=np.full(len(scores), 0.5), where=total > 0)
+    waves = _waves(players)
+    order = np.argsort(waves, kind="stable")
+    for wave in np.split(order, np.flatnonzero(np.diff(waves[order])) + 1):
+        p = players[wave]
+        r = ratings[p]
+        expected = 1 / (1 + 10 ** ((r[:, 2] + r[:, 3] - r[:, 0] - r[:, 1]) / 2 / RATING_SCALE))
+        d = RATING_K * (results[wave] - expected)
+        ratings[p[:, :2]] += d[:, None]
+        ratings[p[:, 2:]] -= d[:, None]
+        deltas[wave] = d
+    return ratings, np.bincount(players.ravel(), minlength=n), deltas
+
+
+async def recompute() -> Dict[str, float]:
+    """Replay every completed match and store ratings and match deltas."""
+    from archive import SNAPSHOT_FORMAT, decode_snapshot
+
+    started = time.perf_counter()
+    async with AsyncSessionLocal() as session:
+        profiles = {key: pid for pid, key in await session.execute(
+            select(PlayerProfileORM.id, PlayerProfileORM.name_key)
+        )}
+        profile_of = dict((await session.execute(
+            select(PlayerORM.id, PlayerORM.profile_id).where(PlayerORM.profile_id.is_not(None))
+        )).all())
+
+        # (order key, match id or None when archived, profile ids, score1, score2)
+        entries: List[tuple] = []
+        live = await session.execute(
+            select(
+                TournamentORM.created_at, TournamentORM.id, MatchORM.round, MatchORM.court,
+                MatchORM.id, MatchORM.team1, MatchORM.team2, MatchORM.score1, MatchORM.score2,
+            )
+            .join(MatchORM, MatchORM.tournament_id == TournamentORM.id)
+            .where(MatchORM.completed.is_(True))
+        )
+        for created_at, tid, round_, court, mid, team1, team2, score1, score2 in live:
+            ids = [profile_of.get(p) for p in list(team1) + list(team2)]
+            entries.append(((created_at is not None, created_at, tid, round_, court), mid, ids, score1, score2))
+
+        archived = await session.execute(
+            select(TournamentORM.created_at, TournamentORM.id, TournamentSnapshotORM.format, TournamentSnapshotORM.data)
+            .join(TournamentSnapshotORM, TournamentSnapshotORM.tournament_id == TournamentORM.id)
+        )
+        for created_at, tid, fmt, data in archived:
+            if fmt != SNAPSHOT_FORMAT:
+                continue
+            snapshot = decode_snapshot(data)
+            # Snapshots taken before profiles existed have no profile_id, go by name
+            snap_profiles = {
+                p["id"]: p.get("profile_id") or profiles.get(name_key(p["name"]))
+                for p in snapshot["players"]
+            }
+            for matches in snapshot["rounds"]:
+                for m in matches:
+                    if m["completed"]:
+                        ids = [snap_profiles.get(p) for p in m["team1"] + m["team2"]]
+                        entries.append((
+                            (created_at is not None, created_at, tid, m["round"], m["court"]),
+                            None, ids, m["score1"], m["score2"],
+                        ))
+
+        # Unlinked players, and one person entered twice in a match, can't be rated
+        entries = [
+            e for e in entries
+            if None not in e[2] and len(set(e[2])) == 4 and e[3] is not None and e[4] is not None
+        ]
+        entries.sort(key=lambda e: e[0])
+        index = {pid: i for i, pid in enumerate(profiles.values())}
+        players = np.array([[index[p] for p in e[2]] for e in entries], dtype=np.int64).reshape(-1, 4)
+        scores = np.array([(e[3], e[4]) for e in entries], dtype=np.float64).reshape(-1, 2)
+        replayed = time.perf_counter()
+        ratings, played, deltas = replay(players, scores, len(index))
+        replayed = time.perf_counter() - replayed
+
+        await session.execute(update(MatchORM).values(rating_delta=None).execution_options(synchronize_session=False))
+        match_deltas = [
+            {"id": e[1], "rating_delta": float(d)} for e, d in zip(entries, deltas) if e[1] is not None
+        ]
+        if match_deltas:
+            await session.execute(update(MatchORM), match_deltas)
+        if index:
+            await session.execute(update(PlayerProfileORM), [
+                {"id": pid, "rating": float(ratings[i]), "matches_played": int(played[i])}
+                for pid, i in index.items()
+            ])
+        await session.commit()
+
+    return {
+        "matches": len(entries),
+        "profiles": len(index),
+        "replay_seconds": round(replayed, 3),
+        "total_seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+async def _main(args: List[str]) -> None:
+    if args[:1] != ["recompute"]:
+        print(__doc__)
+        return
+    stats = await recompute()
+    print(
+        f"Rated {stats['matches']} matches of {stats['profiles']} players in "
+        f"{stats['total_seconds']}s (replay {stats['replay_seconds']}s)"
+    )
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(_main(sys.argv[1:]))
@@ -0,0 +1,54 @@
+"""The app's Jinja templates, and pages sent while they render.
+
+One Jinja2Templates for every router, so each template is compiled once
+per process; `warm_templates` compiles them all up front (see serve.py).
+
+`stream_template` replaces TemplateResponse for the big tournament pages:
+Jinja's generate() output goes out in STREAM_CHUNK pieces, so the client
+gets the <head> (and starts fetching the stylesheet) and the current
+round before the history is rendered, and the whole page never sits in
+memory at once. CompressionMiddleware compresses each piece as it passes.
+"""
+import os
+from pathlib import Path
+from typing import AsyncIterator, Iterator
+
+from fastapi.templating import Jinja2Templates
+from starlette.responses import StreamingResponse
+
+from assets import install as install_assets
+from metrics import instrument_templates
+
+STREAM_CHUNK = int(os.getenv("STREAM_CHUNK", "16384"))
+FIRST_CHUNK = 1024  # about the <head>
+
+templates = Jinja2Templates(directory=Path(__file__).resolve().parent / "templates")
+instrument_templates(templates)
+install_assets(templates)
+
+
+def warm_templates() -> int:
+    """Compile every template now instead of on its first request; returns how many."""
+    names = templates.env.list_templates(extensions=["html"])
+    for name in names:
+        templates.get_template(name)
+    return len(names)
+
+
+async def _chunks(pieces: Iterator[str]) -> AsyncIterator[str]:
+    buffer, size, limit = [], 0, FIRST_CHUNK
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= limit:
+            yield "".join(buffer)
+            buffer, size, limit = [], 0, STREAM_CHUNK
+    if buffer:
+        yield "".join(buffer)
+
+
+def stream_template(name: str, context: dict, **kwargs) -> StreamingResponse:
+    template = templates.get_template(name)
+    return StreamingResponse(
+        _chunks(template.generate(context)), media_type="text/html; charset=utf-8", **kwargs,
+    )
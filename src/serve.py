@@ -0,0 +1,177 @@
+"""Production server: the app preloaded once, then forked into uvicorn workers.
+
+    python serve.py                          # WEB_WORKERS, or one per available core
+    python serve.py --workers 4 --port 8000
+
+The master imports the app, applies migrations (skipped with
+SKIP_SCHEMA_SETUP=1, e.g. when `python migrations.py` runs as a deploy
+step), compiles every template and precomputes the Americano designs,
+binds the socket and forks. Workers share all of that copy-on-write and
+accept on the same socket. uvicorn picks uvloop and httptools when they
+are installed.
+
+Each worker caches tournaments and serves live updates on its own;
+bus.py tells the others about every write. Only the first worker runs
+background tasks (the archiver). A worker that dies is replaced, unless
+it dies right after starting. SIGTERM or SIGINT stops them all gracefully.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import signal
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent
+MIN_UPTIME = 10  # seconds; a worker dying sooner is broken, not unlucky
+
+log = logging.getLogger("serve")
+
+
+def default_workers() -> int:
+    configured = int(os.getenv("WEB_WORKERS", "0"))
+    if configured > 0:
+        return configured
+    # Cores this process may use, which honours container CPU sets
+    return len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+
+
+async def _setup_schema() -> None:
+    from database import engine
+    from migrations import migrate
+
+    async with engine.begin() as conn:
+        applied = await migrate(conn)
+    if applied:
+        log.info("Applied migrations %s", applied)
+    # No connection may cross the fork, and this loop is gone after asyncio.run
+    await engine.dispose()
+
+
+def preload(workers: int):
+    """Everything workers can share; returns the app."""
+    if workers > 1 and not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        # Before prometheus_client is imported, see metrics.py
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="padel-metrics-")
+
+    started = time.perf_counter()
+    from main import app
+    from americano.schedule import precompute_designs
+    from rendering import warm_templates
+
+    if os.getenv("SKIP_SCHEMA_SETUP") != "1":
+        asyncio.run(_setup_schema())
+        os.environ["SKIP_SCHEMA_SETUP"] = "1"
+    templates = warm_templates()
+    designs = precompute_designs()
+    log.info(
+        "Preloaded in %.2fs: %d templates, %d schedule designs",
+        time.perf_counter() - started, templates, designs,
+    )
+    return app
+
+
+def run_worker(config, sock, index: int) -> None:
+    os.environ["RUN_BACKGROUND_TASKS"] = "1" if index == 0 else "0"
+    # Forked state that must not be shared: the random sequence
+    random.seed()
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+    import uvicorn
+
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def supervise(config, sock, workers: int) -> int:
+    children = {}  # pid -> (worker index, started at)
+    stopping = False
+
+    def spawn(index: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(config, sock, index)
+            except BaseException:
+                log.exception("Worker %d crashed", index)
+                code = 1
+            finally:
+                os._exit(code)
+        children[pid] = (index, time.monotonic())
+
+    def stop(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for index in range(workers):
+        spawn(index)
+    log.info("Serving on %s:%d with %d workers", config.host, config.port, workers)
+
+    code = 0
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        index, started_at = children.pop(pid, (None, 0))
+        if index is None:
+            continue
+        if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+            from prometheus_client import multiprocess
+
+            multiprocess.mark_process_dead(pid)
+        if stopping:
+            continue
+        exit_code = os.waitstatus_to_exitcode(status)
+        if time.monotonic() - started_at < MIN_UPTIME:
+            log.error("Worker %d exited with %d right after start, shutting down", index, exit_code)
+            code = 1
+            stop(None, None)
+        else:
+            log.warning("Worker %d exited with %d, restarting it", index, exit_code)
+            spawn(index)
+    return code
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("-w", "--workers", type=int, default=default_workers())
+    parser.add_argument("--log-level", default=os.getenv("LOG_LEVEL", "info"))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    # Templates, static files and SQLite paths are relative to src/
+    os.chdir(BASE_DIR)
+    sys.path.insert(0, str(BASE_DIR))
+
+    import uvicorn
+
+    app = preload(args.workers)
+    config = uvicorn.Config(
+        app, host=args.host, port=args.port, log_level=args.log_level,
+        loop="auto", http="auto",   # uvloop / httptools when installed
+        proxy_headers=True, timeout_graceful_shutdown=30,
+    )
+    sock = config.bind_socket()
+    if args.workers == 1:
+        run_worker(config, sock, 0)
+        return
+    sys.exit(supervise(config, sock, args.workers))
+
+
+if __name__ == "__main__":
+    main()
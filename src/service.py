@@ -0,0 +1,619 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import case, func, insert, select, tuple_, type_coerce, update
+from sqlalchemy.dialects.postgresql import JSONB, insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import aliased, raiseload
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import (
+    TournamentORM, PlayerORM, MatchORM, MatchParticipantORM, PlayerProfileORM, TournamentSnapshotORM,
+)
+from americano.models import Match, generate_id
+from rating import RATING_INITIAL, name_key, team_delta
+
+STAT_COLUMNS = ("points", "games_played", "games_won", "games_lost")
+PLAYER_STATS = (PlayerORM.id, *(getattr(PlayerORM, col) for col in STAT_COLUMNS))
+MAX_SCORE = 99
+
+
+def check_score(score1: int, score2: int) -> None:
+    """Raises ValueError with a user-facing message for a score no court plays."""
+    if not (0 <= score1 <= MAX_SCORE and 0 <= score2 <= MAX_SCORE):
+        raise ValueError(f"Счёт должен быть от 0 до {MAX_SCORE}")
+
+
+def _stats_delta(score_for: int, score_against: int, delta: int = 1) -> dict:
+    """Per-player stat increments for one match result (-1 reverts it)."""
+    won = score_for > score_against
+    return {
+        "points": delta * score_for,
+        "games_played": delta,
+        "games_won": delta if won else 0,
+        "games_lost": 0 if won else delta,
+    }
+
+
+def _merge(*deltas: dict) -> dict:
+    return {col: sum(d[col] for d in deltas) for col in STAT_COLUMNS}
+
+
+def _player_increments(in_team1, team1_delta: dict, team2_delta: dict) -> dict:
+    return {
+        col: getattr(PlayerORM, col) + case(
+            (in_team1, team1_delta[col]), else_=team2_delta[col],
+        )
+        for col in STAT_COLUMNS
+    }
+
+
+async def _write_match(
+    session: AsyncSession,
+    tid: str,
+    match_update,
+    team1_delta: dict,
+    team2_delta: dict,
+) -> List[dict]:
+    """Run the match UPDATE and the player increments as one statement.
+
+    The match update is a CTE returning the teams, the players of both
+    teams are then incremented in place (`points = points + :x`), so
+    concurrent submits never overwrite each other's stats. Databases
+    without data-modifying CTEs (SQLite) take two statements instead.
+    """
+    if session.get_bind().dialect.name != "postgresql":
+        return await _write_match_two_step(session, tid, match_update, team1_delta, team2_delta)
+
+    m = match_update.returning(MatchORM.team1, MatchORM.team2).cte("m")
+    team1, team2 = type_coerce(m.c.team1, JSONB), type_coerce(m.c.team2, JSONB)
+    in_team1 = team1.has_key(PlayerORM.id)
+    stmt = (
+        update(PlayerORM)
+        .where(
+            PlayerORM.tournament_id == tid,
+            in_team1 | team2.has_key(PlayerORM.id),
+        )
+        .values(_player_increments(in_team1, team1_delta, team2_delta))
+        .returning(*PLAYER_STATS)
+        .execution_options(synchronize_session=False)
+    )
+    result = await session.execute(stmt)
+    return [dict(row._mapping) for row in result]
+
+
+async def _write_match_two_step(
+    session: AsyncSession,
+    tid: str,
+    match_update,
+    team1_delta: dict,
+    team2_delta: dict,
+) -> List[dict]:
+    teams = (await session.execute(
+        match_update.returning(MatchORM.team1, MatchORM.team2)
+        .execution_options(synchronize_session=False)
+    )).first()
+    if teams is None:
+        return []
+    in_team1 = PlayerORM.id.in_(teams.team1)
+    result = await session.execute(
+        update(PlayerORM)
+        .where(
+            PlayerORM.tournament_id == tid,
+            PlayerORM.id.in_(list(teams.team1) + list(teams.team2)),
+        )
+        .values(_player_increments(in_team1, team1_delta, team2_delta))
+        .returning(*PLAYER_STATS)
+        .execution_options(synchronize_session=False)
+    )
+    return [dict(row._mapping) for row in result]
+
+
+async def record_match_score(
+    session: AsyncSession, tid: str, match_id: str, score1: int, score2: int,
+) -> Optional[List[dict]]:
+    """Complete an open match of the current round.
+
+    Returns the updated player rows, or None when the match is not an
+    open match of the tournament's current round.
+    """
+    current_round = (
+        select(TournamentORM.current_round + 1)
+        .where(TournamentORM.id == tid)
+        .scalar_subquery()
+    )
+    match_update = (
+        update(MatchORM)
+        .where(
+            MatchORM.id == match_id,
+            MatchORM.tournament_id == tid,
+            MatchORM.completed.is_(False),
+            MatchORM.round == current_round,
+        )
+        .values(score1=score1, score2=score2, completed=True)
+    )
+    rated = await match_ratings(session, tid, match_id)
+    delta = team_delta(rated.ratings, score1, score2) if rated else None
+    rows = await _write_match(
+        session, tid, match_update.values(rating_delta=delta),
+        _stats_delta(score1, score2),
+        _stats_delta(score2, score1),
+    )
+    if rows and rated:
+        await apply_rating(session, rated.profile_ids, delta)
+    return rows or None
+
+
+async def edit_match_score(
+    session: AsyncSession, tid: str, match_id: str, score1: int, score2: int,
+) -> Optional[List[dict]]:
+    """Replace the score of a completed match, reverting the old result.
+
+    Returns the updated player rows, or None when no such completed match.
+    Raises ValueError for an archived tournament, its matches live in the
+    snapshot and can't be edited.
+    """
+    old = (await session.execute(
+        select(MatchORM.score1, MatchORM.score2, MatchORM.rating_delta)
+        .where(
+            MatchORM.id == match_id,
+            MatchORM.tournament_id == tid,
+            MatchORM.completed.is_(True),
+        )
+        .with_for_update()
+    )).first()
+    if old is None:
+        archived = await session.scalar(select(TournamentORM.archived).where(TournamentORM.id == tid))
+        if archived:
+            raise ValueError("Турнир в архиве")
+        return None
+
+    match_update = (
+        update(MatchORM)
+        .where(MatchORM.id == match_id, MatchORM.tournament_id == tid)
+        .values(score1=score1, score2=score2)
+    )
+    rated = await match_ratings(session, tid, match_id)
+    delta = None
+    if rated:
+        # Rate the new score from where the players stood before the old one
+        old_delta = old.rating_delta or 0.0
+        before = [r - old_delta for r in rated.ratings[:2]] + [r + old_delta for r in rated.ratings[2:]]
+        delta = team_delta(before, score1, score2)
+        match_update = match_update.values(rating_delta=delta)
+    rows = await _write_match(
+        session, tid, match_update,
+        _merge(_stats_delta(old.score1, old.score2, -1), _stats_delta(score1, score2)),
+        _merge(_stats_delta(old.score2, old.score1, -1), _stats_delta(score2, score1)),
+    )
+    if rows and rated:
+        await apply_rating(
+            session, rated.profile_ids, delta - old_delta,
+            played=0 if old.rating_delta is not None else 1,
+        )
+    return rows or None
+
+
+class MatchRatings(NamedTuple):
+    profile_ids: List[str]   # team1 then team2
+    ratings: List[float]
+
+
+async def match_ratings(session: AsyncSession, tid: str, match_id: str) -> Optional[MatchRatings]:
+    """Profiles and ratings of a match's four players; None if it can't be rated."""
+    rows = (await session.execute(
+        select(PlayerProfileORM.id, PlayerProfileORM.rating)
+        .join(PlayerORM, PlayerORM.profile_id == PlayerProfileORM.id)
+        .join(MatchParticipantORM, MatchParticipantORM.player_id == PlayerORM.id)
+        .where(MatchParticipantORM.match_id == match_id, MatchParticipantORM.tournament_id == tid)
+        .order_by(MatchParticipantORM.team, MatchParticipantORM.slot)
+    )).all()
+    # Unlinked players, or one person entered twice
+    if len(rows) != 4 or len({r.id for r in rows}) != 4:
+        return None
+    return MatchRatings([r.id for r in rows], [r.rating for r in rows])
+
+
+async def apply_rating(session: AsyncSession, profile_ids: List[str], delta: float, played: int = 1) -> None:
+    """Team1 profiles gain `delta`, team2 ones lose it, in one UPDATE."""
+    change = {pid: delta if i < 2 else -delta for i, pid in enumerate(profile_ids)}
+    await session.execute(
+        update(PlayerProfileORM)
+        .where(PlayerProfileORM.id.in_(change))
+        .values(
+            rating=PlayerProfileORM.rating + case(change, value=PlayerProfileORM.id),
+            matches_played=PlayerProfileORM.matches_played + played,
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def link_profiles(session: AsyncSession, names: List[str]) -> Dict[str, Tuple[str, float]]:
+    """(profile id, rating) per name_key of `names`, creating the missing profiles."""
+    keys = {}
+    for name in names:
+        keys.setdefault(name_key(name), " ".join(name.split()))
+    if not keys:
+        return {}
+    dialect_insert = pg_insert if session.get_bind().dialect.name == "postgresql" else sqlite_insert
+    await session.execute(
+        dialect_insert(PlayerProfileORM)
+        .values([
+            {"id": generate_id(), "name": name, "name_key": key, "rating": RATING_INITIAL, "matches_played": 0}
+            for key, name in keys.items()
+        ])
+        .on_conflict_do_nothing(index_elements=["name_key"])
+    )
+    rows = await session.execute(
+        select(PlayerProfileORM.name_key, PlayerProfileORM.id, PlayerProfileORM.rating)
+        .where(PlayerProfileORM.name_key.in_(keys))
+    )
+    return {key: (pid, rating) for key, pid, rating in rows}
+
+
+async def tournament_ratings(session: AsyncSession, tid: str) -> Dict[str, float]:
+    """Rating of each linked player of a tournament, by player id."""
+    return dict((await session.execute(
+        select(PlayerORM.id, PlayerProfileORM.rating)
+        .join(PlayerProfileORM, PlayerProfileORM.id == PlayerORM.profile_id)
+        .where(PlayerORM.tournament_id == tid)
+    )).all())
+
+
+async def get_tournament_row(session: AsyncSession, tid: str) -> Optional[TournamentORM]:
+    """Tournament columns only, players and matches are not loaded."""
+    return (await session.execute(
+        select(TournamentORM)
+        .where(TournamentORM.id == tid)
+        .options(raiseload("*"))
+    )).scalar_one_or_none()
+
+
+async def round_matches(session: AsyncSession, tid: str, round_num: int) -> List[MatchORM]:
+    """Matches of one round, an index range scan on (tournament_id, round, court)."""
+    return list((await session.execute(
+        select(MatchORM)
+        .where(MatchORM.tournament_id == tid, MatchORM.round == round_num)
+        .order_by(MatchORM.court)
+    )).scalars())
+
+
+async def bump_version(session: AsyncSession, tid: str, version: int) -> bool:
+    """Move the tournament from `version` to the next one.
+
+    False when another write got there first; the caller should roll back.
+    """
+    result = await session.execute(
+        update(TournamentORM)
+        .where(TournamentORM.id == tid, TournamentORM.version == version)
+        .values(version=version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+async def update_active_round(session: AsyncSession, tid: str, seen_round: int, **values) -> bool:
+    """Write tournament columns and bump the version, if still active in `seen_round`.
+
+    Next-round, finish and swaps only depend on the round and status, so a
+    score submitted meanwhile (it bumps the version too) is no conflict.
+    False when another write moved the round or ended the tournament first.
+    """
+    result = await session.execute(
+        update(TournamentORM)
+        .where(
+            TournamentORM.id == tid,
+            TournamentORM.current_round == seen_round,
+            TournamentORM.status == "active",
+        )
+        .values(version=TournamentORM.version + 1, **values)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+async def insert_matches(session: AsyncSession, tid: str, matches: List[Match]) -> None:
+    """Bulk-insert generated matches and their participants as multi-row INSERTs."""
+    await _insert_match_rows(session, [(tid, m) for m in matches])
+
+
+async def _insert_match_rows(session: AsyncSession, matches: List[Tuple[str, Match]]) -> None:
+    if not matches:
+        return
+    await session.execute(insert(MatchORM), [
+        {
+            "id": m.id, "tournament_id": tid,
+            "round": m.round, "court": m.court,
+            "team1": m.team1, "team2": m.team2,
+            "score1": m.score1, "score2": m.score2, "completed": m.completed,
+        }
+        for tid, m in matches
+    ])
+    await session.execute(insert(MatchParticipantORM), [
+        {
+            "match_id": m.id, "team": team, "slot": slot, "player_id": pid,
+            "tournament_id": tid, "round": m.round,
+        }
+        for tid, m in matches
+        for team, players in ((1, m.team1), (2, m.team2))
+        for slot, pid in enumerate(players)
+    ])
+
+
+async def player_matches(session: AsyncSession, tid: str, pid: str) -> List[MatchORM]:
+    """All matches of one player, by round."""
+    return list((await session.execute(
+        select(MatchORM)
+        .join(MatchParticipantORM, MatchParticipantORM.match_id == MatchORM.id)
+        .where(MatchParticipantORM.player_id == pid, MatchParticipantORM.tournament_id == tid)
+        .order_by(MatchORM.round, MatchORM.court)
+    )).scalars())
+
+
+async def swap_players(
+    session: AsyncSession, tid: str, round_num: int,
+    match_id: str, team: int, slot: int, new_pid: str,
+) -> List[MatchORM]:
+    """Put `new_pid` into a slot of an open match of the round.
+
+    If the new player already plays in the round, the replaced player
+    takes their place, so nobody plays twice. Returns the changed matches;
+    raises ValueError with a user-facing message when the swap is invalid.
+    """
+    target = (await session.execute(
+        select(MatchORM)
+        .where(MatchORM.id == match_id, MatchORM.tournament_id == tid, MatchORM.round == round_num)
+        .with_for_update()
+    )).scalar_one_or_none()
+    if target is None or target.completed:
+        raise ValueError("Матч не найден или уже завершён")
+
+    team_key = f"team{team}"
+    old_pid = getattr(target, team_key)[slot]
+    if old_pid == new_pid:
+        return []
+    known = await session.scalar(
+        select(PlayerORM.id).where(PlayerORM.id == new_pid, PlayerORM.tournament_id == tid)
+    )
+    if known is None:
+        raise ValueError("Игрок не найден")
+
+    moves = [(target, team, slot, new_pid)]
+    current = (await session.execute(
+        select(MatchParticipantORM)
+        .where(
+            MatchParticipantORM.tournament_id == tid,
+            MatchParticipantORM.round == round_num,
+            MatchParticipantORM.player_id == new_pid,
+        )
+    )).scalars().first()
+    if current is not None:
+        source = target
+        if current.match_id != target.id:
+            source = await session.get(MatchORM, current.match_id, with_for_update=True)
+        if source.completed:
+            raise ValueError("Игрок уже сыграл в этом раунде")
+        moves.append((source, current.team, current.slot, old_pid))
+
+    for m, m_team, m_slot, pid in moves:
+        players = list(getattr(m, f"team{m_team}"))
+        players[m_slot] = pid
+        setattr(m, f"team{m_team}", players)
+        await session.execute(
+            update(MatchParticipantORM)
+            .where(
+                MatchParticipantORM.match_id == m.id,
+                MatchParticipantORM.team == m_team,
+                MatchParticipantORM.slot == m_slot,
+            )
+            .values(player_id=pid)
+            .execution_options(synchronize_session=False)
+        )
+    return list({m.id: m for m, *_ in moves}.values())
+
+
+async def insert_tournament(
+    session: AsyncSession, tournament: dict, players: List[dict], matches: List[Match],
+) -> None:
+    """Create a tournament with its players and schedule without the unit of work.
+
+    `tournament` holds TournamentORM column values, each of `players` at
+    least `id` and `name`. Players without `profile_id` are linked to
+    their profile by name.
+    """
+    await insert_tournaments(session, [(tournament, players, matches)])
+
+
+async def insert_tournaments(
+    session: AsyncSession, tournaments: List[Tuple[dict, List[dict], List[Match]]],
+) -> None:
+    """insert_tournament for many at once, still four INSERTs plus the profile link.
+
+    The tournament dicts must all have the same keys.
+    """
+    if not tournaments:
+        return
+    names = [p["name"] for _, players, _ in tournaments for p in players if "profile_id" not in p]
+    profiles = await link_profiles(session, names) if names else {}
+    await session.execute(insert(TournamentORM), [t for t, _, _ in tournaments])
+    await session.execute(insert(PlayerORM), [
+        {"tournament_id": t["id"], "profile_id": profiles.get(name_key(p["name"]), (None,))[0], **p}
+        for t, players, _ in tournaments
+        for p in players
+    ])
+    await _insert_match_rows(session, [
+        (t["id"], m) for t, _, matches in tournaments for m in matches
+    ])
+
+
+DIRECTORY_COLUMNS = (
+    TournamentORM.id, TournamentORM.mode, TournamentORM.name, TournamentORM.status,
+    TournamentORM.courts, TournamentORM.current_round, TournamentORM.total_rounds,
+    TournamentORM.archived, TournamentORM.created_at,
+)
+
+Cursor = Tuple[datetime, str]
+
+
+def encode_cursor(cursor: Cursor) -> str:
+    created_at, tid = cursor
+    raw = json.dumps([created_at.isoformat(), tid], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> Cursor:
+    """Inverse of encode_cursor; ValueError on anything it did not produce."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        created_at, tid = json.loads(raw)
+        return datetime.fromisoformat(created_at), str(tid)
+    except (TypeError, ValueError, binascii.Error) as exc:
+        raise ValueError("Неверный курсор") from exc
+
+
+async def list_tournaments(
+    session: AsyncSession, *, mode: Optional[str] = None, status: Optional[str] = None,
+    search: str = "", after: Optional[Cursor] = None, limit: int = 20,
+) -> Tuple[list, Optional[Cursor]]:
+    """One page of the directory, newest first, and the cursor of the next page.
+
+    Only the summary columns are selected, so no players or matches are
+    loaded. Paging is a keyset on (created_at, id): each page is an index
+    range scan no matter how deep it is.
+    """
+    query = select(*DIRECTORY_COLUMNS)
+    if mode:
+        query = query.where(TournamentORM.mode == mode)
+    if status:
+        query = query.where(TournamentORM.status == status)
+    if search:
+        pattern = "%" + search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        query = query.where(TournamentORM.name.ilike(pattern, escape="\\"))
+    if after is not None:
+        query = query.where(tuple_(TournamentORM.created_at, TournamentORM.id) < tuple_(*after))
+    query = query.order_by(TournamentORM.created_at.desc(), TournamentORM.id.desc()).limit(limit + 1)
+
+    rows = list(await session.execute(query))
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, (rows[-1].created_at, rows[-1].id)
+
+
+async def top_profiles(session: AsyncSession, search: str = "", limit: int = 50) -> List[PlayerProfileORM]:
+    """Rating table, best first; an index scan on rating."""
+    query = select(PlayerProfileORM)
+    if search:
+        query = query.where(PlayerProfileORM.name_key.contains(name_key(search), autoescape=True))
+    return list((await session.execute(
+        query.order_by(PlayerProfileORM.rating.desc(), PlayerProfileORM.id).limit(limit)
+    )).scalars())
+
+
+async def profile_tournaments(session: AsyncSession, profile_id: str) -> list:
+    """Summary rows of the tournaments a profile took part in, newest first."""
+    return list(await session.execute(
+        select(*DIRECTORY_COLUMNS)
+        .join(PlayerORM, PlayerORM.tournament_id == TournamentORM.id)
+        .where(PlayerORM.profile_id == profile_id)
+        .order_by(TournamentORM.created_at.desc(), TournamentORM.id.desc())
+    ))
+
+
+MATCH_FIELDS = (
+    "tournament_id", "tournament", "mode", "created_at", "round", "court",
+    "team1_player1", "team1_player2", "team2_player1", "team2_player2",
+    "score1", "score2", "completed",
+)
+PLAYER_FIELDS = (
+    "tournament_id", "tournament", "mode", "created_at", "rank", "player_id", "profile_id",
+    "name", "sex", "points", "games_played", "games_won", "games_lost",
+)
+EXPORT_COLUMNS = (TournamentORM.id, TournamentORM.name, TournamentORM.mode, TournamentORM.created_at)
+EXPORT_BATCH = 1000
+
+
+def _export_filter(query, tid: Optional[str], since: Optional[datetime], until: Optional[datetime]):
+    if tid:
+        query = query.where(TournamentORM.id == tid)
+    if since is not None:
+        query = query.where(TournamentORM.created_at >= since)
+    if until is not None:
+        query = query.where(TournamentORM.created_at < until)
+    return query
+
+
+async def export_rows(
+    session: AsyncSession, kind: str, *, tid: Optional[str] = None,
+    since: Optional[datetime] = None, until: Optional[datetime] = None,
+) -> AsyncIterator[tuple]:
+    """Rows of MATCH_FIELDS ("matches") or PLAYER_FIELDS ("players"), oldest tournament first.
+
+    Live tournaments come first, then archived ones from their snapshots.
+    Both are read through server-side cursors in batches, so memory does
+    not grow with the size of the export. Players are in standings order.
+    """
+    if kind == "matches":
+        slots = [aliased(PlayerORM) for _ in range(4)]
+        query = select(
+            *EXPORT_COLUMNS, MatchORM.round, MatchORM.court, *(p.name for p in slots),
+            MatchORM.score1, MatchORM.score2, MatchORM.completed,
+        ).join(MatchORM, MatchORM.tournament_id == TournamentORM.id)
+        for p, (team, i) in zip(slots, ((MatchORM.team1, 0), (MatchORM.team1, 1), (MatchORM.team2, 0), (MatchORM.team2, 1))):
+            query = query.outerjoin(p, p.id == team[i].as_string())
+        order = (MatchORM.round, MatchORM.court)
+    else:
+        rank = func.row_number().over(
+            partition_by=PlayerORM.tournament_id,
+            order_by=(PlayerORM.points.desc(), PlayerORM.games_won.desc(), PlayerORM.id),
+        )
+        query = select(
+            *EXPORT_COLUMNS, rank.label("rank"), PlayerORM.id, PlayerORM.profile_id, PlayerORM.name,
+            PlayerORM.sex, *(getattr(PlayerORM, col) for col in STAT_COLUMNS),
+        ).join(PlayerORM, PlayerORM.tournament_id == TournamentORM.id)
+        order = ("rank",)
+    query = _export_filter(query.where(TournamentORM.archived.is_(False)), tid, since, until)
+    live = await session.stream(
+        query.order_by(TournamentORM.created_at, TournamentORM.id, *order)
+        .execution_options(yield_per=EXPORT_BATCH)
+    )
+    async for rows in live.partitions():
+        for row in rows:
+            yield tuple(row)
+
+    from archive import SNAPSHOT_FORMAT, decode_snapshot
+
+    archived = await session.stream(
+        _export_filter(
+            select(*EXPORT_COLUMNS, TournamentSnapshotORM.format, TournamentSnapshotORM.data)
+            .join(TournamentSnapshotORM, TournamentSnapshotORM.tournament_id == TournamentORM.id),
+            tid, since, until,
+        )
+        .order_by(TournamentORM.created_at, TournamentORM.id)
+        # Snapshots are a few kB each
+        .execution_options(yield_per=50)
+    )
+    async for t_id, t_name, mode, created_at, fmt, data in archived:
+        if fmt != SNAPSHOT_FORMAT:
+            continue
+        snapshot = decode_snapshot(data)
+        head = (t_id, t_name, mode, created_at)
+        players = {p["id"]: p for p in snapshot["players"]}
+        if kind == "matches":
+            for matches in snapshot["rounds"]:
+                for m in matches:
+                    yield head + (
+                        m["round"], m["court"],
+                        *(players[pid]["name"] if pid in players else None for pid in m["team1"] + m["team2"]),
+                        m["score1"], m["score2"], m["completed"],
+                    )
+        else:
+            for s in snapshot["standings"]:
+                p = players.get(s["id"], {})
+                yield head + (
+                    s["rank"], s["id"], p.get("profile_id"), s["name"], p.get("sex"),
+                    *(s[col] for col in STAT_COLUMNS),
+                )
@@ -0,0 +1,176 @@
+// Live tournament updates: the server pushes compact diffs over
+// Server-Sent Events and the page is patched in place: scores,
+// standings and history, swapped players and the cards of a new round.
+// Score, edit and next-round forms are posted with fetch, their result
+// arrives as an event like everybody else's. Only a change of the
+// tournament status (finish) reloads the page.
+
+let liveSource = null;
+const live = {players: {}, matches: {}, round: 0, totalRounds: 0};
+
+function startLive(url, players, matches, state) {
+    if (!window.EventSource) return;
+    live.players = players;
+    live.round = state.round;
+    live.totalRounds = state.totalRounds;
+    matches.forEach(m => { live.matches[m.id] = m; });
+
+    liveSource = new EventSource(url);
+    liveSource.onmessage = (e) => {
+        const ev = JSON.parse(e.data);
+        if (ev.type === 'score') {
+            applyScore(ev);
+        } else if (ev.type === 'swap') {
+            ev.matches.forEach(m => { live.matches[m.id] = m; replaceCard(m); });
+        } else if (ev.type === 'round' && ev.matches.length) {
+            applyRound(ev);
+        } else if (ev.type === 'delete') {
+            liveSource.close();
+            window.location.href = ev.redirect;
+        } else {
+            liveSource.close();
+            window.location.reload();
+        }
+    };
+}
+
+// POST a form without leaving the page; false when it failed.
+// Without a live connection the change would not show up, so reload.
+async function livePost(url, body) {
+    let res;
+    try {
+        res = await fetch(url, {method: 'POST', body, headers: {'Accept': 'application/json'}});
+    } catch (e) {
+        alert('Ошибка соединения');
+        return false;
+    }
+    if (!res.ok) {
+        const data = await res.json().catch(() => ({}));
+        alert('Ошибка: ' + (data.detail || res.status));
+        return false;
+    }
+    if (!liveSource || liveSource.readyState !== EventSource.OPEN) window.location.reload();
+    return true;
+}
+
+document.addEventListener('submit', async (e) => {
+    const form = e.target;
+    if (!liveSource || !form.matches('form[data-live-submit]')) return;
+    e.preventDefault();
+    const button = form.querySelector('[type="submit"]');
+    if (button) button.disabled = true;
+    const ok = await livePost(form.action, new FormData(form));
+    if (button) button.disabled = false;
+    if (ok) {
+        const editor = form.closest('.edit-score-form, .history-edit-form');
+        if (editor) editor.classList.remove('visible');
+    }
+});
+
+function escapeHtml(s) {
+    return String(s).replace(/[&<>"']/g, c => ({
+        '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'
+    })[c]);
+}
+
+// Clone a <template> rendered around a blank match, see tournament.html
+function fromTemplate(id, m) {
+    const values = {
+        __id__: m.id, __round__: m.round, __court__: m.court,
+        __s1__: m.score1 ?? '', __s2__: m.score2 ?? '',
+    };
+    m.team1.concat(m.team2).forEach((pid, i) => {
+        values[`__p${i}__`] = pid;
+        values[`__n${i}__`] = live.players[pid] ? live.players[pid].name : '';
+    });
+    let html = document.getElementById(id).innerHTML;
+    for (const [token, value] of Object.entries(values)) {
+        html = html.split(token).join(escapeHtml(value));
+    }
+    const box = document.createElement('div');
+    box.innerHTML = html.trim();
+    return box.firstElementChild;
+}
+
+function replaceCard(m) {
+    const card = document.querySelector(`.court-card[data-match-id="${m.id}"]`);
+    if (card) card.replaceWith(fromTemplate(m.completed ? 'court-card-done' : 'court-card-open', m));
+}
+
+function applyScore(ev) {
+    ev.players.forEach(p => Object.assign(live.players[p.id], p));
+    renderStandings(live.players);
+
+    document.querySelectorAll(`[data-score-for="${ev.match_id}"]`).forEach(el => {
+        el.textContent = `${ev.score1}:${ev.score2}`;
+    });
+    document.querySelectorAll(`#history-edit-${ev.match_id} input[name="score1"]`).forEach(el => { el.value = ev.score1; });
+    document.querySelectorAll(`#history-edit-${ev.match_id} input[name="score2"]`).forEach(el => { el.value = ev.score2; });
+
+    // Not a match of the current round: an edit of an older one
+    const m = live.matches[ev.match_id];
+    if (!m) return;
+    const isNew = !m.completed;
+    Object.assign(m, {score1: ev.score1, score2: ev.score2, completed: true});
+    replaceCard(m);
+    if (isNew) addToHistory(m);
+    updateRoundControls();
+}
+
+function addToHistory(m) {
+    const history = document.getElementById('history');
+    if (!history) return;
+    const block = fromTemplate(document.getElementById(`history-round-${m.round}`) ? `history-round-${m.round}` : 'history-round', m);
+    const existing = history.querySelector(`[data-history-round="${m.round}"] .history-matches`);
+    if (!existing) {
+        history.appendChild(block);
+    } else {
+        const entry = block.querySelector('.history-match');
+        const after = [...existing.children].find(el => Number(el.dataset.court) > m.court);
+        existing.insertBefore(entry, after || null);
+    }
+    document.getElementById('history-card').hidden = false;
+}
+
+function applyRound(ev) {
+    live.round = ev.round;
+    live.matches = {};
+    document.getElementById('court-grid').replaceChildren(...ev.matches.map(m => {
+        live.matches[m.id] = m;
+        return fromTemplate('court-card-open', m);
+    }));
+    document.querySelectorAll('[data-live="round-number"]').forEach(el => { el.textContent = ev.round + 1; });
+    document.querySelectorAll('[data-live="round-kind"]').forEach(el => { el.textContent = el.dataset.later; });
+    document.querySelectorAll('.round-dot').forEach((dot, i) => {
+        dot.classList.toggle('done', i < ev.round);
+        dot.classList.toggle('current', i === ev.round);
+        dot.classList.toggle('future', i > ev.round && dot.classList.contains('future'));
+    });
+    updateRoundControls();
+}
+
+function updateRoundControls() {
+    const matches = Object.values(live.matches);
+    const controls = document.getElementById('round-controls');
+    if (controls) controls.hidden = !(matches.length && matches.every(m => m.completed));
+    const next = document.getElementById('next-round-form');
+    if (next) next.hidden = live.round + 1 >= live.totalRounds;
+}
+
+function renderStandings(players) {
+    const body = document.getElementById('standings-body');
+    if (!body) return;
+    const medals = {1: '🥇 ', 2: '🥈 ', 3: '🥉 '};
+    const rows = Object.values(players).sort(
+        (a, b) => (b.points - a.points) || (b.games_won - a.games_won)
+    );
+    body.innerHTML = rows.map((p, i) => `
+        <tr>
+            <td class="rank-cell rank-${i + 1}">${i + 1}</td>
+            <td class="player-cell">${medals[i + 1] || ''}${escapeHtml(p.name)}</td>
+            <td class="pts-cell">${p.points}</td>
+            <td style="color:var(--muted)">${p.games_played}</td>
+            <td style="color:#7dffb3; font-weight:600">${p.games_won}</td>
+            <td style="color:#f57045; font-weight:600">${p.games_lost}</td>
+        </tr>`).join('');
+}
@@ -0,0 +1,69 @@
+"""Tests run the app in-process on the SQLite backend, one fresh database per run.
+
+    cd src && python -m pytest tests
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, Tuple
+
+# Before anything imports database.py, which builds the engine at import
+_db_dir = tempfile.mkdtemp(prefix="padel-tests-")
+os.environ["DB_BACKEND"] = "sqlite"
+os.environ["SQLITE_PATH"] = os.path.join(_db_dir, "padelchamp.db")
+os.environ["RUN_BACKGROUND_TASKS"] = "0"
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx
+import pytest
+from sqlalchemy import delete
+
+from cache import fragment_cache, tournament_cache
+from database import AsyncSessionLocal, Base
+from main import app, lifespan
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def client():
+    """ASGI client with the schema migrated; every table is emptied afterwards."""
+    async with lifespan(app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as c:
+            yield c
+        async with AsyncSessionLocal() as session:
+            for table in reversed(Base.metadata.sorted_tables):
+                await session.execute(delete(table))
+            await session.commit()
+    tournament_cache.clear()
+    fragment_cache.clear()
+
+
+async def create_americano(client: httpx.AsyncClient, players: int = 8, courts: int = 2, **form) -> str:
+    names = "\n".join(f"Игрок {i}" for i in range(players))
+    r = await client.post("/americano/tournament/create", data={
+        "name": "Тест", "courts": courts, "player_names": names, **form,
+    })
+    assert r.status_code == 303, r.text
+    return r.headers["location"].rsplit("/", 1)[1]
+
+
+async def state(client: httpx.AsyncClient, tid: str) -> dict:
+    r = await client.get(f"/api/tournaments/{tid}")
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+def query_budgets(app) -> Dict[Tuple[str, str], int]:
+    """(method, path) -> the `@query_budget` of every route that declares one."""
+    budgets = {}
+    for route in app.routes:
+        budget = getattr(getattr(route, "endpoint", None), "query_budget", None)
+        if budget is not None:
+            for method in route.methods:
+                budgets[method, route.path] = budget
+    return budgets
@@ -0,0 +1,73 @@
+import pytest
+
+from cache import tournament_cache
+from conftest import create_americano
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_state_is_304_until_the_next_write(client):
+    tid = await create_americano(client)
+    url = f"/api/tournaments/{tid}"
+    r = await client.get(url)
+    etag = r.headers["etag"]
+    match = r.json()["rounds"][0][0]
+
+    r = await client.get(url, headers={"If-None-Match": etag})
+    assert r.status_code == 304
+    assert r.headers["etag"] == etag
+    assert not r.content
+    # Compressed responses carry weak tags, either form matches
+    assert etag.startswith("W/")
+    assert (await client.get(url, headers={"If-None-Match": f'"other", {etag.removeprefix("W/")}'})).status_code == 304
+
+    await client.post(f"/americano/tournament/{tid}/score", data={"match_id": match["id"], "score1": 6, "score2": 1})
+    r = await client.get(url, headers={"If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.headers["etag"] != etag
+    assert r.json()["rounds"][0][0]["completed"]
+
+
+async def test_etag_is_the_same_in_every_worker(client):
+    tid = await create_americano(client)
+    url = f"/api/tournaments/{tid}"
+    etag = (await client.get(url)).headers["etag"]
+    # What another worker has: nothing cached, its own cache versions
+    tournament_cache.clear()
+    tournament_cache.invalidate(tid)
+    assert (await client.get(url, headers={"If-None-Match": etag})).status_code == 304
+    assert (await client.get(url)).headers["etag"] == etag
+
+
+async def test_stale_cached_view_is_rebuilt_on_a_conditional_request(client):
+    """A write in another worker whose notification has not arrived yet."""
+    tid = await create_americano(client)
+    url = f"/api/tournaments/{tid}"
+    r = await client.get(url)
+    etag, match = r.headers["etag"], r.json()["rounds"][0][0]
+    cached = tournament_cache.get(tid)
+    await client.post(f"/americano/tournament/{tid}/score", data={"match_id": match["id"], "score1": 6, "score2": 1})
+    tournament_cache.put(tid, cached, tournament_cache.version(tid))
+
+    r = await client.get(url, headers={"If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.json()["rounds"][0][0]["completed"]
+
+
+async def test_player_matches_304_and_unknown_tournament(client):
+    tid = await create_americano(client)
+    data = (await client.get(f"/api/tournaments/{tid}")).json()
+    pid = data["players"][0]["id"]
+    r = await client.get(f"/api/tournaments/{tid}/players/{pid}/matches")
+    assert r.status_code == 200 and r.json()
+    assert (await client.get(
+        f"/api/tournaments/{tid}/players/{pid}/matches", headers={"If-None-Match": r.headers["etag"]},
+    )).status_code == 304
+    assert (await client.get("/api/tournaments/nope", headers={"If-None-Match": '"x"'})).status_code == 404
+    assert (await client.get(f"/api/tournaments/nope/players/{pid}/matches")).status_code == 404
+
+
+async def test_operational_endpoints_stay_out_of_the_schema(client):
+    paths = (await client.get("/openapi.json")).json()["paths"]
+    assert not {"/pool-stats", "/healthz", "/readyz", "/metrics"} & set(paths)
+    assert (await client.get("/pool-stats")).status_code == 200
@@ -0,0 +1,119 @@
+import json
+
+import pytest
+from sqlalchemy import func, select
+
+import archive
+from api.router import VIEW_BUILDERS
+from archive import archive_finished, archive_tournament
+from conftest import create_americano, state
+from database import (
+    AsyncSessionLocal, MatchORM, MatchParticipantORM, PlayerORM, TournamentORM, TournamentSnapshotORM,
+)
+
+pytestmark = pytest.mark.anyio
+
+
+async def finished(client) -> str:
+    """Two rounds played, then finished."""
+    tid = await create_americano(client, players=8, courts=2)
+    url = f"/americano/tournament/{tid}"
+    for round_num in range(2):
+        if round_num:
+            await client.post(f"{url}/next-round")
+        for court, m in enumerate((await state(client, tid))["rounds"][round_num]):
+            await client.post(f"{url}/score", data={"match_id": m["id"], "score1": 6, "score2": court + round_num})
+    await client.post(f"{url}/finish")
+    return tid
+
+
+async def archive_one(tid: str) -> bool:
+    async with AsyncSessionLocal() as session:
+        return await archive_tournament(session, tid, VIEW_BUILDERS)
+
+
+async def row_counts(tid: str) -> dict:
+    async with AsyncSessionLocal() as session:
+        return {
+            model.__tablename__: await session.scalar(
+                select(func.count()).select_from(model).where(model.tournament_id == tid)
+            )
+            for model in (PlayerORM, MatchORM, MatchParticipantORM, TournamentSnapshotORM)
+        }
+
+
+def standings_html(page: str) -> str:
+    start = page.index('id="standings-body"')
+    return page[start:page.index("</tbody>", start)]
+
+
+async def reads(client, tid: str) -> dict:
+    data = await state(client, tid)
+    pid = data["players"][0]["id"]
+    return {
+        "state": {k: v for k, v in data.items() if k != "archived"},
+        "standings": standings_html((await client.get(f"/americano/tournament/{tid}")).text),
+        "player_matches": (await client.get(f"/api/tournaments/{tid}/players/{pid}/matches")).json(),
+        "export": (await client.get("/api/export/matches.csv", params={"tournament": tid})).text,
+        # Live rows rank ties by player id, the snapshot keeps the page's order
+        "standings_export": sorted(
+            sorted((k, v) for k, v in json.loads(line).items() if k != "rank")
+            for line in (await client.get("/api/export/standings.ndjson", params={"tournament": tid})).text.splitlines()
+        ),
+    }
+
+
+async def test_archived_tournament_reads_the_same_from_its_snapshot(client):
+    tid = await finished(client)
+    before = await reads(client, tid)
+    assert before["player_matches"]
+
+    assert await archive_one(tid)
+
+    assert await row_counts(tid) == {"players": 0, "matches": 0, "match_participants": 0, "tournament_snapshots": 1}
+    assert (await state(client, tid))["archived"] is True
+    after = await reads(client, tid)
+    for key in before:
+        assert after[key] == before[key], key
+
+
+async def test_archived_tournament_has_no_score_edits(client):
+    tid = await finished(client)
+    match = (await state(client, tid))["rounds"][0][0]
+    url = f"/americano/tournament/{tid}"
+    assert f'id="history-edit-{match["id"]}"' in (await client.get(url)).text
+
+    assert await archive_one(tid)
+    assert f'id="history-edit-{match["id"]}"' not in (await client.get(url)).text
+    r = await client.post(f"{url}/edit-score", data={"match_id": match["id"], "score1": 0, "score2": 6})
+    assert r.status_code == 400
+    assert r.json()["detail"] == "Турнир в архиве"
+
+
+async def test_archival_that_loses_a_race_is_rolled_back(client, monkeypatch):
+    tid = await finished(client)
+    before = await row_counts(tid)
+
+    async def lost(session, tid, version):
+        return False
+
+    monkeypatch.setattr(archive, "bump_version", lost)
+    assert not await archive_one(tid)
+
+    assert await row_counts(tid) == before
+    async with AsyncSessionLocal() as session:
+        assert not await session.scalar(select(TournamentORM.archived).where(TournamentORM.id == tid))
+
+
+async def test_a_failing_tournament_does_not_stop_the_batch(client):
+    from datetime import timedelta
+
+    broken, fine = await finished(client), await finished(client)
+
+    def build(t_orm):
+        if t_orm.id == broken:
+            raise RuntimeError("cannot build")
+        return VIEW_BUILDERS["americano"](t_orm)
+
+    assert await archive_finished({"americano": build}, timedelta(0)) == [fine]
+    assert (await row_counts(broken))["matches"] > 0
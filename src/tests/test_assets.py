@@ -0,0 +1,35 @@
+import httpx
+import pytest
+
+from assets import PrecompressedStaticFiles
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def static(tmp_path):
+    dist = tmp_path / "dist"
+    dist.mkdir()
+    (dist / "app.js").write_text("plain")
+    (dist / "app.js.gz").write_bytes(b"gz")
+    (dist / "only-br.js").write_text("plain")
+    (dist / "only-br.js.br").write_bytes(b"br")
+    app = PrecompressedStaticFiles(directory=tmp_path)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as c:
+        yield c
+
+
+@pytest.mark.parametrize("path, accept, encoding", [
+    ("app.js", "gzip, deflate, br", "gzip"),       # no .br built, the next best
+    ("app.js", "gzip;q=0, br", None),              # refused, not just mentioned
+    ("app.js", "identity", None),
+    ("app.js", "*", "gzip"),
+    ("only-br.js", "gzip, br;q=0.5", "br"),
+    ("only-br.js", "BR", "br"),
+])
+async def test_precompressed_variant_follows_accept_encoding(static, path, accept, encoding):
+    # Headers only, the files are not real brotli
+    async with static.stream("GET", f"/dist/{path}", headers={"accept-encoding": accept}) as r:
+        assert r.status_code == 200
+        assert r.headers.get("content-encoding") == encoding
+        assert r.headers["vary"] == "Accept-Encoding"
@@ -0,0 +1,98 @@
+"""The change bus without Postgres: a fake connection records what would be sent."""
+import asyncio
+import json
+
+import pytest
+
+import bus
+from bus import CHANNEL, PAYLOAD_LIMIT, ChangeBus, encode
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeConnection:
+    def __init__(self):
+        self.sent = []
+
+    async def execute(self, statement, *args, timeout=None):
+        if args:
+            channel, payloads = args
+            assert channel == CHANNEL
+            self.sent += payloads
+
+
+class Recorder:
+    def __init__(self):
+        self.changes = []
+        self.resets = 0
+
+    def on_change(self, tid, event, history):
+        self.changes.append((tid, event, history))
+
+    def on_reset(self):
+        self.resets += 1
+
+
+def running(queue_size: int = 100):
+    """A bus with its queue, as start() leaves it, minus the connection task."""
+    recorder = Recorder()
+    change_bus = ChangeBus(recorder.on_change, recorder.on_reset)
+    change_bus._queue = asyncio.Queue(maxsize=queue_size)
+    return change_bus, recorder
+
+
+def test_oversized_event_is_sent_without_it():
+    small = json.loads(encode("t1", {"type": "score", "x": 1}, True))
+    assert small == {"t": "t1", "h": True, "e": {"type": "score", "x": 1}}
+
+    payload = encode("t1", {"type": "round", "matches": ["я" * 100] * 100}, False)
+    assert len(payload.encode()) <= PAYLOAD_LIMIT
+    assert json.loads(payload) == {"t": "t1", "h": False}
+
+
+def test_received_skips_own_notifications_and_resets_on_flush_all():
+    change_bus, recorder = running()
+    change_bus._pid = 42
+
+    change_bus._received(None, 42, CHANNEL, encode("mine", {"type": "score"}, False))
+    assert recorder.changes == []
+
+    change_bus._received(None, 7, CHANNEL, encode("theirs", {"type": "score"}, True))
+    change_bus._received(None, 7, CHANNEL, json.dumps({"t": "big", "h": False}))
+    assert recorder.changes == [("theirs", {"type": "score"}, True), ("big", None, False)]
+
+    change_bus._received(None, 7, CHANNEL, bus._FLUSH_ALL)
+    assert recorder.resets == 1
+    # A broken payload is logged, not raised into asyncpg
+    change_bus._received(None, 7, CHANNEL, "{not json")
+    assert len(recorder.changes) == 2
+
+
+async def test_overflow_is_sent_as_flush_all():
+    change_bus, _ = running(queue_size=2)
+    for tid in ("a", "b", "dropped"):
+        change_bus.publish(tid, {"type": "score"}, False)
+    conn, lost = FakeConnection(), asyncio.Event()
+
+    sender = asyncio.create_task(change_bus._send(conn, lost))
+    while not conn.sent:
+        await asyncio.sleep(0)
+    assert [json.loads(p).get("t") for p in conn.sent] == ["a", "b", None]
+    assert conn.sent[-1] == bus._FLUSH_ALL
+
+    change_bus._queue.put_nowait(bus._STOP)
+    assert await asyncio.wait_for(sender, 1) is True
+
+
+async def test_stop_drains_the_queue():
+    change_bus, _ = running()
+    conn = FakeConnection()
+    change_bus._task = asyncio.create_task(change_bus._send(conn, asyncio.Event()))
+    for tid in ("a", "b", "c"):
+        change_bus.publish(tid, {"type": "score"}, False)
+
+    await change_bus.stop()
+    assert [json.loads(p)["t"] for p in conn.sent] == ["a", "b", "c"]
+    assert change_bus._task is None
+    # Stopped: publishing is a no-op
+    change_bus.publish("d", {"type": "score"}, False)
@@ -0,0 +1,76 @@
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import update
+
+from conftest import create_americano
+from database import AsyncSessionLocal, TournamentORM
+
+pytestmark = pytest.mark.anyio
+
+
+async def listing(client, **params) -> list:
+    """Every page of /api/tournaments, following `next`."""
+    items, after = [], ""
+    while True:
+        r = await client.get("/api/tournaments", params={**params, "after": after})
+        assert r.status_code == 200, r.text
+        page = r.json()
+        items += page["items"]
+        if not page["next"]:
+            return items
+        after = page["next"]
+
+
+async def test_keyset_paging_through_equal_created_at(client):
+    tids = [await create_americano(client, name=f"Турнир {i}") for i in range(7)]
+    same = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    async with AsyncSessionLocal() as session:
+        await session.execute(update(TournamentORM).where(TournamentORM.id.in_(tids[1:6])).values(created_at=same))
+        await session.commit()
+
+    items = await listing(client, limit=2)
+    assert sorted(t["id"] for t in items) == sorted(tids)
+    keys = [(t["created_at"], t["id"]) for t in items]
+    assert keys == sorted(keys, reverse=True)
+
+
+async def test_mode_and_status_filters(client):
+    americano = await create_americano(client)
+    finished = await create_americano(client)
+    async with AsyncSessionLocal() as session:
+        await session.execute(update(TournamentORM).where(TournamentORM.id == finished).values(status="finished"))
+        await session.commit()
+    r = await client.post("/mexicano/create", data={
+        "name": "Мексикано", "courts": 2, "num_rounds": 3, "player_names": "\n".join(f"М {i}" for i in range(8)),
+    })
+    mexicano = r.headers["location"].rsplit("/", 1)[1]
+
+    assert [t["id"] for t in await listing(client, mode="mexicano")] == [mexicano]
+    assert {t["id"] for t in await listing(client, mode="americano")} == {americano, finished}
+    assert [t["id"] for t in await listing(client, status="finished")] == [finished]
+    assert [t["id"] for t in await listing(client, mode="mexicano", status="finished")] == []
+
+
+async def test_search_takes_percent_and_underscore_literally(client):
+    percent = await create_americano(client, name="Скидка 100% осень")
+    underscore = await create_americano(client, name="кубок_2025")
+    await create_americano(client, name="Кубок 2025")
+    await create_americano(client, name="Скидка 1000 осень")
+
+    assert [t["id"] for t in await listing(client, q="0%")] == [percent]
+    assert [t["id"] for t in await listing(client, q="_")] == [underscore]
+    assert [t["id"] for t in await listing(client, q="к_2")] == [underscore]
+
+
+@pytest.mark.parametrize("params", [
+    {"after": "не-курсор"},
+    {"after": "W10"},            # valid base64 of "[]"
+    {"limit": 0},
+    {"limit": 101},
+    {"mode": "padel"},
+    {"status": "paused"},
+])
+async def test_bad_parameters_are_a_400(client, params):
+    r = await client.get("/api/tournaments", params=params)
+    assert r.status_code == 400, r.text
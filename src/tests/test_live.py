@@ -0,0 +1,109 @@
+import asyncio
+import json
+
+import pytest
+
+from conftest import create_americano, state
+from live import broker
+
+pytestmark = pytest.mark.anyio
+
+FETCH = {"Accept": "application/json"}
+
+
+async def next_event(events) -> dict:
+    line = await events.__anext__()
+    assert line.startswith("data: "), line
+    return json.loads(line[len("data: "):])
+
+
+async def test_fetch_posts_get_204_and_the_change_as_an_event(client):
+    tid = await create_americano(client, players=8, courts=2)
+    url = f"/americano/tournament/{tid}"
+    first, second = (await state(client, tid))["rounds"][0]
+    events = broker.stream(tid)
+    assert await events.__anext__() == "retry: 3000\n\n"
+    try:
+        r = await client.post(f"{url}/score", data={"match_id": first["id"], "score1": 6, "score2": 4}, headers=FETCH)
+        assert r.status_code == 204
+        ev = await next_event(events)
+        assert (ev["type"], ev["match_id"], ev["score1"], ev["score2"]) == ("score", first["id"], 6, 4)
+        assert {p["id"] for p in ev["players"]} == set(first["team1"] + first["team2"])
+
+        await client.post(f"{url}/score", data={"match_id": second["id"], "score1": 1, "score2": 6}, headers=FETCH)
+        await next_event(events)
+        r = await client.post(f"{url}/next-round", headers=FETCH)
+        assert r.status_code == 204
+        ev = await next_event(events)
+        assert ev["type"] == "round" and ev["round"] == 1
+        assert [m["id"] for m in ev["matches"]] == [m["id"] for m in (await state(client, tid))["rounds"][1]]
+    finally:
+        await events.aclose()
+
+
+async def test_plain_form_posts_are_redirected(client):
+    tid = await create_americano(client)
+    match = (await state(client, tid))["rounds"][0][0]
+    r = await client.post(f"/americano/tournament/{tid}/score", data={"match_id": match["id"], "score1": 6, "score2": 4})
+    assert r.status_code == 303
+    assert r.headers["location"] == f"/americano/tournament/{tid}"
+
+
+async def test_page_carries_the_blank_cards_for_live_js(client):
+    tid = await create_americano(client)
+    html = (await client.get(f"/americano/tournament/{tid}")).text
+    for template in ("court-card-open", "court-card-done", "history-round"):
+        assert f'<template id="{template}">' in html
+    assert 'data-match-id="__id__"' in html
+    assert 'id="round-controls" hidden' in html
+
+
+async def test_score_between_read_and_write_is_no_conflict(client):
+    """Round changes only conflict with round changes, not with score writes."""
+    from database import AsyncSessionLocal
+    from service import get_tournament_row, update_active_round
+
+    tid = await create_americano(client, players=8, courts=2)
+    first = (await state(client, tid))["rounds"][0][0]
+    async with AsyncSessionLocal() as session:
+        row = await get_tournament_row(session, tid)
+        seen_round, seen_version = row.current_round, row.version
+        await session.rollback()
+
+        await client.post(f"/americano/tournament/{tid}/score", data={"match_id": first["id"], "score1": 6, "score2": 4})
+        assert await update_active_round(session, tid, seen_round, current_round=seen_round + 1)
+        await session.commit()
+        # A second round change from the same stale read is one
+        assert not await update_active_round(session, tid, seen_round, current_round=seen_round + 1)
+        await session.rollback()
+        row = await get_tournament_row(session, tid)
+        assert (row.current_round, row.version) == (seen_round + 1, seen_version + 2)
+
+
+async def test_double_next_round_advances_once(client):
+    tid = await create_americano(client, players=8, courts=2)
+    url = f"/americano/tournament/{tid}"
+    for m in (await state(client, tid))["rounds"][0]:
+        await client.post(f"{url}/score", data={"match_id": m["id"], "score1": 6, "score2": 4})
+    responses = await asyncio.gather(*(client.post(f"{url}/next-round") for _ in range(2)))
+    assert [r.status_code for r in responses] == [303, 303]
+    assert all(r.headers["location"] == url for r in responses)
+    assert (await state(client, tid))["current_round"] == 1
+
+
+async def test_conflicting_post_gets_a_notice(client):
+    from starlette.requests import Request
+    from live import after_post
+
+    def request(accept):
+        return Request({"type": "http", "headers": [(b"accept", accept.encode())]})
+
+    page = await client.get(f"/americano/tournament/{await create_americano(client)}?notice=Раунд+сменился")
+    assert "Раунд сменился" in page.text
+
+    redirect = after_post(request("text/html"), "/americano/tournament/t1", error="Раунд сменился")
+    assert redirect.status_code == 303
+    assert redirect.headers["location"].startswith("/americano/tournament/t1?notice=")
+    answer = after_post(request("application/json"), "/americano/tournament/t1", error="Раунд сменился")
+    assert answer.status_code == 409
+    assert json.loads(answer.body) == {"detail": "Раунд сменился"}
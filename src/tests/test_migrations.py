@@ -0,0 +1,43 @@
+import pytest
+from sqlalchemy import inspect, select, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from database import TournamentORM
+from migrations import MIGRATIONS, migrate
+
+pytestmark = pytest.mark.anyio
+
+# The schema create_all made before the migration runner
+OLD_SCHEMA = (
+    "CREATE TABLE tournaments (id VARCHAR PRIMARY KEY, mode VARCHAR NOT NULL, name VARCHAR NOT NULL,"
+    " courts INTEGER NOT NULL, status VARCHAR NOT NULL, current_round INTEGER NOT NULL,"
+    " total_rounds INTEGER NOT NULL, created_at DATETIME DEFAULT CURRENT_TIMESTAMP)",
+    "CREATE TABLE players (id VARCHAR PRIMARY KEY, tournament_id VARCHAR NOT NULL REFERENCES tournaments (id),"
+    " name VARCHAR NOT NULL, sex VARCHAR NOT NULL, points INTEGER NOT NULL, games_played INTEGER NOT NULL,"
+    " games_won INTEGER NOT NULL, games_lost INTEGER NOT NULL)",
+    "CREATE TABLE matches (id VARCHAR PRIMARY KEY, tournament_id VARCHAR NOT NULL REFERENCES tournaments (id),"
+    " round INTEGER NOT NULL, court INTEGER NOT NULL, team1 JSON NOT NULL, team2 JSON NOT NULL,"
+    " score1 INTEGER, score2 INTEGER, completed BOOLEAN NOT NULL)",
+    "INSERT INTO tournaments (id, mode, name, courts, status, current_round, total_rounds)"
+    " VALUES ('old', 'mexicano', 'Старый', 1, 'active', 0, 3)",
+)
+
+
+async def test_database_from_before_the_runner_is_caught_up(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'old.db'}")
+    try:
+        async with engine.begin() as conn:
+            for statement in OLD_SCHEMA:
+                await conn.execute(text(statement))
+            assert await migrate(conn) == [version for version, _, _ in MIGRATIONS]
+            columns = await conn.run_sync(lambda c: {col["name"] for col in inspect(c).get_columns("tournaments")})
+        assert {"pairing", "version", "archived"} <= columns
+
+        async with async_sessionmaker(engine)() as session:
+            t = (await session.execute(select(TournamentORM))).unique().scalar_one()
+        assert (t.id, t.pairing, t.version, t.archived) == ("old", "rank", 0, False)
+
+        async with engine.begin() as conn:
+            assert await migrate(conn) == []
+    finally:
+        await engine.dispose()
@@ -0,0 +1,84 @@
+"""Every route with a `@query_budget` is run through a tournament's life and held to it."""
+import pytest
+
+from conftest import query_budgets, state
+from main import app
+from querycount import assert_query_budget
+
+pytestmark = pytest.mark.anyio
+
+BUDGETS = query_budgets(app)
+PLAYERS = "\n".join(f"Игрок {i}" for i in range(8))
+
+
+class Budgeted:
+    """Requests a route under its budget and remembers which routes ran."""
+
+    def __init__(self, client):
+        self.client = client
+        self.covered = set()
+
+    async def __call__(self, method: str, route: str, url: str, **kwargs):
+        self.covered.add((method, route))
+        with assert_query_budget(BUDGETS[method, route]):
+            response = await self.client.request(method, url, **kwargs)
+        assert response.status_code < 400, (route, response.status_code, response.text)
+        return response
+
+
+async def play(client, request: Budgeted, route: str, swap_route: str, url: str, swap_url: str, tid: str):
+    """Page, swap, scores, an edit, next round, then the second round and finish."""
+    for method in ("GET", "HEAD"):
+        await request(method, route, url)
+    first = (await state(client, tid))["rounds"][0][0]
+    await request("POST", swap_route, swap_url, data={
+        "match_id": first["id"], "position": "team1-0", "new_pid": first["team2"][0],
+    })
+    for m in (await state(client, tid))["rounds"][0]:
+        await request("POST", f"{route}/score", f"{url}/score", data={"match_id": m["id"], "score1": 6, "score2": 3})
+    await request("POST", f"{route}/edit-score", f"{url}/edit-score", data={"match_id": first["id"], "score1": 2, "score2": 6})
+    await request("POST", f"{route}/next-round", f"{url}/next-round")
+    for m in (await state(client, tid))["rounds"][1]:
+        await client.post(f"{url}/score", data={"match_id": m["id"], "score1": 6, "score2": 3})
+    await request("POST", f"{route}/finish", f"{url}/finish")
+
+
+async def test_every_budgeted_route_stays_within_it(client):
+    request = Budgeted(client)
+
+    r = await request("POST", "/americano/tournament/create", "/americano/tournament/create", data={
+        "name": "Бюджет", "courts": 2, "player_names": PLAYERS,
+    })
+    americano = r.headers["location"].rsplit("/", 1)[1]
+    a_url = f"/americano/tournament/{americano}"
+    await play(
+        client, request, "/americano/tournament/{tid}", "/americano/tournament/{tid}/swap-player",
+        a_url, f"{a_url}/swap-player", americano,
+    )
+
+    r = await request("POST", "/mexicano/create", "/mexicano/create", data={
+        "name": "Бюджет", "courts": 2, "num_rounds": 3, "player_names": PLAYERS,
+    })
+    mexicano = r.headers["location"].rsplit("/", 1)[1]
+    m_url = f"/mexicano/{mexicano}"
+    await play(
+        client, request, "/mexicano/{tid}", "/mexicano/tournament/{tid}/swap-player",
+        m_url, f"/mexicano/tournament/{mexicano}/swap-player", mexicano,
+    )
+
+    await request("GET", "/api/tournaments", "/api/tournaments")
+    await request("GET", "/api/tournaments/{tid}", f"/api/tournaments/{americano}")
+    pid = (await state(client, americano))["players"][0]["id"]
+    await request("GET", "/api/tournaments/{tid}/players/{pid}/matches", f"/api/tournaments/{americano}/players/{pid}/matches")
+    profile = (await request("GET", "/api/players", "/api/players")).json()[0]
+    await request("GET", "/api/players/{profile_id}", f"/api/players/{profile['id']}")
+    await request("GET", "/tournaments", "/tournaments")
+    for kind, fmt in (("matches", "csv"), ("players", "ndjson"), ("standings", "csv")):
+        await request("GET", "/api/export/{kind}.{fmt}", f"/api/export/{kind}.{fmt}")
+    await request("GET", "/readyz", "/readyz")
+
+    await request("POST", "/americano/tournament/{tid}/delete", f"{a_url}/delete")
+    await request("POST", "/mexicano/{tid}/delete", f"{m_url}/delete")
+
+    # A route that declares a budget and is missing above fails here
+    assert request.covered == set(BUDGETS), set(BUDGETS) - request.covered
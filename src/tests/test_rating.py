@@ -0,0 +1,121 @@
+import numpy as np
+import pytest
+from sqlalchemy import select, update
+
+from conftest import create_americano, state
+from database import AsyncSessionLocal, MatchORM, PlayerORM, PlayerProfileORM
+from rating import RATING_INITIAL, recompute, replay, team_delta
+
+pytestmark = pytest.mark.anyio
+
+
+def sequential(players: np.ndarray, scores: np.ndarray, n: int):
+    ratings = np.full(n, RATING_INITIAL)
+    deltas = []
+    for p, (s1, s2) in zip(players.tolist(), scores.tolist()):
+        d = team_delta([ratings[i] for i in p], s1, s2)
+        ratings[p[:2]] += d
+        ratings[p[2:]] -= d
+        deltas.append(d)
+    return ratings, np.array(deltas)
+
+
+@pytest.mark.parametrize("n", [4, 6, 40])
+def test_replay_equals_rating_one_match_at_a_time(n):
+    """Few players share most matches, many players make wide waves."""
+    rng = np.random.default_rng(n)
+    players = np.array([rng.choice(n, 4, replace=False) for _ in range(500)])
+    scores = rng.integers(0, 7, size=(500, 2)).astype(float)
+    scores[:5] = 0   # 0:0 counts as a draw
+
+    ratings, played, deltas = replay(players, scores, n)
+    expected_ratings, expected_deltas = sequential(players, scores, n)
+    np.testing.assert_allclose(ratings, expected_ratings)
+    np.testing.assert_allclose(deltas, expected_deltas)
+    assert played.tolist() == np.bincount(players.ravel(), minlength=n).tolist()
+    assert ratings.sum() == pytest.approx(n * RATING_INITIAL)
+
+
+def test_replay_of_nothing():
+    ratings, played, deltas = replay(np.empty((0, 4), dtype=np.int64), np.empty((0, 2)), 3)
+    assert ratings.tolist() == [RATING_INITIAL] * 3 and played.tolist() == [0] * 3 and len(deltas) == 0
+
+
+async def profiles(tid: str, team: list) -> list:
+    """(rating, matches_played) of the profiles of `team` player ids, in that order."""
+    async with AsyncSessionLocal() as session:
+        rows = dict((await session.execute(
+            select(PlayerORM.id, PlayerProfileORM.rating)
+            .join(PlayerProfileORM, PlayerProfileORM.id == PlayerORM.profile_id)
+            .where(PlayerORM.tournament_id == tid)
+        )).all())
+        played = dict((await session.execute(
+            select(PlayerORM.id, PlayerProfileORM.matches_played)
+            .join(PlayerProfileORM, PlayerProfileORM.id == PlayerORM.profile_id)
+            .where(PlayerORM.tournament_id == tid)
+        )).all())
+    return [(rows[pid], played[pid]) for pid in team]
+
+
+async def test_edit_rebases_the_delta(client):
+    tid = await create_americano(client, player_names="\n".join(f"Правка {i}" for i in range(8)))
+    url = f"/americano/tournament/{tid}"
+    m = (await state(client, tid))["rounds"][0][0]
+    team = m["team1"] + m["team2"]
+
+    await client.post(f"{url}/score", data={"match_id": m["id"], "score1": 6, "score2": 2})
+    await client.post(f"{url}/edit-score", data={"match_id": m["id"], "score1": 1, "score2": 6})
+
+    d = team_delta([RATING_INITIAL] * 4, 1, 6)
+    assert await profiles(tid, team) == [pytest.approx((RATING_INITIAL + d, 1))] * 2 + [pytest.approx((RATING_INITIAL - d, 1))] * 2
+
+
+async def test_edit_of_an_unrated_match_rates_it(client):
+    """An imported match or one scored before ratings has no rating_delta."""
+    tid = await create_americano(client, player_names="\n".join(f"Импорт {i}" for i in range(8)))
+    url = f"/americano/tournament/{tid}"
+    m = (await state(client, tid))["rounds"][0][0]
+    team = m["team1"] + m["team2"]
+    await client.post(f"{url}/score", data={"match_id": m["id"], "score1": 6, "score2": 2})
+    async with AsyncSessionLocal() as session:
+        await session.execute(update(MatchORM).where(MatchORM.id == m["id"]).values(rating_delta=None))
+        await session.execute(update(PlayerProfileORM).values(rating=RATING_INITIAL, matches_played=0))
+        await session.commit()
+
+    await client.post(f"{url}/edit-score", data={"match_id": m["id"], "score1": 6, "score2": 4})
+
+    d = team_delta([RATING_INITIAL] * 4, 6, 4)
+    assert await profiles(tid, team) == [pytest.approx((RATING_INITIAL + d, 1))] * 2 + [pytest.approx((RATING_INITIAL - d, 1))] * 2
+
+
+async def test_recompute_equals_the_incremental_ratings(client):
+    """Two tournaments of the same people, every round scored in order, the last one edited."""
+    names = "\n".join(f"Лига {i}" for i in range(8))
+    for n in range(2):
+        tid = await create_americano(client, player_names=names)
+        url = f"/americano/tournament/{tid}"
+        for round_num in range(3):
+            if round_num:
+                await client.post(f"{url}/next-round")
+            for court, m in enumerate((await state(client, tid))["rounds"][round_num]):
+                await client.post(f"{url}/score", data={"match_id": m["id"], "score1": 6, "score2": (court + round_num + n) % 6})
+        await client.post(f"{url}/edit-score", data={"match_id": m["id"], "score1": 0, "score2": 6})
+
+    async def snapshot():
+        async with AsyncSessionLocal() as session:
+            return {
+                "profiles": sorted((await session.execute(
+                    select(PlayerProfileORM.name, PlayerProfileORM.rating, PlayerProfileORM.matches_played)
+                )).all()),
+                "deltas": sorted((await session.execute(select(MatchORM.id, MatchORM.rating_delta))).all()),
+            }
+
+    incremental = await snapshot()
+    assert {played for _, _, played in incremental["profiles"]} == {6}
+    stats = await recompute()
+    assert stats["matches"] == 12
+    recomputed = await snapshot()
+    for before, after in zip(incremental["profiles"], recomputed["profiles"]):
+        assert after == (before[0], pytest.approx(before[1]), before[2])
+    for before, after in zip(incremental["deltas"], recomputed["deltas"]):
+        assert after[0] == before[0] and after[1] == pytest.approx(before[1])
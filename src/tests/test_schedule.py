@@ -0,0 +1,82 @@
+from collections import Counter
+from itertools import combinations, product
+
+import pytest
+
+from americano.functions import generate_americano_rounds
+from americano.schedule import CLASSIC, MIXED, _key, _search_design, get_design, rounds_needed
+
+SIZES = range(4, 25)
+
+
+def partner_counts(design) -> Counter:
+    return Counter(frozenset(team) for round_courts in design for a, b, c, d in round_courts for team in ((a, b), (c, d)))
+
+
+def games_played(design, n: int) -> list:
+    played = Counter(x for round_courts in design for court in round_courts for x in court)
+    return [played[x] for x in range(n)]
+
+
+def assert_rounds_valid(design, n: int, courts: int) -> None:
+    for round_courts in design:
+        assert len(round_courts) <= courts
+        seated = [x for court in round_courts for x in court]
+        assert len(seated) == len(set(seated))
+        assert all(0 <= x < n for x in seated)
+
+
+@pytest.mark.parametrize("n", [n for n in SIZES if n % 4 == 0])
+@pytest.mark.parametrize("search", [False, True])
+def test_classic_everyone_partners_everyone_once(n, search):
+    courts, num_rounds = n // 4, rounds_needed(n)
+    design = _search_design(_key(n, 0, courts, num_rounds, CLASSIC)) if search else get_design(n, 0, courts, num_rounds)
+    assert len(design) == num_rounds
+    assert_rounds_valid(design, n, courts)
+    assert partner_counts(design) == Counter({frozenset(p): 1 for p in combinations(range(n), 2)})
+
+
+@pytest.mark.parametrize("half", range(2, 13, 2))
+def test_mixed_every_man_partners_every_woman_once(half):
+    n, courts = 2 * half, half // 2
+    design = get_design(half, half, courts, rounds_needed(half, half, MIXED), MIXED)
+    assert_rounds_valid(design, n, courts)
+    assert partner_counts(design) == Counter({frozenset((m, w)): 1 for m, w in product(range(half), range(half, n))})
+
+
+@pytest.mark.parametrize("n", SIZES)
+def test_sitting_out_is_fair(n):
+    """Whoever can't get a court: nobody partners twice, games played differ by at most one."""
+    for courts in range(1, n // 4 + 1):
+        num_rounds = rounds_needed(n)
+        for design in (get_design(n, 0, courts, num_rounds), _search_design(_key(n, 0, courts, num_rounds, CLASSIC))):
+            assert_rounds_valid(design, n, courts)
+            assert max(partner_counts(design).values()) == 1
+            played = games_played(design, n)
+            assert max(played) - min(played) <= 1, (n, courts, played)
+
+
+def test_mixed_teams_are_a_man_and_a_woman():
+    men, women = [f"m{i}" for i in range(5)], [f"w{i}" for i in range(3)]
+    rounds = generate_americano_rounds(men + women, 2, rounds_needed(5, 3, MIXED), ["M"] * 5 + ["F"] * 3, MIXED)
+    for matches in rounds:
+        for m in matches:
+            for team in (m.team1, m.team2):
+                assert sorted(p[0] for p in team) == ["m", "w"]
+
+
+@pytest.mark.anyio
+async def test_create_builds_the_schedule_off_the_event_loop(client, monkeypatch):
+    import threading
+    from americano import router
+    from conftest import create_americano
+
+    threads = []
+
+    def recording(*args):
+        threads.append(threading.get_ident())
+        return generate_americano_rounds(*args)
+
+    monkeypatch.setattr(router, "generate_americano_rounds", recording)
+    await create_americano(client, players=9, courts=2)
+    assert threads and threads[0] != threading.get_ident()
@@ -0,0 +1,78 @@
+import asyncio
+import random
+
+import pytest
+
+from conftest import create_americano, state
+from service import STAT_COLUMNS, _stats_delta
+
+pytestmark = pytest.mark.anyio
+
+
+def expected_stats(data: dict) -> dict:
+    """Player stats recomputed from the completed matches of a state."""
+    stats = {p["id"]: dict.fromkeys(STAT_COLUMNS, 0) for p in data["players"]}
+    for matches in data["rounds"]:
+        for m in matches:
+            if not m["completed"]:
+                continue
+            for team, (own, other) in ((m["team1"], (m["score1"], m["score2"])), (m["team2"], (m["score2"], m["score1"]))):
+                for pid in team:
+                    for col, inc in _stats_delta(own, other).items():
+                        stats[pid][col] += inc
+    return stats
+
+
+def actual_stats(data: dict) -> dict:
+    return {p["id"]: {col: p[col] for col in STAT_COLUMNS} for p in data["players"]}
+
+
+async def test_concurrent_submits_all_count(client):
+    tid = await create_americano(client, players=16, courts=4)
+    rng = random.Random(1)
+    url = f"/americano/tournament/{tid}"
+
+    data = await state(client, tid)
+    responses = await asyncio.gather(*(
+        client.post(f"{url}/score", data={"match_id": m["id"], "score1": rng.randint(0, 6), "score2": rng.randint(0, 6)})
+        for m in data["rounds"][0]
+    ))
+    assert [r.status_code for r in responses] == [303] * 4
+    data = await state(client, tid)
+    assert all(m["completed"] for m in data["rounds"][0])
+    assert actual_stats(data) == expected_stats(data)
+
+
+async def test_edit_races_with_next_round_submits(client):
+    """An edit of round 1 and the submits of round 2 touch the same players at once."""
+    tid = await create_americano(client, players=8, courts=2)
+    url = f"/americano/tournament/{tid}"
+    data = await state(client, tid)
+    for m in data["rounds"][0]:
+        await client.post(f"{url}/score", data={"match_id": m["id"], "score1": 6, "score2": 2})
+    assert (await client.post(f"{url}/next-round")).status_code == 303
+
+    data = await state(client, tid)
+    edited = data["rounds"][0][0]
+    await asyncio.gather(
+        client.post(f"{url}/edit-score", data={"match_id": edited["id"], "score1": 1, "score2": 6}),
+        *(
+            client.post(f"{url}/score", data={"match_id": m["id"], "score1": 4, "score2": 6})
+            for m in data["rounds"][1]
+        ),
+    )
+    data = await state(client, tid)
+    assert (data["rounds"][0][0]["score1"], data["rounds"][0][0]["score2"]) == (1, 6)
+    assert all(m["completed"] for m in data["rounds"][1])
+    assert actual_stats(data) == expected_stats(data)
+
+
+async def test_score_for_another_round_is_ignored(client):
+    tid = await create_americano(client, players=8, courts=2)
+    data = await state(client, tid)
+    future = data["rounds"][1][0]
+    r = await client.post(f"/americano/tournament/{tid}/score", data={"match_id": future["id"], "score1": 6, "score2": 0})
+    assert r.status_code == 303
+    data = await state(client, tid)
+    assert not data["rounds"][1][0]["completed"]
+    assert all(p["games_played"] == 0 for p in data["players"])
@@ -0,0 +1,94 @@
+import csv
+import io
+import json
+
+import pytest
+
+from conftest import create_americano, state
+
+pytestmark = pytest.mark.anyio
+
+CSV = {"content-type": "text/csv"}
+
+
+async def played(client, **form) -> str:
+    """A tournament with its first round scored and the second half-scored."""
+    tid = await create_americano(client, **form)
+    url = f"/americano/tournament/{tid}"
+    for m in (await state(client, tid))["rounds"][0]:
+        await client.post(f"{url}/score", data={"match_id": m["id"], "score1": 6, "score2": 2})
+    await client.post(f"{url}/next-round")
+    second = (await state(client, tid))["rounds"][1][0]
+    await client.post(f"{url}/score", data={"match_id": second["id"], "score1": 3, "score2": 6})
+    return tid
+
+
+async def export(client, kind: str, fmt: str, tid: str) -> str:
+    r = await client.get(f"/api/export/{kind}.{fmt}", params={"tournament": tid})
+    assert r.status_code == 200
+    return r.text
+
+
+def without_ids(rows, fmt: str, skip=("tournament_id", "player_id", "profile_id")) -> list:
+    if fmt == "csv":
+        rows = list(csv.DictReader(io.StringIO(rows)))
+    else:
+        rows = [json.loads(line) for line in rows.splitlines()]
+    return [
+        {k: str(v) for k, v in row.items() if k not in skip}
+        for row in rows
+    ]
+
+
+@pytest.mark.parametrize("fmt", ["csv", "ndjson"])
+async def test_matches_export_imports_back_the_same(client, fmt):
+    names = "\n".join(['Игрок "Быстрый", 1', "Игрок 2", "Игрок 3", "Игрок 4", "Игрок 5", "Игрок 6", "Игрок 7", "Игрок 8"])
+    tid = await played(client, player_names=names)
+    body = await export(client, "matches", fmt, tid)
+
+    r = await client.post("/api/import", content=body.encode(), headers=CSV if fmt == "csv" else {})
+    assert r.status_code == 200, r.text
+    assert r.json()["imported"] == 1
+    copy = r.json()["tournaments"][0]
+
+    assert without_ids(await export(client, "matches", fmt, copy), fmt) == without_ids(body, fmt)
+    # Ties are ranked by player id, which the copy does not keep
+    def standings(text):
+        return sorted(without_ids(text, fmt, skip=("tournament_id", "rank")), key=lambda row: row["name"])
+    assert standings(await export(client, "standings", fmt, copy)) == standings(await export(client, "standings", fmt, tid))
+
+
+async def test_csv_quoted_newlines_across_chunks(client):
+    body = (
+        "tournament,mode,created_at,round,court,team1_player1,team1_player2,team2_player1,team2_player2,score1,score2\r\n"
+        '"Кубок\r\nвесны",americano,2025-04-01T10:00:00,1,1,"Анна ""А""",Борис,Вера,"Глеб,\nмладший",6,4\r\n'
+    ).encode()
+
+    async def chunks():
+        for i in range(0, len(body), 7):
+            yield body[i:i + 7]
+
+    r = await client.post("/api/import", content=chunks(), headers=CSV)
+    assert r.status_code == 200, r.text
+    data = await state(client, r.json()["tournaments"][0])
+    assert data["name"] == "Кубок\nвесны"
+    assert {p["name"] for p in data["players"]} == {'Анна "А"', "Борис", "Вера", "Глеб, младший"}
+
+
+@pytest.mark.parametrize("line", [
+    {"name": "T", "matches": "не список"},
+    {"name": "T", "matches": [["A", "B", "C", "D"]]},
+    {"name": "T", "players": [1], "matches": []},
+    {"name": "T", "matches": [{"round": 1, "team1": "AB", "team2": ["C", "D"]}]},
+    {"name": "T", "courts": [2], "matches": [{"round": 1, "team1": ["A", "B"], "team2": ["C", "D"]}]},
+    {"name": "T", "matches": [{"round": 1, "team1": ["A", "B"], "team2": ["C", "D"], "score1": 10**12, "score2": 0}]},
+    [1, 2],
+])
+async def test_malformed_tournament_is_a_400_naming_its_line(client, line):
+    good = {"name": "Хороший", "matches": [{"round": 1, "team1": ["A", "B"], "team2": ["C", "D"], "score1": 6, "score2": 1}]}
+    body = "\n".join(json.dumps(x, ensure_ascii=False) for x in (good, line))
+    r = await client.post("/api/import", content=body.encode())
+    assert r.status_code == 400, r.text
+    result = r.json()
+    assert result["imported"] == 1
+    assert [e["line"] for e in result["errors"]] == [2]
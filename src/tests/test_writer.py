@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+from sqlalchemy import select, update
+
+from conftest import create_americano, state
+from database import AsyncSessionLocal, MatchORM, TournamentORM
+from service import record_match_score
+from writer import TournamentWriter
+
+pytestmark = pytest.mark.anyio
+
+
+async def _rename_and_fail(session, tid):
+    await session.execute(update(TournamentORM).where(TournamentORM.id == tid).values(name="broken"))
+    raise ValueError("bad submit")
+
+
+async def test_failing_submit_only_fails_itself(client):
+    tid = await create_americano(client, players=8, courts=2)
+    first, second = (await state(client, tid))["rounds"][0]
+    writer = TournamentWriter()
+
+    results = await asyncio.gather(
+        writer.submit(tid, record_match_score, first["id"], 6, 2),
+        writer.submit(tid, _rename_and_fail),
+        writer.submit(tid, record_match_score, second["id"], 3, 6),
+        return_exceptions=True,
+    )
+    assert results[0] is not None and results[2] is not None
+    assert isinstance(results[1], ValueError)
+
+    async with AsyncSessionLocal() as session:
+        completed = (await session.execute(
+            select(MatchORM.completed).where(MatchORM.id.in_([first["id"], second["id"]]))
+        )).scalars().all()
+        assert completed == [True, True]
+        row = (await session.execute(
+            select(TournamentORM.name, TournamentORM.version).where(TournamentORM.id == tid)
+        )).one()
+    # The failed submit's write was rolled back to its savepoint, the batch committed once
+    assert row.name != "broken"
+    assert row.version == 1
+
+
+async def test_all_failing_batch_leaves_version(client):
+    tid = await create_americano(client, players=8, courts=2)
+    writer = TournamentWriter()
+    with pytest.raises(ValueError):
+        await writer.submit(tid, _rename_and_fail)
+    async with AsyncSessionLocal() as session:
+        assert await session.scalar(select(TournamentORM.version).where(TournamentORM.id == tid)) == 0
+
+
+@pytest.mark.parametrize("route", ["score", "edit-score"])
+async def test_out_of_range_score_is_rejected(client, route):
+    tid = await create_americano(client, players=8, courts=2)
+    match = (await state(client, tid))["rounds"][0][0]
+    url = f"/americano/tournament/{tid}/{route}"
+    for score1, score2 in ((-1, 3), (3, 100), (10**12, 0)):
+        response = await client.post(url, data={"match_id": match["id"], "score1": score1, "score2": score2})
+        assert response.status_code == 400
+    assert not (await state(client, tid))["rounds"][0][0]["completed"]
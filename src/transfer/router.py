@@ -0,0 +1,350 @@
+"""Bulk export and import of tournament results.
+
+Exports stream CSV or NDJSON straight from server-side cursors, so a
+year of tournaments costs no more memory than one. Imports read NDJSON
+(one tournament per line) or the matches export in either format, and
+insert every IMPORT_BATCH tournaments in one transaction through
+service.insert_tournaments. Imported matches are not rated on the way
+in, run `python rating.py recompute` afterwards.
+"""
+import csv
+import io
+import json
+import os
+from collections import deque
+from datetime import date, datetime, time, timedelta, timezone
+from typing import AsyncIterator, List, Optional, Tuple
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from americano.models import Match, generate_id
+from database import AsyncSessionLocal
+from directory.router import MODES
+from querycount import query_budget
+from service import (
+    MATCH_FIELDS, MAX_SCORE, PLAYER_FIELDS, STAT_COLUMNS, _stats_delta, export_rows, insert_tournaments,
+)
+
+router = APIRouter(prefix='/api', tags=['Экспорт'])
+
+IMPORT_BATCH = int(os.getenv("IMPORT_BATCH", "50"))
+CHUNK_SIZE = 64 * 1024
+
+STANDING_FIELDS = (
+    "tournament_id", "tournament", "mode", "created_at", "rank", "name",
+    *STAT_COLUMNS,
+)
+EXPORTS = {
+    "matches": ("matches", MATCH_FIELDS),
+    "players": ("players", PLAYER_FIELDS),
+    "standings": ("players", STANDING_FIELDS),
+}
+FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def _parse_day(value: str, name: str) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return datetime.combine(date.fromisoformat(value), time(), timezone.utc)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{name}: дата в формате ГГГГ-ММ-ДД")
+
+
+def _cell(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+async def _export_chunks(kind: str, fmt: str, **filters) -> AsyncIterator[str]:
+    source, fields = EXPORTS[kind]
+    pick = [(MATCH_FIELDS if source == "matches" else PLAYER_FIELDS).index(f) for f in fields]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if fmt == "csv":
+        writer.writerow(fields)
+    # The request's session is closed before a streamed body is sent, this one lives as long as the stream
+    async with AsyncSessionLocal() as session:
+        async for row in export_rows(session, source, **filters):
+            values = [_cell(row[i]) for i in pick]
+            if fmt == "csv":
+                writer.writerow(values)
+            else:
+                buffer.write(json.dumps(dict(zip(fields, values)), ensure_ascii=False, separators=(",", ":")))
+                buffer.write("\n")
+            if buffer.tell() >= CHUNK_SIZE:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+    yield buffer.getvalue()
+
+
+@router.get("/export/{kind}.{fmt}")
+@query_budget(2)
+async def export(kind: str, fmt: str, tournament: str = "", since: str = "", until: str = ""):
+    """`since` and `until` are days of tournament creation, both inclusive."""
+    if kind not in EXPORTS:
+        raise HTTPException(status_code=404, detail="Неизвестный вид выгрузки")
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=404, detail="Неизвестный формат выгрузки")
+    start, end = _parse_day(since, "since"), _parse_day(until, "until")
+    filename = f"{kind}-{tournament or 'all'}.{fmt}"
+    return StreamingResponse(
+        _export_chunks(
+            kind, fmt, tid=tournament or None,
+            since=start, until=end + timedelta(days=1) if end else None,
+        ),
+        media_type=FORMATS[fmt],
+        headers={"content-disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+ImportedTournament = Tuple[dict, List[dict], List[Match]]
+
+
+def _score(value) -> Optional[int]:
+    if value is None or value == "":
+        return None
+    score = int(value)
+    if not 0 <= score <= MAX_SCORE:
+        raise ValueError(f"Счёт должен быть от 0 до {MAX_SCORE}")
+    return score
+
+
+def _list(value, what: str) -> list:
+    if value is None:
+        return []
+    if not isinstance(value, list):
+        raise ValueError(f"{what}: ожидается список")
+    return value
+
+
+def build_import(data: dict) -> ImportedTournament:
+    """Rows for insert_tournaments from one imported tournament; ValueError if it makes no sense.
+
+    `data`: name, mode, courts, created_at (ISO), players (names, or
+    {"name", "sex"}) and matches of round, court, team1 and team2 (two
+    names each), score1 and score2. Players that only appear in matches
+    are added; stats are computed from the completed matches.
+    """
+    name = str(data.get("name") or "").strip()
+    if not name:
+        raise ValueError("Нет названия турнира")
+    mode = data.get("mode") or "americano"
+    if not isinstance(mode, str) or mode not in MODES:
+        raise ValueError("Неизвестный формат турнира")
+    created_at = data.get("created_at")
+    try:
+        created_at = datetime.fromisoformat(created_at) if created_at else datetime.now(timezone.utc)
+    except (TypeError, ValueError):
+        raise ValueError("Неверная дата турнира")
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+
+    players = {}
+
+    def player(player_name: str, sex: str = "M") -> dict:
+        if player_name not in players:
+            players[player_name] = {
+                "id": generate_id(), "name": player_name, "sex": sex,
+                **dict.fromkeys(STAT_COLUMNS, 0),
+            }
+        return players[player_name]
+
+    for p in _list(data.get("players"), "players"):
+        p = {"name": p} if isinstance(p, str) else p
+        if not isinstance(p, dict):
+            raise ValueError("Игрок задаётся именем или объектом")
+        player_name = " ".join(str(p.get("name") or "").split())
+        if player_name:
+            player(player_name, str(p.get("sex") or "M"))
+
+    matches = []
+    for m in _list(data.get("matches"), "matches"):
+        if not isinstance(m, dict):
+            raise ValueError("Матч задаётся объектом")
+        teams = []
+        for key in ("team1", "team2"):
+            team = [" ".join(str(n or "").split()) for n in _list(m.get(key), key)]
+            if len(team) != 2 or not all(team):
+                raise ValueError("В каждой команде должно быть два игрока")
+            teams.append(team)
+        if len(set(teams[0] + teams[1])) != 4:
+            raise ValueError("Игрок не может играть в матче дважды")
+        try:
+            round_num, court = int(m.get("round")), int(m.get("court") or 1)
+            score1, score2 = _score(m.get("score1")), _score(m.get("score2"))
+        except (TypeError, ValueError):
+            raise ValueError("Неверный раунд, корт или счёт")
+        if round_num < 1 or court < 1:
+            raise ValueError("Раунд и корт нумеруются с 1")
+        if (score1 is None) != (score2 is None):
+            raise ValueError("Счёт нужен для обеих команд")
+
+        seated = [player(player_name) for player_name in teams[0] + teams[1]]
+        completed = score1 is not None
+        if completed:
+            for p, (score_for, score_against) in zip(seated, ((score1, score2),) * 2 + ((score2, score1),) * 2):
+                for col, inc in _stats_delta(score_for, score_against).items():
+                    p[col] += inc
+        ids = [p["id"] for p in seated]
+        matches.append(Match(
+            id=generate_id(), round=round_num, court=court, team1=ids[:2], team2=ids[2:],
+            score1=score1, score2=score2, completed=completed,
+        ))
+    if not matches:
+        raise ValueError("В турнире нет матчей")
+
+    total_rounds = max(m.round for m in matches)
+    try:
+        courts = int(data.get("courts") or max(m.court for m in matches))
+    except (TypeError, ValueError):
+        raise ValueError("Неверное число кортов")
+    tournament = {
+        "id": generate_id(), "mode": mode, "name": name,
+        "courts": courts,
+        "status": "finished", "current_round": total_rounds - 1, "total_rounds": total_rounds,
+        "created_at": created_at,
+    }
+    return tournament, list(players.values()), matches
+
+
+async def _lines(request: Request) -> AsyncIterator[str]:
+    pending = b""
+    async for chunk in request.stream():
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8-sig").rstrip("\r")
+    if pending:
+        yield pending.decode("utf-8-sig").rstrip("\r")
+
+
+async def _ndjson_items(request: Request) -> AsyncIterator[Tuple[int, object]]:
+    number = 0
+    async for line in _lines(request):
+        number += 1
+        if line.strip():
+            try:
+                yield number, json.loads(line)
+            except ValueError:
+                yield number, ValueError("Строка не является JSON")
+
+
+class _Feed:
+    """Lines for one csv.reader, appended as the body arrives."""
+
+    def __init__(self):
+        self.lines = deque()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        if not self.lines:
+            raise StopIteration
+        return self.lines.popleft()
+
+
+async def _csv_items(request: Request) -> AsyncIterator[Tuple[int, object]]:
+    """Records as dicts by the header, numbered by the line they start on.
+
+    One reader parses the whole body, so quoted fields may span lines; it
+    is asked for a record once the quotes seen so far are balanced, when
+    every line of the record has arrived.
+    """
+    feed = _Feed()
+    reader = csv.reader(feed)
+    header, number, start, quotes = None, 0, 1, 0
+    async for line in _lines(request):
+        number += 1
+        feed.lines.append(line + "\n")
+        quotes += line.count('"')
+        if quotes % 2:
+            continue
+        record, record_start, quotes, start = next(reader), start, 0, number + 1
+        if not any(cell.strip() for cell in record):
+            continue
+        if header is None:
+            header = record
+        else:
+            yield record_start, dict(zip(header, record))
+    if feed.lines:
+        yield start, ValueError("Незакрытые кавычки в конце файла")
+
+
+def _is_match_row(item) -> bool:
+    return isinstance(item, dict) and "team1_player1" in item
+
+
+async def _tournaments(items: AsyncIterator[Tuple[int, object]]) -> AsyncIterator[Tuple[int, object]]:
+    """Consecutive match rows of one tournament_id (or tournament and created_at) make one tournament.
+
+    Anything else, a whole tournament or an error, is passed on as it is.
+    """
+    key, current = None, None
+    async for number, item in items:
+        if not _is_match_row(item):
+            if current is not None:
+                yield current
+            key, current = None, None
+            yield number, item
+            continue
+        row_key = item.get("tournament_id") or (item.get("tournament"), item.get("created_at"))
+        if current is None or row_key != key:
+            if current is not None:
+                yield current
+            key = row_key
+            current = (number, {
+                "name": item.get("tournament"), "mode": item.get("mode"),
+                "created_at": item.get("created_at"), "matches": [],
+            })
+        current[1]["matches"].append({
+            "round": item.get("round"), "court": item.get("court"),
+            "team1": [item.get("team1_player1"), item.get("team1_player2")],
+            "team2": [item.get("team2_player1"), item.get("team2_player2")],
+            "score1": item.get("score1"), "score2": item.get("score2"),
+        })
+    if current is not None:
+        yield current
+
+
+async def _insert_batch(batch: List[ImportedTournament]) -> None:
+    async with AsyncSessionLocal() as session:
+        await insert_tournaments(session, batch)
+        await session.commit()
+
+
+@router.post("/import")
+async def import_tournaments(request: Request):
+    """Load past tournaments; the body is NDJSON, or CSV when sent as text/csv.
+
+    Bad tournaments are skipped and reported by line, the rest are
+    committed every IMPORT_BATCH tournaments. The answer is a 400 when
+    any line was skipped; the tournaments it lists are imported anyway.
+    """
+    is_csv = request.headers.get("content-type", "").startswith("text/csv")
+    source = _tournaments(_csv_items(request) if is_csv else _ndjson_items(request))
+    imported, errors, batch = [], [], []
+    async for line, data in source:
+        try:
+            if isinstance(data, Exception):
+                raise data
+            if not isinstance(data, dict):
+                raise ValueError("Ожидается объект турнира")
+            batch.append(build_import(data))
+        except ValueError as exc:
+            errors.append({"line": line, "error": str(exc)})
+            continue
+        if len(batch) >= IMPORT_BATCH:
+            await _insert_batch(batch)
+            imported += [t["id"] for t, _, _ in batch]
+            batch = []
+    if batch:
+        await _insert_batch(batch)
+        imported += [t["id"] for t, _, _ in batch]
+    result = {"imported": len(imported), "tournaments": imported, "errors": errors}
+    return JSONResponse(result, status_code=400 if errors else 200)
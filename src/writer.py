@@ -0,0 +1,124 @@
+"""Per-tournament write coalescing for score submissions.
+
+When every court of a round finishes at once, the score submits of one
+tournament queue up here instead of each opening its own transaction.
+One drain task per tournament applies whatever is queued in a single
+transaction and then resolves every waiting request with its own result.
+Each submit runs in its own savepoint, so one that fails (a stale form,
+a bad match id) only fails its own request, not the rest of the batch.
+
+Across workers the tournament `version` column is the guard: a batch
+bumps it only if nobody else did since the batch started, otherwise the
+batch is rolled back and replayed, the last attempt under a row lock.
+"""
+import asyncio
+import contextvars
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from database import DB_BACKEND, AsyncSessionLocal, TournamentORM
+from service import bump_version
+from querycount import QueryStats, attach, current as current_query_stats
+
+MAX_BATCH = int(os.getenv("SCORE_BATCH_SIZE", "64"))
+OPTIMISTIC_ATTEMPTS = 3
+
+Op = Callable[..., Awaitable[Any]]
+Pending = Tuple[Op, tuple, asyncio.Future, Optional[QueryStats]]
+# (result, None) or (None, exception), one per pending submit
+Outcome = Tuple[Any, Optional[Exception]]
+
+
+class TournamentWriter:
+    def __init__(
+        self,
+        session_factory: async_sessionmaker = AsyncSessionLocal,
+        max_batch: int = MAX_BATCH,
+        attempts: int = OPTIMISTIC_ATTEMPTS,
+    ):
+        self.session_factory = session_factory
+        self.max_batch = max_batch
+        self.attempts = attempts
+        self._queues: Dict[str, List[Pending]] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    async def submit(self, tid: str, op: Op, *args) -> Any:
+        """Run `op(session, tid, *args)` in the tournament's next batch.
+
+        Returns what `op` returned, once the batch is committed.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(tid, []).append((op, args, future, current_query_stats()))
+        if tid not in self._tasks:
+            # Not in the submitter's context: statements are attributed per request below
+            self._tasks[tid] = asyncio.create_task(self._drain(tid), context=contextvars.Context())
+        # The batch runs on regardless of a client that went away
+        return await asyncio.shield(future)
+
+    async def _drain(self, tid: str) -> None:
+        try:
+            queue = self._queues[tid]
+            while queue:
+                batch = queue[:self.max_batch]
+                del queue[:self.max_batch]
+                try:
+                    results = await self._apply(tid, batch)
+                except Exception as exc:
+                    for _, _, future, _ in batch:
+                        if not future.done():
+                            future.set_exception(exc)
+                else:
+                    for (_, _, future, _), (result, error) in zip(batch, results):
+                        if future.done():
+                            continue
+                        if error is not None:
+                            future.set_exception(error)
+                        else:
+                            future.set_result(result)
+        finally:
+            self._queues.pop(tid, None)
+            self._tasks.pop(tid, None)
+
+    async def _apply(self, tid: str, batch: List[Pending]) -> List[Outcome]:
+        # Each request is charged its own statements plus the batch's shared ones
+        shared = QueryStats(stats for *_, stats in batch if stats is not None)
+        for attempt in range(self.attempts + 1):
+            locked = attempt == self.attempts
+            async with self.session_factory() as session:
+                if DB_BACKEND == "sqlite":
+                    # pysqlite only opens a transaction at the first write, and
+                    # releasing a savepoint outside of one commits it; take the
+                    # write lock up front instead, no other batch can interleave
+                    with attach(shared):
+                        await session.execute(text("BEGIN IMMEDIATE"))
+                version_query = select(TournamentORM.version).where(TournamentORM.id == tid)
+                if locked:
+                    version_query = version_query.with_for_update()
+                with attach(shared):
+                    version = await session.scalar(version_query)
+                if version is None:
+                    return [(None, None)] * len(batch)
+
+                results: List[Outcome] = []
+                for op, args, _, stats in batch:
+                    with attach(stats):
+                        try:
+                            async with session.begin_nested():
+                                results.append((await op(session, tid, *args), None))
+                        except Exception as exc:
+                            results.append((None, exc))
+                if all(error is not None for _, error in results):
+                    return results
+                with attach(shared):
+                    bumped = await bump_version(session, tid, version)
+                if bumped:
+                    await session.commit()
+                    return results
+                await session.rollback()
+        raise RuntimeError(f"Tournament {tid} changed during a locked batch")
+
+
+score_writer = TournamentWriter()